@@ -0,0 +1,139 @@
+"""Control de admisión para ``POST /sensor/data``.
+
+Antes de publicar una petición se comprueba:
+
+- Límite por dispositivo (token bucket): cada ``sensor_id`` puede enviar
+  ``rate`` lecturas por segundo con ráfagas de hasta ``burst``. Si se pasa
+  se responde 429 con ``Retry-After`` = segundos hasta tener fichas. Un lote
+  de más de ``burst`` lecturas se acepta con el bucket lleno y lo deja en
+  deuda, de modo que el dispositivo espera lo que corresponde a su tamaño.
+- Sobrecarga: si la cola de los consumidores supera ``high_watermark`` se
+  responde 503 con ``Retry-After`` para que los dispositivos espacien sus
+  envíos. Entre el umbral y el tamaño de la cola la suscripción del
+  dashboard descarta primero lecturas viejas del mismo dispositivo
+  (``latest_per_topic`` en broker.py), así se conserva la última de cada uno.
+
+La tabla de buckets está acotada (``max_devices``, se olvida el dispositivo
+menos reciente), de modo que la memoria no crece con ráfagas de ids nuevos.
+
+Configuración por entorno: ``IOT_RATE_LIMIT`` (lecturas/s por dispositivo)
+e ``IOT_RATE_BURST``.
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+DEFAULT_RATE = float(os.environ.get("IOT_RATE_LIMIT", "2"))
+DEFAULT_BURST = int(os.environ.get("IOT_RATE_BURST", "20"))
+DEFAULT_MAX_DEVICES = 10000
+
+ADMITTED = 200
+RATE_LIMITED = 429
+OVERLOADED = 503
+
+Decision = namedtuple("Decision", "status retry_after reason")
+
+
+class TokenBucket:
+    """Fichas que se reponen a ``rate`` por segundo hasta ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        # ``now`` puede ser anterior a la creación del bucket (admit lo toma antes)
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def take(self, count=1, now=None):
+        """Consumir ``count`` fichas; devuelve 0 o los segundos que faltan para tenerlas."""
+        self._refill(time.monotonic() if now is None else now)
+        # Un lote mayor que la ráfaga entra con el bucket lleno y lo deja en deuda
+        # (fichas negativas): así puede pasar alguna vez y el ritmo medio se respeta
+        needed = min(count, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= count
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (needed - self.tokens) / self.rate
+
+    def refund(self, count=1):
+        self.tokens = min(self.burst, self.tokens + count)
+
+
+class AdmissionController:
+    """Decide si se acepta una petición de ingesta (200, 429 o 503)."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_devices=DEFAULT_MAX_DEVICES,
+                 queue_depth=None, high_watermark=None, overload_retry_after=5):
+        self.rate = rate
+        self.burst = burst
+        self.max_devices = max_devices
+        self.queue_depth = queue_depth
+        self.high_watermark = high_watermark
+        self.overload_retry_after = overload_retry_after
+        self.rejected = Counter()  # motivo -> peticiones rechazadas
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # sensor_id -> TokenBucket (LRU)
+
+    def configure(self, rate=None, burst=None):
+        """Cambiar el límite; los buckets existentes se recrean con el nuevo valor."""
+        with self._lock:
+            if (rate, burst) != (self.rate, self.burst):
+                self.rate = self.rate if rate is None else rate
+                self.burst = self.burst if burst is None else burst
+                self._buckets.clear()
+
+    def _bucket(self, sensor_id):
+        bucket = self._buckets.get(sensor_id)
+        if bucket is None:
+            bucket = self._buckets[sensor_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_devices:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(sensor_id)
+        return bucket
+
+    def admit(self, sensor_ids):
+        """Evaluar una petición con las lecturas de ``sensor_ids`` (uno por lectura).
+
+        La petición se acepta o rechaza entera: si un dispositivo no tiene
+        fichas se devuelven las ya consumidas por los demás.
+        """
+        if self.high_watermark is not None and self.queue_depth is not None:
+            if self.queue_depth() >= self.high_watermark:
+                return self._reject(OVERLOADED, self.overload_retry_after, "overloaded")
+
+        now = time.monotonic()
+        taken = []
+        with self._lock:
+            for sensor_id, count in Counter(sensor_ids).items():
+                bucket = self._bucket(sensor_id)
+                wait = bucket.take(count, now)
+                if wait:
+                    for previous, previous_count in taken:
+                        previous.refund(previous_count)
+                    retry_after = self.burst / self.rate if math.isinf(wait) else wait
+                    return self._reject(RATE_LIMITED, retry_after, "rate_limited")
+                taken.append((bucket, count))
+        return Decision(ADMITTED, 0, None)
+
+    def _reject(self, status, retry_after, reason):
+        self.rejected[reason] += 1
+        return Decision(status, max(1, math.ceil(retry_after)), reason)
+
+    def stats(self):
+        return {
+            "rate_per_device": self.rate,
+            "burst": self.burst,
+            "devices_tracked": len(self._buckets),
+            "high_watermark": self.high_watermark,
+            "queue_depth": self.queue_depth() if self.queue_depth else None,
+            "rejected_requests": dict(self.rejected),
+        }
@@ -1,14 +1,26 @@
 import streamlit as st
 import requests
 import json
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
 from datetime import datetime, timedelta
 import threading
 import time
-from flask import Flask, request, jsonify
-import queue
+from ingest_metrics import METRICS
+from rerun_profiler import finish_rerun, measure_figure, section, start_rerun
+from lazy_tabs import lazy_tabs
+from shared_store import SharedLog
+from shm_ring import DEFAULT_RING_NAME, RingReader, ShmRing
+from broker import LATEST_PER_TOPIC, create_broker
+from admission import AdmissionController
+from latest_index import LatestIndex
+from history_store import HistoryStore
+from history_panel import history_panel
+from ingest_api import HISTORY_NAME, IngestPipeline, create_ingest_app, journal_from_env, replay_journal
+from lazy_imports import lazy_import
+from live_chart import FIGURES, live_line_chart
+
+# Heavy modules load on first use, so the ingest API comes up without them
+pd = lazy_import("pandas")
+px = lazy_import("plotly.express")
 
 # Page configuration
 st.set_page_config(
@@ -17,6 +29,7 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+start_rerun("api_server")
 
 # Custom CSS
 st.markdown("""
@@ -59,94 +72,143 @@ st.markdown("""
     }
 </style>
 """, unsafe_allow_html=True)
-# Obtener data_queue o inicializar con valor por defecto
-data_queue = st.session_state.get('data_queue', [])
-
 # Initialize session state
-if 'sensor_data' not in st.session_state:
-    st.session_state.sensor_data = []
 if 'api_server_running' not in st.session_state:
     st.session_state.api_server_running = False
-if 'data_queue' not in st.session_state:
-    st.session_state.data_queue = queue.Queue()
 if 'server_port' not in st.session_state:
     st.session_state.server_port = 5002
 
-# Flask API Server
-app = Flask(__name__)
+@st.cache_resource
+def get_broker():
+    """Broker pub/sub del proceso (IOT_BROKER_BACKEND=inprocess|unix, ver broker.py)"""
+    return create_broker()
 
-@app.route('/sensor/data', methods=['POST'])
-def receive_sensor_data():
-    """Endpoint para recibir datos de sensores via POST"""
-    try:
-        data = request.get_json()
-        st.session_state.data_queue = queue.Queue()
+DASHBOARD_QUEUE_SIZE = 10000
+# Sin reruns en este tiempo no hay dashboard abierto vaciando la cola
+DASHBOARD_IDLE_SECONDS = 30
 
-        # Validar que se recibieron datos
-        if not data:
-            return jsonify({"error": "No data received"}), 400
-        
-        # Agregar timestamp
-        data['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        data['datetime'] = datetime.now()
-        
-        # Poner los datos en la cola para que Streamlit los procese
-        if 'data_queue' not in st.session_state:
-         st.session_state.data_queue = queue.Queue()
-        
-        st.session_state.data_queue.put(data)
-        
-        return jsonify({
-            "status": "success",
-            "message": "Data received successfully",
-            "received_data": data
-        }), 200
-        
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/sensor/status', methods=['GET'])
-def api_status():
-    """Endpoint para verificar el estado de la API"""
-    return jsonify({
-        "status": "running",
-        "message": "Sensor API is running",
-        "endpoints": {
-            "POST /sensor/data": "Receive sensor data",
-            "GET /sensor/status": "Check API status",
-            "GET /sensor/latest": "Get latest sensor reading"
-        },
-        "total_readings": len(st.session_state.sensor_data)
-    }), 200
-
-@app.route('/sensor/latest', methods=['GET'])
-def get_latest_data():
-    """Endpoint para obtener la última lectura"""
-    if st.session_state.sensor_data:
-        latest = st.session_state.sensor_data[-1].copy()
-        # Remover datetime para serialización JSON
-        if 'datetime' in latest:
-            del latest['datetime']
-        return jsonify(latest), 200
-    else:
-        return jsonify({"message": "No data available"}), 404
+@st.cache_resource
+def get_dashboard_subscription():
+    """Suscripción del dashboard a las lecturas completas de todos los dispositivos"""
+    # Con la cola llena se descartan primero lecturas viejas del mismo dispositivo
+    return get_broker().subscribe(
+        "sensor/+",
+        maxsize=DASHBOARD_QUEUE_SIZE,
+        overflow=LATEST_PER_TOPIC,
+        on_drop=lambda count: METRICS.record_drop("dashboard_overflow", count)
+    )
+
+@st.cache_resource
+def get_sensor_log():
+    """Historial compartido por todas las sesiones (últimos 1000 registros)"""
+    return SharedLog(maxlen=1000)
+
+def dashboard_backlog():
+    """Lecturas pendientes del dashboard, o 0 si ninguna sesión vació la cola hace poco"""
+    subscription = get_dashboard_subscription()
+    # La cola solo se vacía en los reruns: sin navegador abierto se llena sin que haya sobrecarga
+    if subscription.last_drained is None or time.monotonic() - subscription.last_drained > DASHBOARD_IDLE_SECONDS:
+        return 0
+    return subscription.qsize()
+
+@st.cache_resource
+def get_admission():
+    """Control de admisión de /sensor/data (límite por dispositivo y sobrecarga)"""
+    return AdmissionController(
+        queue_depth=dashboard_backlog,
+        high_watermark=int(DASHBOARD_QUEUE_SIZE * 0.9)
+    )
+
+@st.cache_resource
+def get_stream_log():
+    """Lecturas recientes con su número de secuencia, para /sensor/stream (últimas 10000)"""
+    return SharedLog(maxlen=10000)
+
+@st.cache_resource
+def get_latest_index():
+    """Último valor de cada dispositivo (lo actualiza la API al recibir cada lectura)"""
+    return LatestIndex()
+
+METRICS.set_queue_depth_source(lambda: get_dashboard_subscription().qsize())
+sensor_log = get_sensor_log()
+latest_index = get_latest_index()
+stream_log = get_stream_log()
+
+@st.cache_resource
+def get_journal():
+    """Journal en disco de /sensor/data; se activa con IOT_JOURNAL_PATH (ver ingest_journal.py)"""
+    journal = journal_from_env()
+    if journal:
+        replay_journal(journal, (sensor_log, stream_log), latest_index)
+    return journal
+
+journal = get_journal()
+
+@st.cache_resource
+def get_history_store():
+    """Historial en disco por niveles (IOT_HISTORY_DIR); guarda lo que llega por el broker"""
+    store = HistoryStore.from_env(HISTORY_NAME)
+    if store is None:
+        return None
+    return store.attach(get_broker(), on_drop=lambda count: METRICS.record_drop("history_overflow", count))
+
+history = get_history_store()
+
+@st.cache_resource
+def get_ingest_app():
+    """App Flask de ingest_api.py sobre los recursos compartidos de esta página"""
+    pipeline = IngestPipeline(
+        get_broker(), stream_log, latest_index, get_admission(),
+        journal=journal, history=history, reading_count=lambda: len(sensor_log)
+    )
+    return create_ingest_app(pipeline)
+
+# Flask API Server (the same routes run headless with `python -m ingest_api`)
+app = get_ingest_app()
 
 def run_flask_server(port):
     """Ejecutar el servidor Flask en un hilo separado"""
     app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
 
 def process_queue_data():
-    """Procesar datos de la cola y agregarlos a session_state"""
-    while not st.session_state.data_queue.empty():
-        try:
-            data = st.session_state.data_queue.get_nowait()
-            st.session_state.sensor_data.append(data)
-            
-            # Mantener solo los últimos 1000 registros
-            if len(st.session_state.sensor_data) > 1000:
-                st.session_state.sensor_data = st.session_state.sensor_data[-1000:]
-        except queue.Empty:
-            break
+    """Procesar las lecturas pendientes de la suscripción del dashboard"""
+    for published_at, topic, data in get_dashboard_subscription().drain():
+        METRICS.record_drain(time.monotonic() - published_at)
+        # Con el backend por socket Unix el datetime llega como texto
+        if isinstance(data.get('datetime'), str):
+            data['datetime'] = datetime.fromisoformat(data['datetime'])
+        # El historial compartido mantiene solo los últimos 1000 registros
+        evicted = sensor_log.append(data)
+        if evicted:
+            METRICS.record_drop("retention", evicted)
+
+@st.cache_resource
+def get_ring_reader(ring_name):
+    """Lector del buffer en memoria compartida de ingest_workers.py"""
+    return RingReader(ShmRing.attach(ring_name))
+
+def process_ring_data(ring_name):
+    """Agregar al historial las lecturas escritas por los workers de ingesta"""
+    try:
+        reader = get_ring_reader(ring_name)
+    except FileNotFoundError:
+        st.sidebar.warning(f"⚠️ Shared memory ring '{ring_name}' not found. Start the ingest workers first.")
+        return
+    readings, lost = reader.poll()
+    if lost:
+        METRICS.record_drop("ring_overwrite", lost)
+    if readings:
+        now = time.time()
+        for data in readings:
+            METRICS.record_drain(now - data['datetime'].timestamp())
+        METRICS.record_ingest(readings)
+        latest_index.update_many(readings)
+        stream_log.extend(readings)
+        if history:
+            history.append(readings)
+        evicted = sensor_log.extend(readings)
+        if evicted:
+            METRICS.record_drop("retention", evicted)
 
 # Main title
 st.markdown('<h1 class="main-header">📡 IoT API Server & Real-time Visualizer</h1>', unsafe_allow_html=True)
@@ -194,8 +256,57 @@ if st.session_state.api_server_running:
 else:
     st.sidebar.info("🔴 API Server Stopped")
 
+# Shared-memory ingest (ingest_workers.py en procesos separados)
+use_shm_ring = st.sidebar.checkbox(
+    "🧠 Read from shared-memory ingest workers",
+    value=False,
+    help="Lee las lecturas que escriben los procesos de ingest_workers.py en memoria compartida"
+)
+if use_shm_ring:
+    ring_name = st.sidebar.text_input("Ring Name", value=DEFAULT_RING_NAME)
+    # The workers bind their own port: the "Start API Server" thread already owns server_port
+    workers_port = st.sidebar.number_input(
+        "Workers Port",
+        min_value=5000,
+        max_value=9999,
+        value=server_port + 1 if server_port < 9999 else server_port - 1,
+        help="Puerto de ingest_workers.py; debe ser distinto del puerto del API Server"
+    )
+    if workers_port == server_port:
+        st.sidebar.warning("⚠️ The workers need a port different from the API server's")
+    st.sidebar.code(f"python ingest_workers.py --workers 4 --port {workers_port} --ring {ring_name}", language="bash")
+
+# Admission control (compartido por todas las sesiones)
+def apply_admission_limits():
+    """Aplicar el límite solo cuando esta sesión lo cambia, no en cada rerun"""
+    get_admission().configure(
+        rate=st.session_state.admission_rate, burst=st.session_state.admission_burst
+    )
+
+with st.sidebar.expander("🚦 Admission Control"):
+    admission = get_admission()
+    # Los widgets muestran siempre el valor compartido (otra sesión pudo cambiarlo)
+    st.session_state.admission_rate = float(admission.rate)
+    st.session_state.admission_burst = int(admission.burst)
+    st.number_input(
+        "Readings/s per device", min_value=0.1, max_value=1000.0, key="admission_rate",
+        on_change=apply_admission_limits,
+        help="Ritmo sostenido permitido a cada sensor_id; por encima se responde 429 con Retry-After"
+    )
+    st.number_input(
+        "Burst per device", min_value=1, max_value=10000, key="admission_burst",
+        on_change=apply_admission_limits,
+        help="Lecturas que un dispositivo puede enviar de golpe"
+    )
+    st.caption(f"503 when the dashboard queue reaches {admission.high_watermark} readings "
+               f"(only while a session drained it in the last {DASHBOARD_IDLE_SECONDS}s)")
+
 # Auto-refresh
-auto_refresh = st.sidebar.checkbox("🔄 Auto-refresh (5s)", value=True)
+auto_refresh = st.sidebar.checkbox(
+    "🔄 Auto-refresh (5s)",
+    value=True,
+    help="Refresca en cuanto llegan lecturas nuevas (como mucho una vez por segundo) o cada 5 s"
+)
 
 # API Documentation
 with st.sidebar.expander("📚 API Documentation"):
@@ -205,7 +316,12 @@ with st.sidebar.expander("📚 API Documentation"):
     **Endpoints:**
     - `POST /sensor/data` - Enviar datos de sensores
     - `GET /sensor/status` - Estado de la API
-    - `GET /sensor/latest` - Última lectura
+    - `GET /sensor/latest?sensor_id=...` - Última lectura de un dispositivo (ETag)
+    - `GET /sensor/latest/all` - Última lectura de cada dispositivo (ETag)
+    - `GET /sensor/stream?since=<seq>` - Long-poll de lecturas nuevas
+    - `GET /sensor/stream/sse` / `GET /sensor/stream/ndjson` - Streaming de lecturas
+    - `GET /sensor/query?start=-1h&fields=SENSOR_CO2&where=SENSOR_LIGHT_LEFT<1000&every=5min` - Consultas sobre el historial (JSON o `format=arrow`)
+    - `GET /metrics` - Métricas (formato Prometheus)
     
     **Ejemplo POST:**
     ```json
@@ -216,16 +332,29 @@ with st.sidebar.expander("📚 API Documentation"):
         "sensor_id": "ESP32_001"
     }}
     ```
+    
+    **Formato binario compacto:** `Content-Type: application/x-sensor-struct`
+    (ver `sensor_codec.py`). También se aceptan listas JSON para enviar
+    varias lecturas en una sola petición.
     """)
 
 # Process incoming data from queue
 process_queue_data()
+if use_shm_ring:
+    process_ring_data(ring_name)
+
+# Lecturas nuevas desde el último rerun de esta sesión
+new_readings, st.session_state.sensor_cursor = sensor_log.since(
+    st.session_state.get('sensor_cursor', sensor_log.version)
+)
+if new_readings:
+    st.sidebar.caption(f"🆕 {len(new_readings)} new readings since your last refresh")
 
 # Create tabs
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Real-time Dashboard", "🔧 API Testing", "📈 Data Analytics", "📋 API Logs"])
+tab1, tab2, tab3, tab4 = lazy_tabs(["📊 Real-time Dashboard", "🔧 API Testing", "📈 Data Analytics", "📋 API Logs"], key="api_server_tab")
 
 # Tab 1: Real-time Dashboard
-with tab1:
+if tab1:
     st.markdown('<h2 class="section-header">Real-time Sensor Dashboard</h2>', unsafe_allow_html=True)
     
     # API Server Status
@@ -241,12 +370,12 @@ with tab1:
         st.markdown(f'<div class="metric-card"><h3>🔌 Port</h3><p>{st.session_state.server_port}</p></div>', unsafe_allow_html=True)
     
     with col3:
-        st.markdown(f'<div class="metric-card"><h3>📊 Total Readings</h3><p>{len(st.session_state.sensor_data)}</p></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h3>📊 Total Readings</h3><p>{len(sensor_log)}</p></div>', unsafe_allow_html=True)
     
     with col4:
         last_update = "Never"
-        if st.session_state.sensor_data:
-            last_update = st.session_state.sensor_data[-1]['timestamp']
+        if sensor_log:
+            last_update = sensor_log[-1]['timestamp']
         st.markdown(f'<div class="metric-card"><h3>🕒 Last Update</h3><p>{last_update}</p></div>', unsafe_allow_html=True)
     
     # Current API Endpoints
@@ -269,11 +398,50 @@ with tab1:
         </div>
         """, unsafe_allow_html=True)
     
+    # Ingest metrics
+    st.subheader("⏱️ Ingest Metrics")
+    metrics = METRICS.snapshot()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Requests/s (1 min)", f"{metrics['ingest_requests_per_second']:.2f}")
+    with col2:
+        st.metric("Queue Depth", metrics['queue_depth'])
+    with col3:
+        lag = metrics['drain_lag_p99_seconds']
+        st.metric("Drain Lag p99", f"≤ {lag:.2f} s" if lag is not None else "N/A")
+    with col4:
+        st.metric("Dropped Readings", sum(metrics['readings_dropped'].values()))
+    if metrics['readings_dropped']:
+        st.caption("Dropped by reason: " + ", ".join(f"{reason}: {total}" for reason, total in metrics['readings_dropped'].items()))
+    
+    with st.expander("📊 Latency per Route & Devices"):
+        if metrics['latency']:
+            st.dataframe(pd.DataFrame.from_dict(metrics['latency'], orient='index'))
+        if metrics['device_last_seen']:
+            st.dataframe(pd.DataFrame([
+                {"sensor_id": sensor_id, "last_seen": datetime.fromtimestamp(seen).strftime("%Y-%m-%d %H:%M:%S")}
+                for sensor_id, seen in metrics['device_last_seen'].items()
+            ]))
+        st.write("**Broker subscriptions:**")
+        st.dataframe(pd.DataFrame(get_broker().subscription_stats()))
+        st.write("**Admission control:**")
+        st.json(get_admission().stats())
+        if journal:
+            st.write("**Write-ahead journal:**")
+            st.json(journal.stats())
+        st.caption(f"Prometheus: http://localhost:{st.session_state.server_port}/metrics")
+    
     # Latest sensor readings
-    if st.session_state.sensor_data:
+    if sensor_log:
         st.subheader("📡 Latest Sensor Readings")
         
-        latest_data = st.session_state.sensor_data[-1]
+        # Última lectura por dispositivo, desde el índice (sin recorrer el historial)
+        device_ids = latest_index.device_ids()
+        if len(device_ids) > 1:
+            selected_device = st.selectbox("Device:", device_ids[::-1], key="latest_device")
+            latest_data = latest_index.get(selected_device) or sensor_log[-1]
+        else:
+            latest_data = latest_index.most_recent() or sensor_log[-1]
         
         # Display metrics for numeric values
         numeric_data = {k: v for k, v in latest_data.items() 
@@ -289,16 +457,17 @@ with tab1:
                     )
         
         # Show all data
-        with st.expander("🔍 View Complete Latest Reading"):
+        with st.expander("🔍 View Complete Latest Reading"), section("json: latest reading"):
             display_data = {k: v for k, v in latest_data.items() if k != 'datetime'}
             st.json(display_data)
         
         # Real-time charts
-        if len(st.session_state.sensor_data) > 1:
+        if len(sensor_log) > 1:
             st.subheader("📈 Real-time Sensor Charts")
             
-            df = pd.DataFrame(st.session_state.sensor_data)
-            numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+            with section("dataframe: realtime"):
+                df = pd.DataFrame(sensor_log.snapshot())
+                numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
             
             if numeric_cols and 'datetime' in df.columns:
                 # Select sensors to plot
@@ -309,31 +478,24 @@ with tab1:
                 )
                 
                 if selected_sensors:
-                    # Create subplots
-                    fig = go.Figure()
-                    
-                    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
-                    
-                    for i, sensor in enumerate(selected_sensors):
-                        fig.add_trace(go.Scatter(
-                            x=df['datetime'],
-                            y=df[sensor],
-                            mode='lines+markers',
-                            name=sensor.replace('_', ' ').title(),
-                            line=dict(color=colors[i % len(colors)]),
-                            marker=dict(size=6)
-                        ))
-                    
-                    fig.update_layout(
-                        title="Real-time Sensor Data",
-                        xaxis_title="Time",
-                        yaxis_title="Value",
-                        hovermode='x unified',
-                        height=500,
-                        showlegend=True
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
+                    with section("chart: realtime"):
+                        # Cached figure; later reruns only send the new readings
+                        live_line_chart(
+                            sensor_log,
+                            selected_sensors,
+                            key="realtime_chart",
+                            names=[sensor.replace('_', ' ').title() for sensor in selected_sensors],
+                            colors=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b'],
+                            layout={
+                                "title": {"text": "Real-time Sensor Data"},
+                                "xaxis": {"title": {"text": "Time"}},
+                                "yaxis": {"title": {"text": "Value"}},
+                                "hovermode": "x unified",
+                                "showlegend": True
+                            },
+                            marker_size=6,
+                            height=500
+                        )
     else:
         st.info("📊 Waiting for sensor data... Start the API server and send POST requests to begin visualization.")
         
@@ -353,7 +515,7 @@ print(response.json())
         """, language="bash")
 
 # Tab 2: API Testing
-with tab2:
+if tab2:
     st.markdown('<h2 class="section-header">API Testing Interface</h2>', unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
@@ -435,24 +597,26 @@ with tab2:
         st.subheader("📊 API Response Monitor")
         
         # Show recent API calls
-        if st.session_state.sensor_data:
-            st.write(f"**Recent API Calls:** {len(st.session_state.sensor_data)}")
+        if sensor_log:
+            st.write(f"**Recent API Calls:** {len(sensor_log)}")
             
             # Show last 5 calls
-            recent_data = st.session_state.sensor_data[-5:]
-            for i, data in enumerate(reversed(recent_data)):
-                with st.expander(f"Call #{len(st.session_state.sensor_data)-i} - {data['timestamp']}"):
-                    display_data = {k: v for k, v in data.items() if k != 'datetime'}
-                    st.json(display_data)
+            recent_data = sensor_log[-5:]
+            with section("json: recent calls"):
+                for i, data in enumerate(reversed(recent_data)):
+                    with st.expander(f"Call #{len(sensor_log)-i} - {data['timestamp']}"):
+                        display_data = {k: v for k, v in data.items() if k != 'datetime'}
+                        st.json(display_data)
         else:
             st.info("No API calls received yet")
 
 # Tab 3: Data Analytics
-with tab3:
+if tab3:
     st.markdown('<h2 class="section-header">Data Analytics</h2>', unsafe_allow_html=True)
     
-    if st.session_state.sensor_data:
-        df = pd.DataFrame(st.session_state.sensor_data)
+    if sensor_log:
+        with section("dataframe: analytics"):
+            df = pd.DataFrame(sensor_log.snapshot())
         
         # Statistics
         col1, col2 = st.columns(2)
@@ -461,7 +625,8 @@ with tab3:
             st.subheader("📊 Data Statistics")
             numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
             if numeric_cols:
-                st.dataframe(df[numeric_cols].describe())
+                with section("describe: analytics"):
+                    st.dataframe(df[numeric_cols].describe())
         
         with col2:
             st.subheader("📈 Data Trends")
@@ -494,16 +659,21 @@ with tab3:
             )
     else:
         st.info("No data available for analytics")
+    
+    # Historial en disco (más allá de las últimas 1000 lecturas en memoria)
+    history_panel(history, key="api_server_history", device_ids=latest_index.device_ids())
 
 # Tab 4: API Logs
-with tab4:
+if tab4:
     st.markdown('<h2 class="section-header">API Activity Logs</h2>', unsafe_allow_html=True)
     
-    if st.session_state.sensor_data:
-        st.subheader(f"📋 Total API Calls: {len(st.session_state.sensor_data)}")
+    if sensor_log:
+        st.subheader(f"📋 Total API Calls: {len(sensor_log)}")
         
         # Recent activity
-        df = pd.DataFrame(st.session_state.sensor_data)
+        with section("dataframe: logs"):
+            data_version = (sensor_log.version, sensor_log.epoch)
+            df = pd.DataFrame(sensor_log.snapshot())
         
         # Activity timeline
         if 'datetime' in df.columns:
@@ -511,51 +681,71 @@ with tab4:
             
             # Group by hour
             df['hour'] = df['datetime'].dt.floor('H')
-            hourly_counts = df.groupby('hour').size().reset_index(name='count')
             
-            fig = px.bar(
-                hourly_counts, 
-                x='hour', 
-                y='count',
-                title="API Calls per Hour",
-                labels={'hour': 'Time', 'count': 'Number of Calls'}
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            def build_activity_timeline():
+                hourly_counts = df.groupby('hour').size().reset_index(name='count')
+                return px.bar(
+                    hourly_counts, 
+                    x='hour', 
+                    y='count',
+                    title="API Calls per Hour",
+                    labels={'hour': 'Time', 'count': 'Number of Calls'}
+                )
+            
+            with section("chart: activity timeline"):
+                # Rebuilt only when the log changes (shared by every session)
+                fig = FIGURES.get(("activity_timeline", data_version), build_activity_timeline)
+            st.plotly_chart(measure_figure("figure bytes: activity timeline", fig), use_container_width=True)
         
         # Detailed logs
         st.subheader("📜 Detailed API Logs")
         
         # Show pagination
         logs_per_page = 10
-        total_logs = len(st.session_state.sensor_data)
+        total_logs = len(sensor_log)
         total_pages = (total_logs - 1) // logs_per_page + 1
         
         if total_pages > 1:
             page = st.selectbox("Page", range(1, total_pages + 1), index=total_pages-1)
             start_idx = (page - 1) * logs_per_page
             end_idx = min(start_idx + logs_per_page, total_logs)
-            logs_to_show = st.session_state.sensor_data[start_idx:end_idx]
+            logs_to_show = sensor_log[start_idx:end_idx]
         else:
-            logs_to_show = st.session_state.sensor_data
+            logs_to_show = sensor_log.snapshot()
         
         # Display logs
-        for i, log in enumerate(reversed(logs_to_show)):
-            log_num = total_logs - i if total_pages == 1 else total_logs - start_idx - i
-            with st.expander(f"📝 Log #{log_num} - {log['timestamp']}"):
-                display_log = {k: v for k, v in log.items() if k != 'datetime'}
-                st.json(display_log)
+        with section("json: detailed logs"):
+            for i, log in enumerate(reversed(logs_to_show)):
+                log_num = total_logs - i if total_pages == 1 else total_logs - start_idx - i
+                with st.expander(f"📝 Log #{log_num} - {log['timestamp']}"):
+                    display_log = {k: v for k, v in log.items() if k != 'datetime'}
+                    st.json(display_log)
         
-        # Clear logs
-        if st.button("🗑️ Clear All Logs"):
-            st.session_state.sensor_data = []
-            st.success("✅ All logs cleared!")
-            st.rerun()
+        # Clear logs: the log is shared by the whole process, so this is a global action
+        def clear_shared_logs():
+            sensor_log.clear()
+            st.session_state.confirm_clear_logs = False
+        
+        confirm_clear = st.checkbox(
+            "I understand this clears the logs for every connected session",
+            key="confirm_clear_logs"
+        )
+        st.button(
+            "🗑️ Clear Logs for All Sessions",
+            disabled=not confirm_clear,
+            on_click=clear_shared_logs,
+            help="Empties the shared API log that every dashboard session reads"
+        )
     else:
         st.info("📋 No API activity logs available")
 
+finish_rerun()
+
 # Auto-refresh logic
-if auto_refresh and st.session_state.api_server_running:
-    time.sleep(5)
+if auto_refresh and (st.session_state.api_server_running or use_shm_ring):
+    stream_cursor = stream_log.version
+    time.sleep(1)
+    stream_log.wait_since(stream_cursor, timeout=4)
     st.rerun()
 
 # Footer
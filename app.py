@@ -1,9 +1,15 @@
 import streamlit as st
 import requests
 import json
-import google.generativeai as genai
 from typing import Dict, Any
 import time
+from rerun_profiler import finish_rerun, section, start_rerun
+from request_runner import expand_targets, run_requests_sync
+from response_history import HistoryLog
+from http_cache import HTTPCache
+from gemini_pool import GeminiPool
+
+HISTORY_PAGE_SIZE = 10
 
 # Page configuration
 st.set_page_config(
@@ -12,6 +18,7 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+start_rerun("app")
 
 # Custom CSS for better styling
 st.markdown("""
@@ -54,16 +61,37 @@ st.markdown('<h1 class="main-header">🚀 API Consumer & Gemini Interface</h1>',
 st.sidebar.header("⚙️ Configuration")
 
 # Initialize session state
+@st.cache_resource
+def get_http_cache() -> HTTPCache:
+    """GET cache shared by every session (on disk too when IOT_HTTP_CACHE_DIR is set)."""
+    return HTTPCache.from_env()
+
+http_cache = get_http_cache()
+
+@st.cache_resource
+def get_gemini_pool() -> GeminiPool:
+    """Gemini clients (one per API key) and model handles shared by every session."""
+    return GeminiPool()
+
+gemini_pool = get_gemini_pool()
+
+# Bounded per-session histories; bodies are compressed and only decoded when shown
 if 'api_responses' not in st.session_state:
-    st.session_state.api_responses = []
+    st.session_state.api_responses = HistoryLog(body_keys=("response",), max_bytes=8 * 1024 * 1024)
 if 'gemini_conversations' not in st.session_state:
-    st.session_state.gemini_conversations = []
+    st.session_state.gemini_conversations = HistoryLog(body_keys=("prompt", "response"), max_bytes=4 * 1024 * 1024)
+
+def history_page_input(history, key):
+    """Page selector whose stored value is clamped first; evictions can shrink page_count."""
+    page_count = history.page_count(HISTORY_PAGE_SIZE)
+    st.session_state[key] = min(max(st.session_state.get(key, 1), 1), page_count)
+    return st.number_input("Page", min_value=1, max_value=page_count, key=key) - 1
 
 # Create tabs for different functionalities
 tab1, tab2, tab3 = st.tabs(["🌐 REST API Consumer", "🤖 Gemini AI", "📊 Response History"])
 
 # Tab 1: REST API Consumer
-with tab1:
+with tab1, section("tab: REST API Consumer"):
     st.markdown('<h2 class="section-header">REST API Consumer</h2>', unsafe_allow_html=True)
     
     col1, col2 = st.columns([1, 1])
@@ -113,6 +141,10 @@ with tab1:
             )
         else:
             query_params = None
+        
+        request_timeout = st.number_input("Timeout (seconds)", min_value=0.5, max_value=120.0, value=10.0, step=0.5)
+        use_cache = st.checkbox("Use HTTP cache for GET", value=True,
+                                help="Honors Cache-Control and revalidates with ETag/Last-Modified (304 = no body transferred)")
     
     with col2:
         st.subheader("🚀 API Response")
@@ -130,23 +162,35 @@ with tab1:
                 
                 # Make the API request
                 with st.spinner("Making API request..."):
-                    if method == "GET":
-                        response = requests.get(api_url, headers=headers, params=params)
+                    cache_info = None
+                    if method == "GET" and use_cache:
+                        response, cache_info = http_cache.get(api_url, params=params, headers=headers, timeout=request_timeout)
+                    elif method == "GET":
+                        response = requests.get(api_url, headers=headers, params=params, timeout=request_timeout)
                     elif method == "POST":
-                        response = requests.post(api_url, headers=headers, json=data)
+                        response = requests.post(api_url, headers=headers, json=data, timeout=request_timeout)
                     elif method == "PUT":
-                        response = requests.put(api_url, headers=headers, json=data)
+                        response = requests.put(api_url, headers=headers, json=data, timeout=request_timeout)
                     elif method == "DELETE":
-                        response = requests.delete(api_url, headers=headers)
+                        response = requests.delete(api_url, headers=headers, timeout=request_timeout)
                 
                 # Display response
                 if response.status_code == 200 or response.status_code == 201:
                     st.success(f"✅ Success! Status Code: {response.status_code}")
+                    if cache_info is not None and cache_info.status == "HIT":
+                        st.caption(f"⚡ Cache HIT (fresh, {cache_info.age:.0f}s old) · no request sent")
+                    elif cache_info is not None and cache_info.status == "REVALIDATED":
+                        st.caption(f"♻️ 304 Not Modified · {cache_info.saved_bytes:,} bytes not transferred")
+                    elif cache_info is not None and cache_info.status == "MISS":
+                        st.caption("⬇️ Cache MISS · full body downloaded")
+                    elif cache_info is not None:
+                        st.caption("🚫 Not cacheable (no-store, private or no validators)")
                     
                     # Try to parse JSON response
                     try:
                         response_json = response.json()
-                        st.json(response_json)
+                        with section("json: api response"):
+                            st.json(response_json)
                         
                         # Save to session state
                         st.session_state.api_responses.append({
@@ -169,9 +213,81 @@ with tab1:
                 st.error(f"❌ Request error: {str(e)}")
             except Exception as e:
                 st.error(f"❌ Unexpected error: {str(e)}")
+    
+    # Request runner: the same request repeated or fanned out concurrently (smoke/load test)
+    st.subheader("🏃 Request Runner")
+    run_col1, run_col2 = st.columns([1, 1])
+    
+    with run_col1:
+        targets = st.text_area(
+            "Targets (optional)",
+            height=120,
+            placeholder='http://192.168.43.64/sensor\n{"url": "http://192.168.43.64/actuator", "method": "POST", "json": {"state": 1}}',
+            help="One URL or JSON object (url, method, params, json, headers) per line; empty repeats the request above"
+        )
+        total_requests = st.number_input("Total requests", min_value=1, max_value=100000, value=100, step=10)
+    
+    with run_col2:
+        concurrency = st.slider("Concurrency", min_value=1, max_value=200, value=10)
+        target_rate = st.number_input("Rate limit (requests/s, 0 = unlimited)", min_value=0.0, value=0.0, step=10.0)
+        max_duration = st.number_input("Max duration (seconds, 0 = no limit)", min_value=0.0, value=0.0, step=5.0)
+    
+    if st.button("🏃 Run Requests"):
+        try:
+            specs = expand_targets(
+                method,
+                api_url,
+                headers=json.loads(headers_json) if headers_json else {},
+                params=json.loads(query_params) if query_params else None,
+                body=json.loads(request_body) if request_body else None,
+                targets=targets,
+            )
+        except (json.JSONDecodeError, ValueError) as e:
+            st.error(f"❌ {str(e)}")
+        else:
+            progress = st.progress(0.0, text="Running requests...")
+            
+            def show_progress(done, total):
+                if done == total or done % max(1, total // 50) == 0:
+                    progress.progress(done / total, text=f"{done}/{total} requests")
+            
+            report = run_requests_sync(
+                specs,
+                total=int(total_requests),
+                concurrency=concurrency,
+                timeout=request_timeout,
+                rate=target_rate or None,
+                duration=max_duration or None,
+                on_progress=show_progress,
+            )
+            summary = report.summary
+            latency = summary["latency_ms"]
+            
+            m1, m2, m3, m4, m5 = st.columns(5)
+            m1.metric("Throughput", f"{summary['throughput_rps']:.1f} req/s")
+            m2.metric("p50", f"{latency['p50']:.0f} ms" if latency['p50'] is not None else "—")
+            m3.metric("p90", f"{latency['p90']:.0f} ms" if latency['p90'] is not None else "—")
+            m4.metric("p99", f"{latency['p99']:.0f} ms" if latency['p99'] is not None else "—")
+            m5.metric("Errors", f"{summary['errors']}/{summary['requests']}")
+            
+            st.write("**Status codes:**")
+            st.bar_chart(summary["status_codes"])
+            with st.expander("Sample responses"):
+                for result in report.results:
+                    if result.sample:
+                        st.write(f"**{result.status}** · {result.url}")
+                        st.code(result.sample)
+            
+            st.session_state.api_responses.append({
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "method": f"{method} ×{summary['requests']}",
+                "url": api_url if len(specs) == 1 else f"{len(specs)} targets",
+                "status_code": ", ".join(f"{code}: {count}" for code, count in summary["status_codes"].items()),
+                "response": summary
+            })
 
 # Tab 2: Gemini AI Integration
-with tab2:
+with tab2, section("tab: Gemini AI"):
     st.markdown('<h2 class="section-header">Gemini AI Integration</h2>', unsafe_allow_html=True)
     
     # Gemini API key configuration
@@ -182,9 +298,6 @@ with tab2:
     )
     
     if gemini_api_key:
-        # Configure Gemini
-        genai.configure(api_key=gemini_api_key)
-        
         col1, col2 = st.columns([1, 1])
         
         with col1:
@@ -237,29 +350,28 @@ with tab2:
             if st.button("Send to Gemini", type="primary"):
                 if user_prompt:
                     try:
-                        # Initialize the model
-                        model = genai.GenerativeModel(model_name)
-                        
-                        # Generate response
+                        # Generate response with the pooled model for this key and config
                         with st.spinner("Generating response..."):
                             if model_name == "gemini-pro-vision" and uploaded_file:
                                 # Handle vision model with image
                                 import PIL.Image
                                 image = PIL.Image.open(uploaded_file)
-                                response = model.generate_content([user_prompt, image])
+                                result = gemini_pool.generate(gemini_api_key, model_name, [user_prompt, image])
                             else:
                                 # Handle text-only model
-                                response = model.generate_content(
+                                result = gemini_pool.generate(
+                                    gemini_api_key,
+                                    model_name,
                                     user_prompt,
-                                    generation_config=genai.types.GenerationConfig(
-                                        temperature=temperature,
-                                        max_output_tokens=max_tokens
-                                    )
+                                    temperature=temperature,
+                                    max_output_tokens=max_tokens
                                 )
+                        response = result.response
                         
                         # Display response
                         if response.text:
                             st.success("✅ Response generated successfully!")
+                            st.caption(f"⏱️ First token {result.first_token_seconds:.2f}s · total {result.total_seconds:.2f}s")
                             st.markdown(response.text)
                             
                             # Save to session state
@@ -290,28 +402,36 @@ with tab2:
         """)
 
 # Tab 3: Response History
-with tab3:
+with tab3, section("tab: Response History"):
     st.markdown('<h2 class="section-header">Response History</h2>', unsafe_allow_html=True)
     
     # API Responses History
-    if st.session_state.api_responses:
+    api_history = st.session_state.api_responses
+    if api_history:
         st.subheader("🌐 API Responses History")
-        for i, response in enumerate(reversed(st.session_state.api_responses)):
-            with st.expander(f"{response['method']} - {response['timestamp']} - Status: {response['status_code']}"):
-                st.write(f"**URL:** {response['url']}")
-                st.write(f"**Method:** {response['method']}")
-                st.write(f"**Status Code:** {response['status_code']}")
-                st.write("**Response:**")
-                st.json(response['response'])
+        api_page = history_page_input(api_history, "api_history_page")
+        stats = api_history.stats()
+        st.caption(f"{stats['entries']} responses · {stats['stored_bytes'] / 1024:.0f} KB stored "
+                   f"({stats['raw_bytes'] / 1024:.0f} KB uncompressed) · {stats['evicted']} oldest dropped")
+        with section("json: response history"):
+            for response in api_history.page(api_page, HISTORY_PAGE_SIZE):
+                with st.expander(f"{response['method']} - {response['timestamp']} - Status: {response['status_code']}"):
+                    st.write(f"**URL:** {response['url']}")
+                    st.write(f"**Method:** {response['method']}")
+                    st.write(f"**Status Code:** {response['status_code']}")
+                    st.write("**Response:**")
+                    st.json(response['response'])
     else:
         st.info("No API responses yet. Make some API calls in the REST API Consumer tab!")
     
     st.divider()
     
     # Gemini Conversations History
-    if st.session_state.gemini_conversations:
+    gemini_history = st.session_state.gemini_conversations
+    if gemini_history:
         st.subheader("🤖 Gemini Conversations History")
-        for i, conversation in enumerate(reversed(st.session_state.gemini_conversations)):
+        gemini_page = history_page_input(gemini_history, "gemini_history_page")
+        for conversation in gemini_history.page(gemini_page, HISTORY_PAGE_SIZE):
             with st.expander(f"Conversation - {conversation['timestamp']} - Model: {conversation['model']}"):
                 st.write(f"**Model:** {conversation['model']}")
                 st.write(f"**Temperature:** {conversation['temperature']}")
@@ -327,14 +447,31 @@ with tab3:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🗑️ Clear API History"):
-            st.session_state.api_responses = []
+            st.session_state.api_responses.clear()
             st.success("API history cleared!")
     
     with col2:
         if st.button("🗑️ Clear Gemini History"):
-            st.session_state.gemini_conversations = []
+            st.session_state.gemini_conversations.clear()
             st.success("Gemini history cleared!")
 
+# Gemini latency per model
+with st.sidebar.expander("⏱️ Gemini Latency"):
+    st.json(gemini_pool.stats())
+
+# HTTP cache stats
+with st.sidebar.expander("🗄️ HTTP Cache"):
+    cache_stats = http_cache.stats()
+    st.metric("Hit ratio", f"{cache_stats['hit_ratio']:.0%}" if cache_stats['hit_ratio'] is not None else "—")
+    st.metric("Bytes saved", f"{cache_stats['bytes_saved'] / 1024:,.1f} KB")
+    st.caption(f"{cache_stats['hits']} hits · {cache_stats['revalidated']} revalidated (304) · "
+               f"{cache_stats['misses']} misses · {cache_stats['entries']} entries, "
+               f"{cache_stats['memory_bytes'] / 1024:,.0f} KB")
+    if st.button("🗑️ Clear cache"):
+        http_cache.clear()
+
+finish_rerun()
+
 # Footer
 st.divider()
 st.markdown("""
@@ -0,0 +1,253 @@
+"""Análisis de varias intersecciones en una sola petición al modelo.
+
+Para un distrito, en vez de una llamada a Gemini por dispositivo:
+
+1. ``compact_context`` reduce las lecturas recientes de cada intersección a
+   unos pocos campos (última lectura sin P1/P2 y el rango de CO2 reciente).
+2. ``plan_batches`` agrupa los contextos en lotes de hasta ``max_per_batch``
+   intersecciones y ``max_prompt_chars`` caracteres.
+3. ``analyze_district`` envía cada lote con ``build_batch_prompt`` (mismas
+   especificaciones y reglas que el análisis individual, salida como arreglo
+   JSON con una entrada por ``id``), con a lo sumo ``concurrency`` lotes en
+   vuelo, y separa la respuesta por intersección con ``parse_batch_response``.
+4. ``fan_out`` aplica cada ``emergencia`` a su dispositivo.
+
+``generate`` es cualquier función ``prompt -> texto``: el ``GeminiPool`` en la
+app o ``FakeModel``, que aplica las reglas localmente para probar sin API key.
+"""
+import json
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Especificaciones y reglas compartidas con el análisis individual (iot_controller.user_prompt_build)
+SENSOR_RULES = """Especificaciones de los sensores:
+Los siguientes datos son información de sensores de una intersección de calles en una ciudad.
+SENSOR_LIGHT_LEFT: sensor de luz
+SENSOR_LIGHT_RIGHT: sensor de luz
+SENSOR_CO2: Calidad del aire
+SENSOR_CNY1: sensor de cantidad de carros de la primera calle
+SENSOR_CNY2: sensor de cantidad de carros de la primera calle
+SENSOR_CNY3: sensor de cantidad de carros de la primera calle
+SENSOR_CNY4: sensor de cantidad de carros de la segunda calle
+SENSOR_CNY5: sensor de cantidad de carros de la segunda calle
+SENSOR_CNY6: sensor de cantidad de carros de la segunda calle
+SENSOR_P1, SENSOR_P2: no tener en cuenta
+
+Reglas:
+- Si los sensores de luz presentan valores por debajo de 1000, está de noche.
+- Si el valor de los sensores de cantidad de carros, están en 1, significa que no hay carros.
+- Es prioridad las ordenes del usuario, emergencia es un 1.
+- Puedes hacerle sugerencias al usuario, pero si pide alguna condición de emergencia, se debe cumplir.
+- Si los sensores SENSOR_CNY1, SENSOR_CNY2, SENSOR_CNY3 están en 0 los tres, hay mucho tráfico en la calle 1.
+- Si los sensores SENSOR_CNY4, SENSOR_CNY5, SENSOR_CNY6 están en 0 los tres, hay mucho tráfico en la calle 2."""
+
+CONTEXT_FIELDS = (
+    "SENSOR_LIGHT_LEFT", "SENSOR_LIGHT_RIGHT", "SENSOR_CO2",
+    "SENSOR_CNY1", "SENSOR_CNY2", "SENSOR_CNY3", "SENSOR_CNY4", "SENSOR_CNY5", "SENSOR_CNY6",
+    "WIND_SPEED", "PRECIPITATION",
+)
+STREET_1 = ("SENSOR_CNY1", "SENSOR_CNY2", "SENSOR_CNY3")
+STREET_2 = ("SENSOR_CNY4", "SENSOR_CNY5", "SENSOR_CNY6")
+
+IntersectionResult = namedtuple("IntersectionResult", "id respuesta emergencia batch error")
+
+
+def compact_context(device_id, readings, window=10):
+    """Contexto mínimo de una intersección a partir de sus lecturas (la última al final)."""
+    recent = list(readings)[-window:]
+    if not recent:
+        return None
+    latest = recent[-1]
+    context = {"id": device_id}
+    context.update({field: latest[field] for field in CONTEXT_FIELDS if field in latest})
+    co2 = [r["SENSOR_CO2"] for r in recent if isinstance(r.get("SENSOR_CO2"), (int, float))]
+    if len(co2) > 1:
+        context["CO2_reciente"] = [min(co2), max(co2)]
+    return context
+
+
+def build_batch_prompt(user_input, contexts):
+    """Prompt para un lote: reglas comunes + un contexto JSON por intersección."""
+    lines = "\n".join(json.dumps(c, ensure_ascii=False, separators=(",", ":")) for c in contexts)
+    return f"""
+Contexto del usuario, esto es lo prioritario por encima de los sensores:
+{user_input}
+
+{SENSOR_RULES}
+- Evalúa cada intersección por separado con sus propios datos.
+
+Datos de sensores (una intersección por línea, identificada por "id"):
+{lines}
+
+Objetivo:
+Solo puedes accionar el estado de los semáforos (normal o emergencia) de cada intersección.
+Genera conclusiones accionables basadas en lo anterior, en idioma español.
+
+Formato de salida estricto (sin texto adicional, sólo JSON válido): un arreglo con exactamente una
+entrada por intersección, en el mismo orden:
+[{{"id": "<id>", "respuesta": "tu texto en max. 2 líneas", "emergencia": 0 o 1}}]
+"""
+
+
+def plan_batches(contexts, max_per_batch=10, max_prompt_chars=12000):
+    """Dividir los contextos en lotes por cantidad y por tamaño del prompt."""
+    batches, current, size = [], [], 0
+    for context in contexts:
+        length = len(json.dumps(context, ensure_ascii=False)) + 1
+        if current and (len(current) >= max_per_batch or size + length > max_prompt_chars):
+            batches.append(current)
+            current, size = [], 0
+        current.append(context)
+        size += length
+    if current:
+        batches.append(current)
+    return batches
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_OBJECT = re.compile(r"\{[^{}]*\}", re.DOTALL)
+
+
+def _entries(text):
+    text = _FENCE.sub("", text.strip())
+    if text.lower().startswith("json\n"):
+        text = text[5:]
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # Respuesta truncada o con texto alrededor: rescatar los objetos completos
+        data = []
+        for match in _OBJECT.finditer(text):
+            try:
+                data.append(json.loads(match.group(0)))
+            except json.JSONDecodeError:
+                continue
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [data])
+    return [entry for entry in data if isinstance(entry, dict)]
+
+
+def parse_batch_response(text, ids, batch=0):
+    """Separar la salida de un lote por intersección; las que falten quedan con ``error``."""
+    found = {}
+    for entry in _entries(text):
+        device_id = str(entry.get("id", ""))
+        if device_id not in ids or device_id in found:
+            continue
+        try:
+            emergencia = int(entry.get("emergencia"))
+        except (TypeError, ValueError):
+            emergencia = None
+        found[device_id] = IntersectionResult(
+            device_id, str(entry.get("respuesta", "")), emergencia if emergencia in (0, 1) else None, batch,
+            None if emergencia in (0, 1) else "invalid emergencia",
+        )
+    return {
+        device_id: found.get(device_id) or IntersectionResult(device_id, "", None, batch, "missing from response")
+        for device_id in ids
+    }
+
+
+def analyze_district(contexts, user_input, generate, max_per_batch=10, max_prompt_chars=12000, concurrency=4):
+    """Analizar todas las intersecciones; devuelve ``(resultados por id, info)``."""
+    contexts = [c for c in contexts if c]
+    batches = plan_batches(contexts, max_per_batch, max_prompt_chars)
+    results = {}
+    timings = []
+    lock = threading.Lock()
+
+    def run(index, batch):
+        ids = [c["id"] for c in batch]
+        started = time.perf_counter()
+        try:
+            parsed = parse_batch_response(generate(build_batch_prompt(user_input, batch)), ids, index)
+        except Exception as e:
+            parsed = {i: IntersectionResult(i, "", None, index, f"{type(e).__name__}: {e}") for i in ids}
+        with lock:
+            results.update(parsed)
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+            list(pool.map(run, range(len(batches)), batches))
+    return results, {
+        "intersections": len(contexts),
+        "batches": len(batches),
+        "requests_saved": len(contexts) - len(batches),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "slowest_batch_seconds": round(max(timings), 3) if timings else None,
+        "errors": sum(1 for r in results.values() if r.error),
+    }
+
+
+def fan_out(results, actuators, concurrency=8):
+    """Aplicar ``emergencia`` a cada dispositivo; ``actuators[id](estado)`` hace el POST.
+
+    Devuelve ``{id: respuesta o excepción}``; se omiten las intersecciones sin decisión válida.
+    """
+    targets = [(r.id, r.emergencia) for r in results.values() if r.emergencia is not None and r.id in actuators]
+
+    def apply(target):
+        device_id, state = target
+        try:
+            return device_id, actuators[device_id](state)
+        except Exception as e:
+            return device_id, e
+
+    if not targets:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(targets)))) as pool:
+        return dict(pool.map(apply, targets))
+
+
+class FakeModel:
+    """Modelo local que aplica las reglas del prompt; sustituye a Gemini en pruebas.
+
+    Emergencia si el usuario la pide o si ambas calles tienen mucho tráfico
+    (los tres CNY en 0). ``drop_every`` omite una de cada N intersecciones y
+    ``latency`` simula el tiempo de respuesta por llamada.
+    """
+
+    def __init__(self, latency=0.0, drop_every=0):
+        self.latency = latency
+        self.drop_every = drop_every
+        self.calls = 0
+        self.seen = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        user = prompt.split("Especificaciones de los sensores:", 1)[0].lower()
+        forced = "emergencia" in user and not re.search(r"\bno\b[^.\n]*emergencia", user)
+        output = []
+        for line in prompt.splitlines():
+            if not line.startswith('{"id"'):
+                continue
+            context = json.loads(line)
+            with self._lock:
+                self.seen += 1
+                dropped = self.drop_every and self.seen % self.drop_every == 0
+            if dropped:
+                continue
+            street_1 = all(context.get(f) == 0 for f in STREET_1)
+            street_2 = all(context.get(f) == 0 for f in STREET_2)
+            night = min(context.get("SENSOR_LIGHT_LEFT", 4095), context.get("SENSOR_LIGHT_RIGHT", 4095)) < 1000
+            notes = []
+            if street_1:
+                notes.append("mucho tráfico en la calle 1")
+            if street_2:
+                notes.append("mucho tráfico en la calle 2")
+            if night:
+                notes.append("es de noche")
+            output.append({
+                "id": context["id"],
+                "respuesta": ("Intersección con " + ", ".join(notes)) if notes else "Tráfico normal.",
+                "emergencia": int(forced or (street_1 and street_2)),
+            })
+        return json.dumps(output, ensure_ascii=False)
@@ -0,0 +1,282 @@
+"""Generador de carga y benchmark para la ingesta de sensores (/sensor/data).
+
+Simula N ESP32 virtuales que envían el esquema real de ``GET /sensor`` a una
+tasa configurable y reporta throughput sostenido, latencias p50/p99,
+crecimiento de memoria del servidor y el retraso ingesta -> dashboard
+(leído del histograma ``sensor_queue_drain_lag_seconds`` de ``/metrics``).
+Los resultados se guardan en JSON para seguir regresiones.
+
+Ejemplos:
+    python benchmarks/ingest_load.py --spawn-server --devices 20 --rate 2 --duration 30
+    python benchmarks/ingest_load.py --url http://localhost:5002 --mode batch --batch-size 50
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sensor_codec import CONTENT_TYPE_JSON, CONTENT_TYPE_STRUCT, SENSOR_FIELDS, encode_struct  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Servidor local: la API de api_server.py en modo "bare" más un hilo que
+# procesa la cola como lo haría el auto-refresh del dashboard.
+SERVER_BOOTSTRAP = """
+import sys, threading, time
+sys.path.insert(0, {root!r})
+import api_server
+threading.Thread(target=api_server.run_flask_server, args=({port},), daemon=True).start()
+while True:
+    time.sleep({drain_interval})
+    api_server.process_queue_data()
+"""
+
+
+def make_reading(sensor_id):
+    """Lectura con el mismo esquema que handleGetSensor() del firmware."""
+    reading = {"sensor_id": sensor_id}
+    for field in SENSOR_FIELDS:
+        if field.startswith("SENSOR_LIGHT") or field == "SENSOR_CO2":
+            reading[field] = random.randint(0, 4095)
+        else:
+            reading[field] = random.randint(0, 1)
+    return reading
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def server_rss_bytes(pid):
+    """Memoria residente del proceso servidor (solo Linux)."""
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def read_drain_histogram(base_url):
+    """Leer los buckets acumulados del retraso de la cola desde /metrics."""
+    try:
+        text = requests.get(f"{base_url}/metrics", timeout=5).text
+    except requests.RequestException:
+        return None
+    buckets = {}
+    for match in re.finditer(r'sensor_queue_drain_lag_seconds_bucket\{le="([^"]+)"\} (\d+)', text):
+        buckets[float(match.group(1))] = int(match.group(2))
+    return buckets or None
+
+
+def histogram_quantile(before, after, q):
+    """Cuantil aproximado (límite superior del bucket) de la diferencia de dos lecturas."""
+    if not after:
+        return None
+    deltas = sorted((bound, count - (before or {}).get(bound, 0)) for bound, count in after.items())
+    total = deltas[-1][1]
+    if total <= 0:
+        return None
+    for bound, count in deltas:
+        if count >= q * total:
+            return bound
+    return None
+
+
+class VirtualDevice(threading.Thread):
+    """Un ESP32 virtual que envía lecturas a tasa fija hasta ``stop_at``."""
+
+    def __init__(self, sensor_id, args, stop_at, results):
+        super().__init__(daemon=True)
+        self.sensor_id = sensor_id
+        self.args = args
+        self.stop_at = stop_at
+        self.results = results
+        self.session = requests.Session() if args.mode != "fresh" else None
+
+    def post(self, readings):
+        url = f"{self.args.url}/sensor/data"
+        if self.args.format == "struct":
+            body, content_type = encode_struct(readings), CONTENT_TYPE_STRUCT
+        else:
+            payload = readings if self.args.mode == "batch" else readings[0]
+            body, content_type = json.dumps(payload), CONTENT_TYPE_JSON
+        headers = {"Content-Type": content_type}
+        if self.session is None:
+            headers["Connection"] = "close"
+            return requests.post(url, data=body, headers=headers, timeout=self.args.timeout)
+        return self.session.post(url, data=body, headers=headers, timeout=self.args.timeout)
+
+    def run(self):
+        interval = 1.0 / self.args.rate
+        per_request = self.args.batch_size if self.args.mode == "batch" else 1
+        # Desfase aleatorio para que los dispositivos no envíen sincronizados
+        next_send = time.monotonic() + random.uniform(0, interval * per_request)
+        while True:
+            now = time.monotonic()
+            if now >= self.stop_at:
+                break
+            if now < next_send:
+                time.sleep(min(next_send - now, self.stop_at - now))
+                continue
+            readings = [make_reading(self.sensor_id) for _ in range(per_request)]
+            started = time.perf_counter()
+            try:
+                status = self.post(readings).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            self.results.record(time.perf_counter() - started, status, per_request)
+            next_send += interval * per_request
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.statuses = Counter()
+        self.readings_ok = 0
+
+    def record(self, seconds, status, readings):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.statuses[str(status)] += 1
+            if status == 200:
+                self.readings_ok += readings
+
+
+def spawn_server(port, drain_interval):
+    code = SERVER_BOOTSTRAP.format(root=ROOT, port=port, drain_interval=drain_interval)
+    process = subprocess.Popen(
+        [sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://localhost:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/sensor/status", timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Local server did not start")
+
+
+def run_benchmark(args):
+    server = None
+    pid = args.server_pid
+    if args.spawn_server:
+        server, args.url = spawn_server(args.port, args.drain_interval)
+        pid = server.pid
+    try:
+        rss_before = server_rss_bytes(pid)
+        drain_before = read_drain_histogram(args.url)
+        results = Results()
+        stop_at = time.monotonic() + args.duration
+        devices = [
+            VirtualDevice(f"ESP32_{i:03d}", args, stop_at, results) for i in range(args.devices)
+        ]
+        started = time.monotonic()
+        for device in devices:
+            device.start()
+        for device in devices:
+            device.join()
+        elapsed = time.monotonic() - started
+        # Dar tiempo a que el dashboard (o el hilo de drenado) procese la cola
+        time.sleep(args.drain_interval + 1 if args.spawn_server else 0)
+        rss_after = server_rss_bytes(pid)
+        drain_after = read_drain_histogram(args.url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    latencies_ms = [s * 1000 for s in results.latencies]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "url": args.url,
+            "devices": args.devices,
+            "rate_per_device": args.rate,
+            "duration_seconds": args.duration,
+            "mode": args.mode,
+            "batch_size": args.batch_size if args.mode == "batch" else 1,
+            "format": args.format,
+        },
+        "requests": len(results.latencies),
+        "status_codes": dict(results.statuses),
+        "readings_ok": results.readings_ok,
+        "throughput_readings_per_second": results.readings_ok / elapsed if elapsed else 0.0,
+        "throughput_requests_per_second": len(results.latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies_ms, 0.50),
+            "p99": percentile(latencies_ms, 0.99),
+            "max": max(latencies_ms) if latencies_ms else None,
+        },
+        "server_rss_bytes": {
+            "before": rss_before,
+            "after": rss_after,
+            "growth": rss_after - rss_before if rss_before and rss_after else None,
+        },
+        "ingest_to_dashboard_lag_seconds": {
+            "p50": histogram_quantile(drain_before, drain_after, 0.50),
+            "p99": histogram_quantile(drain_before, drain_after, 0.99),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sensor ingest load generator and benchmark")
+    parser.add_argument("--url", default="http://localhost:5002", help="Base URL of the ingest API")
+    parser.add_argument("--devices", type=int, default=10, help="Number of virtual ESP32 devices")
+    parser.add_argument("--rate", type=float, default=1.0, help="Readings per second per device")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--mode", choices=["keepalive", "fresh", "batch"], default="keepalive",
+                        help="keepalive: persistent connection; fresh: new connection per request; "
+                             "batch: several readings per request")
+    parser.add_argument("--batch-size", type=int, default=10, help="Readings per request in batch mode")
+    parser.add_argument("--format", choices=["json", "struct"], default="json", help="Payload encoding")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds")
+    parser.add_argument("--spawn-server", action="store_true", help="Start a local API server for the run")
+    parser.add_argument("--port", type=int, default=5099, help="Port for --spawn-server")
+    parser.add_argument("--drain-interval", type=float, default=5.0,
+                        help="Dashboard refresh interval simulated by --spawn-server")
+    parser.add_argument("--server-pid", type=int, help="PID of an external server to sample memory from")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/ingest_<ts>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
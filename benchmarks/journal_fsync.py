@@ -0,0 +1,151 @@
+"""Benchmark de las políticas de fsync del journal de ingesta.
+
+Varios hilos (como los hilos de Flask) escriben peticiones en un
+``IngestJournal`` durante un tiempo fijo con cada política y se reporta
+throughput, latencia de confirmación p50/p99 y cantidad de fsyncs: cuánto
+cuesta que cada 200 sea durable frente a ``never`` (sin fsync).
+
+Ejemplos:
+    python benchmarks/journal_fsync.py --writers 8 --duration 5
+    python benchmarks/journal_fsync.py --policies group --window-ms 1 2 5 10 --dir /var/lib/iot
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest_journal import FSYNC_POLICIES, GROUP, IngestJournal  # noqa: E402
+from sensor_codec import SENSOR_FIELDS  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+DURABILITY = {
+    "always": "acknowledged readings survive process and OS crashes",
+    "group": "acknowledged readings survive process and OS crashes",
+    "never": "acknowledged readings survive process crashes only",
+}
+
+
+def make_batch(writer, size):
+    now = datetime.now()
+    batch = []
+    for _ in range(size):
+        reading = {"sensor_id": f"ESP32_{writer:03d}"}
+        for field in SENSOR_FIELDS:
+            reading[field] = random.randint(0, 4095)
+        reading["timestamp"] = now.strftime("%Y-%m-%d %H:%M:%S")
+        reading["datetime"] = now
+        batch.append(reading)
+    return batch
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+def run_policy(policy, window_ms, args, directory):
+    path = os.path.join(directory, f"bench_{policy}_{window_ms}.wal")
+    journal = IngestJournal(path, fsync=policy, window_ms=window_ms)
+    latencies = [[] for _ in range(args.writers)]
+    stop_at = time.monotonic() + args.duration
+
+    def writer(index):
+        batch = make_batch(index, args.batch_size)
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            journal.append(batch)
+            latencies[index].append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    stats = journal.stats()
+    journal.close()
+    for suffix in ("", ".1"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    all_latencies = [ms for per_writer in latencies for ms in per_writer]
+    requests_done = len(all_latencies)
+    return {
+        "fsync": policy,
+        "window_ms": window_ms if policy == GROUP else None,
+        "requests": requests_done,
+        "requests_per_second": requests_done / elapsed if elapsed else 0.0,
+        "readings_per_second": requests_done * args.batch_size / elapsed if elapsed else 0.0,
+        "ack_latency_ms": {
+            "p50": percentile(all_latencies, 0.50),
+            "p99": percentile(all_latencies, 0.99),
+            "max": max(all_latencies) if all_latencies else None,
+        },
+        "fsyncs": stats["fsyncs"],
+        "requests_per_fsync": requests_done / stats["fsyncs"] if stats["fsyncs"] else None,
+        "durability": DURABILITY[policy],
+    }
+
+
+def run_benchmark(args):
+    directory = args.dir or tempfile.mkdtemp(prefix="journal_bench_")
+    runs = []
+    for policy in args.policies:
+        windows = args.window_ms if policy == GROUP else [0]
+        for window_ms in windows:
+            runs.append(run_policy(policy, window_ms, args, directory))
+    if not args.dir:
+        os.rmdir(directory)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "writers": args.writers,
+            "duration_seconds": args.duration,
+            "batch_size": args.batch_size,
+            "directory": args.dir or "tmp",
+        },
+        "runs": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest journal fsync policy benchmark")
+    parser.add_argument("--policies", nargs="+", choices=FSYNC_POLICIES, default=list(FSYNC_POLICIES),
+                        help="fsync policies to compare")
+    parser.add_argument("--window-ms", nargs="+", type=float, default=[2.0],
+                        help="Group commit windows to try (group policy only)")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writer threads")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per policy")
+    parser.add_argument("--batch-size", type=int, default=1, help="Readings per request")
+    parser.add_argument("--dir", help="Directory for the journal files (default: a temp dir)")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/journal_<ts>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"journal_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
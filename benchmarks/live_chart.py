@@ -0,0 +1,113 @@
+"""Benchmark de las gráficas en tiempo real: figura completa frente a deltas.
+
+Para N series y un log de M lecturas, compara por rerun con K lecturas nuevas:
+
+- ``plotly_chart``: lo que se hacía antes, ``go.Figure`` + ``add_trace`` por
+  serie + ``update_layout`` y la serialización a JSON que envía
+  ``st.plotly_chart``;
+- ``live full``: la especificación de ``live_chart.build_figure`` (solo
+  cuando cambian las series o el navegador resincroniza);
+- ``live delta``: ``live_chart.build_delta`` con las K lecturas nuevas, que
+  es lo que se envía en el resto de los reruns.
+
+Ejemplos:
+    python benchmarks/live_chart.py
+    python benchmarks/live_chart.py --series 12 --points 1000 --new 1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+
+import plotly.graph_objects as go  # noqa: E402
+import plotly.io as pio  # noqa: E402
+
+from live_chart import build_delta, build_figure  # noqa: E402
+
+LAYOUT = {
+    "title": {"text": "Real-time Sensor Data"},
+    "xaxis": {"title": {"text": "Time"}},
+    "yaxis": {"title": {"text": "Value"}},
+    "hovermode": "x unified",
+    "height": 500,
+}
+
+
+def make_readings(series, points):
+    start = datetime.now() - timedelta(seconds=points)
+    return [
+        {"datetime": start + timedelta(seconds=i), **{f"SENSOR_{s}": (i * (s + 1)) % 4096 for s in range(series)}}
+        for i in range(points)
+    ]
+
+
+def timed(fn, repeat):
+    """Mediana en ms de ``repeat`` ejecuciones y el resultado de la última."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 3), result
+
+
+def run_benchmark(args):
+    readings = make_readings(args.series, args.points)
+    fields = [f"SENSOR_{s}" for s in range(args.series)]
+    new = readings[-args.new:]
+
+    def plotly_chart():
+        xs = [r["datetime"] for r in readings]
+        fig = go.Figure()
+        for field in fields:
+            fig.add_trace(go.Scatter(x=xs, y=[r[field] for r in readings], mode="lines+markers", name=field))
+        fig.update_layout(title="Real-time Sensor Data", xaxis_title="Time", yaxis_title="Value",
+                          hovermode="x unified", height=500)
+        return pio.to_json(fig, validate=False)
+
+    def live_full():
+        return json.dumps(build_figure(readings, fields, layout=LAYOUT))
+
+    def live_delta():
+        return json.dumps(build_delta(new, fields, args.points - args.new, args.points))
+
+    report = {"series": args.series, "points": args.points, "new_readings": args.new}
+    for name, fn in (("plotly_chart", plotly_chart), ("live_full", live_full), ("live_delta", live_delta)):
+        ms, payload = timed(fn, args.repeat)
+        report[name] = {"ms_per_rerun": ms, "bytes_per_rerun": len(payload.encode())}
+        print(f"{name:13} {ms:9.3f} ms  {len(payload.encode()):>10,} bytes", file=sys.stderr)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Full figure vs delta updates for the real-time charts")
+    parser.add_argument("--series", type=int, default=6, help="Series plotted")
+    parser.add_argument("--points", type=int, default=1000, help="Readings in the log (chart window)")
+    parser.add_argument("--new", type=int, default=1, help="New readings per rerun")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/live_chart_<ts>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"live_chart_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark de los pollers de iot_controller contra una flota simulada.
+
+Levanta N ESP32 de ``device_simulator.py`` (con las fallas pedidas), crea un
+``DeviceHub`` por dispositivo como ``get_device_hub`` y suscribe una sesión
+a cada poller durante un tiempo fijo. Reporta lecturas por segundo frente a
+las pedidas, estados de salud, consultas evitadas por el circuit breaker,
+RTT p50/p99 e hilos usados.
+
+Ejemplos:
+    python benchmarks/poller_fleet.py --devices 200 --interval 1 --duration 20
+    python benchmarks/poller_fleet.py --devices 100 --multiplex --drop-rate 0.05 --outage-rate 30
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from device_simulator import DeviceFleet, Faults  # noqa: E402
+from shared_store import DeviceHub  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+def make_fetch(url):
+    """Igual que el ``fetch`` de get_device_hub en iot_controller.py."""
+    def fetch(timeout=5):
+        resp = requests.get(f"{url}/sensor", timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+    return fetch
+
+
+def run_benchmark(args):
+    faults = Faults(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        drop_rate=args.drop_rate, outage_rate=args.outage_rate, outage_seconds=args.outage_seconds,
+    )
+    threads_before = threading.active_count()
+    with DeviceFleet(args.devices, multiplex=args.multiplex, faults=faults,
+                     time_scale=args.time_scale, seed=args.seed) as fleet:
+        hubs = {device_id: DeviceHub(make_fetch(url)) for device_id, url in fleet.urls.items()}
+        started = time.monotonic()
+        stop_at = started + args.duration
+        while time.monotonic() < stop_at:
+            # Renovar la suscripción como lo hace cada rerun de la sesión
+            for hub in hubs.values():
+                hub.poller.subscribe("benchmark", args.interval)
+            time.sleep(min(1.0, max(0.0, stop_at - time.monotonic())))
+        elapsed = time.monotonic() - started
+        threads_peak = threading.active_count()
+        for hub in hubs.values():
+            hub.poller.unsubscribe("benchmark")
+        simulator = fleet.stats()
+
+    summaries = [hub.health.summary(args.interval) for hub in hubs.values()]
+    readings = sum(hub.sensor_data.version for hub in hubs.values())
+    requested = args.devices * elapsed / args.interval
+    rtt_p50 = [s["rtt_p50_ms"] for s in summaries if s["rtt_p50_ms"] is not None]
+    rtt_p99 = [s["rtt_p99_ms"] for s in summaries if s["rtt_p99_ms"] is not None]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "devices": args.devices,
+            "multiplex": args.multiplex,
+            "interval_seconds": args.interval,
+            "duration_seconds": args.duration,
+            "time_scale": args.time_scale,
+            "faults": vars(faults),
+        },
+        "readings": readings,
+        "readings_per_second": readings / elapsed if elapsed else 0.0,
+        "requested_per_second": requested / elapsed if elapsed else 0.0,
+        "requests": sum(s["requests"] for s in summaries),
+        "skipped_polls": sum(s["skipped_polls"] for s in summaries),
+        "status": dict(Counter(s["status"] for s in summaries)),
+        "rtt_ms": {
+            "median_p50": percentile(rtt_p50, 0.5),
+            "worst_p99": max(rtt_p99) if rtt_p99 else None,
+        },
+        "poller_threads": threads_peak - threads_before,
+        "simulator": simulator,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Device poller benchmark against simulated ESP32s")
+    parser.add_argument("--devices", type=int, default=50, help="Simulated devices (one hub each)")
+    parser.add_argument("--multiplex", action="store_true", help="Serve all devices from one port")
+    parser.add_argument("--interval", type=float, default=1.0, help="Refresh interval requested by the session")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Simulated seconds per real second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--outage-rate", type=float, default=0.0, help="Full outages per device and hour")
+    parser.add_argument("--outage-seconds", type=float, default=30.0)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/pollers_<ts>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pollers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Benchmark de arranque de las páginas de Streamlit (importaciones y primer render).
+
+Cada medición corre en un proceso nuevo, como un worker recién levantado:
+importa Streamlit (el servidor ya lo tiene cargado antes de ejecutar la
+página) y luego ejecuta la página una vez con ``AppTest`` (tiempo hasta el
+primer render). Con ``-X importtime`` se perfilan las importaciones hechas
+durante ese render, agrupadas por paquete. Se compara el modo perezoso
+(``lazy_imports``) con ``IOT_EAGER_IMPORTS=1``, que importa todo al cargar
+la página como antes.
+
+No necesita red ni servicios: las páginas se ejecutan en modo local.
+
+Ejemplos:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --apps api_server.py --repeat 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+APPS = ("api_server.py", "iot_controller.py", "app.py")
+MARKER = "-- first render --"
+HEAVY = ("pandas", "plotly", "google", "grpc", "pyarrow", "flask", "numpy")
+
+
+def child(app):
+    """Medición dentro del proceso hijo; imprime un JSON en stdout."""
+    import resource
+
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_seconds = time.perf_counter() - started
+    modules_before = set(sys.modules)
+    sys.stderr.write(MARKER + "\n")
+    sys.stderr.flush()
+
+    render_started = time.perf_counter()
+    at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=120).run()
+    render_seconds = time.perf_counter() - render_started
+
+    from lazy_imports import import_times
+    loaded = set(sys.modules) - modules_before
+    print(json.dumps({
+        "streamlit_import_s": round(streamlit_seconds, 3),
+        "first_render_s": round(render_seconds, 3),
+        "exceptions": [e.value for e in at.exception],
+        "modules_loaded": len(loaded),
+        "heavy_loaded": sorted({m.split(".")[0] for m in loaded if m.split(".")[0] in HEAVY}),
+        "deferred_imports_s": {name: round(s, 3) for name, s in import_times().items()},
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+    sys.stdout.flush()
+    # Los hilos de fondo de las páginas (pollers, ingesta) no deben retener el proceso
+    os._exit(0)
+
+
+def parse_importtime(stderr, top):
+    """Tiempo propio por paquete de primer nivel, solo después del marcador."""
+    per_package = defaultdict(float)
+    seen_marker = False
+    for line in stderr.splitlines():
+        if line.strip() == MARKER:
+            seen_marker = True
+            continue
+        if not seen_marker or not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|", 2)
+            per_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+        except ValueError:
+            continue
+    ranked = sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+    return {name: round(seconds, 3) for name, seconds in ranked[:top]}
+
+
+def measure(app, eager, top):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONWARNINGS="ignore")
+    env.pop("IOT_EAGER_IMPORTS", None)
+    if eager:
+        env["IOT_EAGER_IMPORTS"] = "1"
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child", app],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=300,
+    )
+    wall = time.perf_counter() - started
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{app} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(lines[-1])
+    result["process_wall_s"] = round(wall, 3)
+    result["import_profile_s"] = parse_importtime(proc.stderr, top)
+    return result
+
+
+def run_benchmark(args):
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "apps": {}}
+    for app in args.apps:
+        report["apps"][app] = {}
+        for mode in ("lazy", "eager"):
+            runs = [measure(app, mode == "eager", args.top) for _ in range(args.repeat)]
+            summary = dict(runs[0])
+            for key in ("first_render_s", "process_wall_s", "streamlit_import_s", "max_rss_mb"):
+                summary[key] = round(statistics.median(r[key] for r in runs), 3)
+            report["apps"][app][mode] = summary
+            print(f"{app:20} {mode:5}  first render {summary['first_render_s']:.3f}s  "
+                  f"process {summary['process_wall_s']:.3f}s  rss {summary['max_rss_mb']}MB  "
+                  f"heavy: {', '.join(summary['heavy_loaded']) or '-'}", file=sys.stderr)
+        lazy, eager = report["apps"][app]["lazy"], report["apps"][app]["eager"]
+        report["apps"][app]["first_render_saved_s"] = round(eager["first_render_s"] - lazy["first_render_s"], 3)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Startup benchmark for the Streamlit pages")
+    parser.add_argument("--apps", nargs="+", default=list(APPS), help="Pages to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes per page and mode (median)")
+    parser.add_argument("--top", type=int, default=10, help="Packages to keep in the import profile")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/startup_<ts>.json)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        sys.path.insert(0, ROOT)
+        child(args.child)
+    report = run_benchmark(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Publicación/suscripción local entre la ingesta y sus consumidores.
+
+``receive_sensor_data`` publica cada lectura y cualquier número de
+consumidores (dashboard, persistencia, detección de anomalías, lazo de
+control) se suscriben y la consumen a su propio ritmo.
+
+Tópicos (estilo MQTT):
+    sensor/<sensor_id>            lectura completa
+    sensor/<sensor_id>/<campo>    valor de un campo ({"sensor_id", "field", "value", "timestamp"})
+
+Los patrones aceptan ``+`` (un nivel) y ``#`` (el resto). Los mensajes por
+campo solo se generan si hay alguna suscripción que pueda recibirlos.
+
+Cada suscripción tiene una cola acotada con política de desborde:
+    drop_oldest  descarta el mensaje más antiguo (por defecto)
+    block        el publicador espera hasta ``block_timeout`` y luego descarta el nuevo
+    sample       con la cola llena conserva 1 de cada ``sample_every`` mensajes nuevos
+    latest_per_topic  con la cola llena reemplaza en su lugar el mensaje pendiente del
+                 mismo tópico (se conserva la última lectura de cada dispositivo); si
+                 no hay ninguno, descarta el más antiguo de la cola
+
+Backends:
+    InProcessBroker   en el mismo proceso
+    UnixSocketBroker  cliente de un ``UnixSocketBrokerServer`` embebido (NDJSON sobre socket Unix)
+"""
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+SAMPLE = "sample"
+LATEST_PER_TOPIC = "latest_per_topic"
+OVERFLOW_POLICIES = (DROP_OLDEST, BLOCK, SAMPLE, LATEST_PER_TOPIC)
+
+DEFAULT_SOCKET_PATH = "/tmp/smart_city_broker.sock"
+
+
+def topic_matches(pattern, topic):
+    """¿El tópico coincide con el patrón (``+`` un nivel, ``#`` el resto)?"""
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def device_topic(sensor_id):
+    return f"sensor/{str(sensor_id).replace('/', '_')}"
+
+
+class Subscription:
+    """Cola acotada de un suscriptor con su política de desborde."""
+
+    def __init__(self, pattern, maxsize=1000, overflow=DROP_OLDEST, block_timeout=1.0, sample_every=10, on_drop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+        self.pattern = pattern
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.sample_every = sample_every
+        self.on_drop = on_drop
+        self.delivered = 0
+        self.dropped = 0
+        self.closed = False
+        # Última vez (monotonic) que el consumidor vació la cola; None si nunca lo hizo
+        self.last_drained = None
+        self._queue = deque()
+        # latest_per_topic: tópico -> su último mensaje pendiente (lista mutable en la cola)
+        self._pending = {} if overflow == LATEST_PER_TOPIC else None
+        self._overflow_seen = 0
+        self._cond = threading.Condition()
+
+    def _drop(self, count=1):
+        self.dropped += count
+        if self.on_drop:
+            self.on_drop(count)
+
+    def put(self, topic, message):
+        """Encolar un mensaje aplicando la política de desborde."""
+        item = (time.monotonic(), topic, message)
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._queue) >= self.maxsize:
+                if self.overflow == BLOCK:
+                    if not self._cond.wait_for(lambda: len(self._queue) < self.maxsize or self.closed, self.block_timeout):
+                        self._drop()
+                        return
+                elif self.overflow == SAMPLE:
+                    self._overflow_seen += 1
+                    if self._overflow_seen % self.sample_every:
+                        self._drop()
+                        return
+                    self._queue.popleft()
+                    self._drop()
+                elif self.overflow == LATEST_PER_TOPIC:
+                    pending = self._pending.get(topic)
+                    if pending is not None:
+                        # O(1): el mensaje nuevo ocupa el lugar del pendiente del mismo tópico
+                        pending[0], pending[2] = item[0], message
+                        self._drop()
+                        self.delivered += 1
+                        self._cond.notify_all()
+                        return
+                    self._popleft()
+                    self._drop()
+                else:
+                    self._queue.popleft()
+                    self._drop()
+            if self._pending is not None:
+                item = self._pending[topic] = list(item)
+            self._queue.append(item)
+            self.delivered += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Siguiente ``(publicado_en, tópico, mensaje)`` o None si vence el timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self.closed, timeout):
+                return None
+            if not self._queue:
+                return None
+            item = self._popleft()
+            self._cond.notify_all()
+            return item
+
+    def drain(self, max_items=None):
+        """Sacar sin esperar todos los mensajes pendientes (o hasta ``max_items``)."""
+        with self._cond:
+            self.last_drained = time.monotonic()
+            count = len(self._queue) if max_items is None else min(max_items, len(self._queue))
+            items = [self._popleft() for _ in range(count)]
+            if items:
+                self._cond.notify_all()
+            return items
+
+    def _popleft(self):
+        item = self._queue.popleft()
+        if self._pending is None:
+            return item
+        if self._pending.get(item[1]) is item:
+            del self._pending[item[1]]
+        return tuple(item)
+
+    def qsize(self):
+        return len(self._queue)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class InProcessBroker:
+    """Broker en memoria: reparte cada mensaje a las suscripciones que coinciden."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self._field_level = 0  # suscripciones que pueden recibir mensajes por campo
+
+    def subscribe(self, pattern, **options):
+        subscription = Subscription(pattern, **options)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+            if _wants_fields(pattern):
+                self._field_level += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+                if _wants_fields(subscription.pattern):
+                    self._field_level -= 1
+
+    def publish(self, topic, message):
+        # La lista se reemplaza al suscribir, así que se puede recorrer sin el lock
+        for subscription in self._subscriptions:
+            if topic_matches(subscription.pattern, topic):
+                subscription.put(topic, message)
+
+    def publish_reading(self, reading):
+        """Publicar una lectura en su tópico de dispositivo y, si hace falta, por campo."""
+        topic = device_topic(reading.get("sensor_id", "unknown"))
+        self.publish(topic, reading)
+        if self._field_level:
+            for field, value in reading.items():
+                if field in ("sensor_id", "timestamp", "datetime"):
+                    continue
+                self.publish(f"{topic}/{field}", {
+                    "sensor_id": reading.get("sensor_id"),
+                    "field": field,
+                    "value": value,
+                    "timestamp": reading.get("timestamp"),
+                })
+
+    def subscription_stats(self):
+        return [
+            {"pattern": s.pattern, "queued": s.qsize(), "delivered": s.delivered, "dropped": s.dropped, "overflow": s.overflow}
+            for s in self._subscriptions
+        ]
+
+
+def _wants_fields(pattern):
+    parts = pattern.split("/")
+    return "#" in parts or len(parts) >= 3
+
+
+def _encode(obj):
+    return (json.dumps(obj, default=str) + "\n").encode()
+
+
+class _BrokerRequestHandler(socketserver.StreamRequestHandler):
+    """Una conexión de cliente: recibe órdenes ``pub``/``sub`` en NDJSON."""
+
+    def handle(self):
+        broker = self.server.broker
+        for line in self.rfile:
+            request = json.loads(line)
+            if request["op"] == "pub":
+                if request.get("reading"):
+                    broker.publish_reading(request["message"])
+                else:
+                    broker.publish(request["topic"], request["message"])
+            elif request["op"] == "sub":
+                options = request.get("options", {})
+                subscription = broker.subscribe(request["pattern"], **options)
+                try:
+                    while True:
+                        item = subscription.get(timeout=1.0)
+                        if item is None:
+                            continue
+                        _, topic, message = item
+                        self.wfile.write(_encode({"topic": topic, "message": message}))
+                except OSError:
+                    pass
+                finally:
+                    broker.unsubscribe(subscription)
+                return
+
+
+class UnixSocketBrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Broker local embebido: expone un ``InProcessBroker`` en un socket Unix."""
+
+    daemon_threads = True
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.broker = InProcessBroker()
+        super().__init__(path, _BrokerRequestHandler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class UnixSocketBroker:
+    """Cliente del broker por socket Unix con la misma interfaz que ``InProcessBroker``.
+
+    Cada suscripción abre su propia conexión y mantiene localmente su cola
+    acotada. Los ``datetime`` viajan como texto.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pub_sock = None
+        self._subscriptions = []
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def _send(self, request):
+        with self._lock:
+            if self._pub_sock is None:
+                self._pub_sock = self._connect()
+            try:
+                self._pub_sock.sendall(_encode(request))
+            except OSError:
+                self._pub_sock.close()
+                self._pub_sock = None
+                raise
+
+    def publish(self, topic, message):
+        self._send({"op": "pub", "topic": topic, "message": message})
+
+    def publish_reading(self, reading):
+        self._send({"op": "pub", "reading": True, "message": reading})
+
+    def subscribe(self, pattern, **options):
+        subscription = Subscription(pattern, **options)
+        sock = self._connect()
+        remote = {k: v for k, v in options.items() if k != "on_drop"}
+        sock.sendall(_encode({"op": "sub", "pattern": pattern, "options": remote}))
+
+        def reader():
+            try:
+                with sock, sock.makefile("rb") as stream:
+                    for line in stream:
+                        if subscription.closed:
+                            break
+                        item = json.loads(line)
+                        subscription.put(item["topic"], item["message"])
+            except (OSError, ValueError):
+                pass
+            finally:
+                subscription.close()
+
+        threading.Thread(target=reader, daemon=True).start()
+        self._subscriptions.append((subscription, sock))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        for entry in list(self._subscriptions):
+            if entry[0] is subscription:
+                self._subscriptions.remove(entry)
+                entry[1].close()
+
+    def subscription_stats(self):
+        return [
+            {"pattern": s.pattern, "queued": s.qsize(), "delivered": s.delivered, "dropped": s.dropped, "overflow": s.overflow}
+            for s, _ in self._subscriptions
+        ]
+
+
+def create_broker(backend=None, path=None):
+    """Crear el broker según ``IOT_BROKER_BACKEND`` (``inprocess`` o ``unix``).
+
+    Con ``unix`` se arranca el servidor embebido si el socket no existe.
+    """
+    backend = backend or os.environ.get("IOT_BROKER_BACKEND", "inprocess")
+    if backend == "inprocess":
+        return InProcessBroker()
+    if backend == "unix":
+        path = path or os.environ.get("IOT_BROKER_SOCKET", DEFAULT_SOCKET_PATH)
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(path)
+        except OSError:
+            UnixSocketBrokerServer(path).start()
+        return UnixSocketBroker(path)
+    raise ValueError(f"Unknown broker backend {backend!r}")
@@ -0,0 +1,188 @@
+"""Salud y conectividad de los dispositivos, con intervalos de sondeo adaptativos.
+
+``DeviceHealth`` registra cada petición a un dispositivo (RTT, errores,
+fallas consecutivas) y aplica un circuit breaker:
+
+    closed     se consulta normalmente
+    open       tras ``failure_threshold`` fallas seguidas no se consulta hasta
+               que pase ``cooldown`` (se duplica en cada apertura, hasta
+               ``max_cooldown``); un dispositivo caído no gasta timeouts
+    half_open  pasado el cooldown se permite una sola consulta de prueba
+
+El timeout de cada consulta sale del p99 reciente del RTT, y el intervalo
+de sondeo se adapta a la volatilidad de las lecturas: se acorta (hasta el
+mínimo pedido por las sesiones) cuando los valores cambian y se alarga
+(hasta ``max_factor`` veces ese mínimo) cuando están quietos.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from ingest_metrics import Histogram
+
+RTT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+RECENT_SAMPLES = 50
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DeviceHealth:
+    """RTT, errores, circuit breaker e intervalo adaptativo de un dispositivo."""
+
+    def __init__(self, failure_threshold=3, cooldown=5.0, max_cooldown=300.0,
+                 min_timeout=0.5, max_timeout=5.0, max_factor=6.0, change_tolerance=0.01):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_factor = max_factor
+        self.change_tolerance = change_tolerance
+        self.rtt = Histogram(RTT_BUCKETS)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.skipped = 0  # consultas evitadas con el circuito abierto
+        self.last_success = None
+        self.last_error = None
+        self.state = CLOSED
+        self.volatility = 0.0  # fracción de campos que cambiaron (media móvil)
+        self.interval_factor = 1.0
+        self._cooldown = cooldown
+        self._opened_at = None
+        self._recent_rtt = deque(maxlen=RECENT_SAMPLES)
+        self._recent_ok = deque(maxlen=RECENT_SAMPLES)
+        self._last_values = None
+        self._lock = threading.Lock()
+
+    # Circuit breaker
+
+    def allow_request(self):
+        """¿Se puede consultar ahora? Pasa a half_open cuando vence el cooldown."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+                self.state = HALF_OPEN
+                return True
+            if self.state == OPEN:
+                self.skipped += 1
+                return False
+            return True
+
+    def record_success(self, rtt):
+        with self._lock:
+            self.requests += 1
+            self.rtt.observe(rtt)
+            self._recent_rtt.append(rtt)
+            self._recent_ok.append(True)
+            self.consecutive_failures = 0
+            self.last_success = time.time()
+            self.state = CLOSED
+            self._cooldown = self.base_cooldown
+
+    def record_failure(self, error):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self._recent_ok.append(False)
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN:
+                # La prueba falló: se vuelve a abrir con más espera
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+
+    @contextmanager
+    def track(self):
+        """Medir una petición al dispositivo: registra el RTT o la falla y relanza el error."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.perf_counter() - started)
+
+    # Timeout e intervalo
+
+    def _rtt_quantile(self, q):
+        recent = sorted(self._recent_rtt)
+        return recent[min(len(recent) - 1, int(q * len(recent)))] if recent else None
+
+    def timeout(self):
+        """Timeout de la próxima consulta: 3 veces el p99 reciente, acotado."""
+        with self._lock:
+            p99 = self._rtt_quantile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, 3 * p99))
+
+    def observe_reading(self, reading):
+        """Actualizar la volatilidad con una lectura nueva y ajustar el intervalo."""
+        values = {k: v for k, v in reading.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        with self._lock:
+            previous, self._last_values = self._last_values, values
+            if previous is None or not values:
+                return
+            changed = sum(
+                1 for k, v in values.items()
+                if k not in previous or abs(v - previous[k]) > self.change_tolerance * max(abs(previous[k]), 1)
+            )
+            fraction = changed / len(values)
+            self.volatility = 0.7 * self.volatility + 0.3 * fraction
+            if fraction > 0:
+                self.interval_factor = max(1.0, self.interval_factor / 2)
+            else:
+                self.interval_factor = min(self.max_factor, self.interval_factor * 1.5)
+
+    def next_interval(self, requested):
+        """Espera hasta la próxima consulta dado el intervalo mínimo que piden las sesiones."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._cooldown - (time.monotonic() - self._opened_at)
+                return max(requested, remaining)
+            return requested * self.interval_factor
+
+    # Estado
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            return self._recent_ok.count(False) / len(self._recent_ok) if self._recent_ok else 0.0
+
+    @property
+    def status(self):
+        """Online / Degraded / Offline / Unknown para mostrar en la UI."""
+        if self.state == OPEN:
+            return "Offline"
+        if not self.requests:
+            return "Unknown"
+        if self.consecutive_failures or self.error_rate > 0.2:
+            return "Degraded" if self.last_success else "Offline"
+        return "Online"
+
+    def summary(self, requested_interval=None):
+        with self._lock:
+            p50, p99 = self._rtt_quantile(0.5), self._rtt_quantile(0.99)
+        return {
+            "status": self.status,
+            "circuit": self.state,
+            "requests": self.requests,
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "skipped_polls": self.skipped,
+            "rtt_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "rtt_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_s": round(self.timeout(), 2),
+            "volatility": round(self.volatility, 3),
+            "poll_interval_s": round(self.next_interval(requested_interval), 1) if requested_interval else None,
+            "last_error": self.last_error,
+        }
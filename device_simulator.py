@@ -0,0 +1,465 @@
+"""Simulador de ESP32 para probar sin hardware y planificar capacidad.
+
+Cada ``VirtualDevice`` reproduce la API HTTP de ``proyecto_final.ino``:
+
+    GET  /sensor    -> las 11 lecturas de handleGetSensor() + WIND_SPEED y PRECIPITATION
+    POST /actuator  -> {"state": 0|1} responde {"status": estado}; 400 sin cuerpo o
+                       con JSON inválido, 422 sin "state"; cualquier otra ruta 404
+
+Las lecturas siguen un modelo de intersección: dos accesos con colas de
+vehículos (llegadas de Poisson con picos en hora punta) que se vacían con el
+verde del ciclo del semáforo (TVerde, parpadeo, TAmarillo del firmware); los
+CNY marcan la ocupación a lo largo de cada cola, P1/P2 son pulsadores
+peatonales, las LDR siguen el ciclo del día y la nubosidad, y el CO2 sube
+con los vehículos detenidos. El estado 1 del actuador es el modo emergencia
+(amarillo intermitente en ambos accesos), donde las colas avanzan despacio.
+
+Como el WebServer del firmware, cada dispositivo atiende una petición a la
+vez y cierra la conexión al responder. ``Faults`` agrega latencia y jitter,
+errores 500, conexiones cortadas, peticiones colgadas y caídas completas.
+
+``DeviceFleet`` levanta N dispositivos, cada uno en su puerto o todos en un
+solo servidor multiplexado (``http://host:port/<device_id>/sensor``).
+``time_scale`` acelera el reloj simulado (con 60 un día pasa en 24 minutos).
+``GET /_simulator/stats`` devuelve contadores de los dispositivos del servidor.
+
+Ejemplos:
+    python device_simulator.py --devices 200 --port 9000
+    python device_simulator.py --devices 500 --multiplex --port 9000 --latency-ms 40 --jitter-ms 20 --drop-rate 0.01
+"""
+import argparse
+import json
+import math
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Tiempos del ciclo del semáforo en proyecto_final.ino (segundos)
+T_GREEN = 5.0
+T_BLINK = 0.5
+T_YELLOW = 1.0
+BLINKS = 5
+# Verde, parpadeo (5 apagados + 5 encendidos) y amarillo de un acceso
+APPROACH_PHASE = T_GREEN + 2 * BLINKS * T_BLINK + T_YELLOW
+
+STEP = 0.5  # paso de la simulación en segundos simulados
+MAX_STEPS = 7200  # si pasó más tiempo, se simula solo la última hora
+QUEUE_CAPACITY = 12
+# Posición en la cola que cubre cada CNY de un acceso (1 = línea de pare)
+CNY_POSITIONS = (1, 3, 6)
+SATURATION_FLOW = 0.5  # vehículos/s que cruzan con verde
+EMERGENCY_FLOW = 0.15  # con amarillo intermitente se cruza con precaución
+ADC_MAX = 4095
+
+
+@dataclass
+class Faults:
+    """Fallas inyectadas en las respuestas de un dispositivo."""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0  # responde 500
+    drop_rate: float = 0.0  # cierra la conexión sin responder
+    hang_rate: float = 0.0  # no responde durante hang_seconds (el cliente agota su timeout)
+    hang_seconds: float = 10.0
+    outage_rate: float = 0.0  # caídas completas por hora (reales) y dispositivo
+    outage_seconds: float = 30.0
+
+    def delay(self, rng):
+        return max(0.0, rng.gauss(self.latency_ms, self.jitter_ms)) / 1000 if self.latency_ms or self.jitter_ms else 0.0
+
+
+def traffic_rate(hour):
+    """Llegadas de vehículos por segundo y acceso según la hora del día."""
+    base = 0.03 + 0.12 * max(0.0, math.sin(math.pi * (hour - 5) / 18)) if 5 <= hour <= 23 else 0.02
+    rush = 0.25 * math.exp(-((hour - 7.5) ** 2) / 0.8) + 0.22 * math.exp(-((hour - 17.75) ** 2) / 1.2)
+    return base + rush
+
+
+class Weather:
+    """Nubosidad, viento y lluvia compartidos por la flota (una sola ciudad)."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.cloud = rng.uniform(0.1, 0.6)
+        self.wind = rng.uniform(2, 15)
+        self.rain = 0.0
+        self._updated = None
+        self._lock = threading.Lock()
+
+    def at(self, sim_time):
+        """Avanzar el clima (como getWeather, cada 60 s simulados) y devolverlo."""
+        with self._lock:
+            if self._updated is None:
+                self._updated = sim_time
+            while (sim_time - self._updated).total_seconds() >= 60:
+                self._updated += timedelta(seconds=60)
+                self.cloud = min(1.0, max(0.0, self.cloud + self.rng.gauss(0, 0.04)))
+                self.wind = min(60.0, max(0.0, self.wind + self.rng.gauss(0, 0.8)))
+                self.rain = round(max(0.0, (self.cloud - 0.75) * 12 + self.rng.gauss(0, 0.3)), 1) if self.cloud > 0.75 else 0.0
+            return self.cloud, round(self.wind, 1), self.rain
+
+
+class VirtualDevice:
+    """Un ESP32 simulado: estado de la intersección, actuador y fallas."""
+
+    def __init__(self, device_id, clock, weather, faults=None, seed=None):
+        self.device_id = device_id
+        self.clock = clock
+        self.weather = weather
+        self.faults = faults or Faults()
+        self.rng = random.Random(seed)
+        self.actuator_state = 0
+        # Ubicación: cada intersección tiene más o menos tráfico y sombra
+        self.traffic_scale = self.rng.uniform(0.5, 1.6)
+        self.light_offsets = (self.rng.uniform(-150, 150), self.rng.uniform(-150, 150))
+        self.queues = [0, 0]
+        self.buttons = [0.0, 0.0]  # segundos simulados que sigue presionado P1/P2
+        self.co2 = self.rng.uniform(700, 900)
+        self.requests = 0
+        self.failures = 0
+        self.outage_until = 0.0
+        self._sim_time = None
+        self._cycle = self.rng.uniform(0, 2 * APPROACH_PHASE)
+        self._last_fault_check = time.monotonic()
+        self._state_lock = threading.Lock()
+        # El WebServer del firmware atiende un cliente a la vez
+        self.serial = threading.Lock()
+
+    # Modelo de la intersección
+
+    def _green(self, approach):
+        """Fracción de paso que tiene un acceso en este instante del ciclo."""
+        if self.actuator_state == 1:
+            return EMERGENCY_FLOW / SATURATION_FLOW
+        position = self._cycle % (2 * APPROACH_PHASE)
+        active = 0 if position < APPROACH_PHASE else 1
+        if approach != active:
+            return 0.0
+        return 1.0 if position % APPROACH_PHASE < APPROACH_PHASE - T_YELLOW else 0.5
+
+    def _step(self, sim_time):
+        hour = sim_time.hour + sim_time.minute / 60
+        arrivals = traffic_rate(hour) * self.traffic_scale * STEP
+        for approach in (0, 1):
+            if self.rng.random() < arrivals:
+                self.queues[approach] = min(QUEUE_CAPACITY, self.queues[approach] + 1)
+            if self.queues[approach] and self.rng.random() < SATURATION_FLOW * STEP * self._green(approach):
+                self.queues[approach] -= 1
+            self.buttons[approach] = max(0.0, self.buttons[approach] - STEP)
+            if self.rng.random() < traffic_rate(hour) * 0.05 * STEP:
+                self.buttons[approach] = 2.0
+        self._cycle += STEP
+        stopped = sum(self.queues)
+        target = 650 + 60 * stopped + 8 * traffic_rate(hour) * 100
+        self.co2 += 0.05 * (target - self.co2) + self.rng.gauss(0, 4)
+
+    def advance(self):
+        """Simular hasta el reloj actual; devuelve el instante simulado."""
+        with self._state_lock:
+            now = self.clock()
+            if self._sim_time is None:
+                self._sim_time = now
+            steps = int((now - self._sim_time).total_seconds() / STEP)
+            if steps > MAX_STEPS:
+                self._sim_time = now - timedelta(seconds=MAX_STEPS * STEP)
+                steps = MAX_STEPS
+            for _ in range(steps):
+                self._sim_time += timedelta(seconds=STEP)
+                self._step(self._sim_time)
+            return now
+
+    def reading(self):
+        """Lectura con el esquema y el orden de handleGetSensor()."""
+        now = self.advance()
+        cloud, wind, rain = self.weather.at(now)
+        hour = now.hour + now.minute / 60 + now.second / 3600
+        daylight = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+        with self._state_lock:
+            light = [
+                min(ADC_MAX, max(0, int(180 + 3600 * daylight * (1 - 0.6 * cloud) + offset + self.rng.gauss(0, 35))))
+                for offset in self.light_offsets
+            ]
+            cny = [int(self.queues[approach] >= position) for approach in (0, 1) for position in CNY_POSITIONS]
+            reading = {
+                "SENSOR_LIGHT_LEFT": light[0],
+                "SENSOR_LIGHT_RIGHT": light[1],
+                "SENSOR_CO2": min(ADC_MAX, max(0, int(self.co2))),
+            }
+            for index, value in enumerate(cny, start=1):
+                reading[f"SENSOR_CNY{index}"] = value
+            reading["SENSOR_P1"] = int(self.buttons[0] > 0)
+            reading["SENSOR_P2"] = int(self.buttons[1] > 0)
+        reading["WIND_SPEED"] = wind
+        reading["PRECIPITATION"] = rain
+        return reading
+
+    def set_actuator(self, body):
+        """Aplicar POST /actuator como handlePostActuator(); devuelve (código, payload)."""
+        if not body:
+            return 400, {"error": "Body missing"}
+        try:
+            doc = json.loads(body)
+        except ValueError:
+            return 400, {"error": "JSON invalid"}
+        if not isinstance(doc, dict) or "state" not in doc:
+            return 422, {"error": "Field 'state' missing"}
+        self.advance()
+        state = doc["state"]
+        # ArduinoJson convierte true/false y números a int
+        with self._state_lock:
+            self.actuator_state = int(state) if isinstance(state, (bool, int, float)) else 0
+            return 200, {"status": self.actuator_state}
+
+    # Fallas
+
+    def fault(self):
+        """Falla a aplicar a esta petición: None, "error", "drop", "hang" u "outage"."""
+        faults = self.faults
+        now = time.monotonic()
+        with self._state_lock:
+            elapsed, self._last_fault_check = now - self._last_fault_check, now
+            if faults.outage_rate and now >= self.outage_until:
+                if self.rng.random() < 1 - math.exp(-faults.outage_rate * elapsed / 3600):
+                    self.outage_until = now + faults.outage_seconds
+            if now < self.outage_until:
+                return "outage"
+            draw = self.rng.random()
+        for kind, rate in (("error", faults.error_rate), ("drop", faults.drop_rate), ("hang", faults.hang_rate)):
+            if draw < rate:
+                return kind
+            draw -= rate
+        return None
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "actuator_state": self.actuator_state,
+            "queues": list(self.queues),
+            "offline": time.monotonic() < self.outage_until,
+        }
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Rutas del firmware; en modo multiplexado con el id del dispositivo como prefijo."""
+
+    # Como el WebServer del ESP32: una respuesta por conexión
+    protocol_version = "HTTP/1.0"
+    server_version = "ESP32-WebServer"
+    sys_version = ""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _send(self, code, payload, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        path = self.path.split("?", 1)[0]
+        if path == "/_simulator/stats":
+            return self._send(200, self.server.fleet_stats())
+        device, route = self.server.route(path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if device is None:
+            return self._send(404, b"Not Found", "text/plain")
+
+        with device.serial:
+            device.requests += 1
+            fault = device.fault()
+            if fault in ("outage", "drop"):
+                # Sin respuesta: el cliente ve la conexión cerrada
+                device.failures += 1
+                self.close_connection = True
+                try:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                return
+            if fault == "hang":
+                device.failures += 1
+                time.sleep(device.faults.hang_seconds)
+                self.close_connection = True
+                return
+            time.sleep(device.faults.delay(device.rng))
+            if fault == "error":
+                device.failures += 1
+                return self._send(500, {"error": "Internal error"})
+            if method == "GET" and route == "/sensor":
+                return self._send(200, device.reading())
+            if method == "POST" and route == "/actuator":
+                return self._send(*device.set_actuator(body))
+        return self._send(404, b"Not Found", "text/plain")
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, devices, multiplex):
+        self.devices = {device.device_id: device for device in devices}
+        self.multiplex = multiplex
+        super().__init__(address, SimulatorHandler)
+
+    def route(self, path):
+        """``(dispositivo, ruta del firmware)`` para una ruta pedida."""
+        if not self.multiplex:
+            return next(iter(self.devices.values())), path
+        _, device_id, route = (path.split("/", 2) + [""])[:3]
+        return self.devices.get(device_id), "/" + route
+
+    def fleet_stats(self):
+        return {device_id: device.stats() for device_id, device in self.devices.items()}
+
+
+class DeviceFleet:
+    """N dispositivos simulados en puertos propios o en un servidor multiplexado.
+
+    Con ``port=0`` cada servidor toma un puerto libre; si no, se usan
+    ``port``, ``port + 1``, ... (uno por dispositivo salvo en modo multiplexado).
+    """
+
+    def __init__(self, count, multiplex=False, host="127.0.0.1", port=0, faults=None,
+                 time_scale=1.0, start=None, seed=None, prefix="ESP32_SIM"):
+        self.host = host
+        self.port = port
+        self.multiplex = multiplex
+        self.time_scale = time_scale
+        rng = random.Random(seed)
+        self._sim_start = start or datetime.now()
+        self._real_start = time.monotonic()
+        self.weather = Weather(random.Random(rng.random()))
+        self.devices = [
+            VirtualDevice(f"{prefix}_{i:03d}", self.clock, self.weather, faults, seed=rng.random())
+            for i in range(count)
+        ]
+        self.servers = []
+        self._threads = []
+
+    def clock(self):
+        """Instante simulado (acelerado con ``time_scale``)."""
+        return self._sim_start + timedelta(seconds=(time.monotonic() - self._real_start) * self.time_scale)
+
+    def set_faults(self, faults, device_ids=None):
+        """Cambiar las fallas de todos los dispositivos o de algunos."""
+        for device in self.devices:
+            if device_ids is None or device.device_id in device_ids:
+                device.faults = faults
+
+    def start(self):
+        if self.multiplex:
+            groups = [self.devices]
+        else:
+            groups = [[device] for device in self.devices]
+        for index, group in enumerate(groups):
+            port = self.port + index if self.port else 0
+            server = SimulatorServer((self.host, port), group, self.multiplex)
+            thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.5}, daemon=True)
+            thread.start()
+            self.servers.append(server)
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers, self._threads = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def urls(self):
+        """URL base de cada dispositivo (lo que iot_controller usa como ``base_url``)."""
+        if self.multiplex:
+            host, port = self.servers[0].server_address[:2]
+            return {device.device_id: f"http://{host}:{port}/{device.device_id}" for device in self.devices}
+        return {
+            server_devices[0].device_id: f"http://{server.server_address[0]}:{server.server_address[1]}"
+            for server, server_devices in ((s, list(s.devices.values())) for s in self.servers)
+        }
+
+    def stats(self):
+        devices = {device.device_id: device.stats() for device in self.devices}
+        return {
+            "devices": len(devices),
+            "sim_time": self.clock().isoformat(timespec="seconds"),
+            "requests": sum(d["requests"] for d in devices.values()),
+            "failures": sum(d["failures"] for d in devices.values()),
+            "offline": sum(d["offline"] for d in devices.values()),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated ESP32 fleet (GET /sensor, POST /actuator)")
+    parser.add_argument("--devices", type=int, default=10, help="Number of virtual devices")
+    parser.add_argument("--multiplex", action="store_true", help="Serve every device from one port as /<device_id>/sensor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000, help="First port (0 for free ports)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Simulated seconds per real second")
+    parser.add_argument("--start-hour", type=float, help="Simulated hour of day to start at (default: now)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of connections closed without a response")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that never answer")
+    parser.add_argument("--outage-rate", type=float, default=0.0, help="Full outages per device and hour")
+    parser.add_argument("--outage-seconds", type=float, default=30.0)
+    parser.add_argument("--urls-file", help="Write the device URLs as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    faults = Faults(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        drop_rate=args.drop_rate, hang_rate=args.hang_rate, outage_rate=args.outage_rate,
+        outage_seconds=args.outage_seconds,
+    )
+    start = None
+    if args.start_hour is not None:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=args.start_hour)
+    fleet = DeviceFleet(args.devices, multiplex=args.multiplex, host=args.host, port=args.port, faults=faults,
+                        time_scale=args.time_scale, start=start, seed=args.seed).start()
+    urls = fleet.urls
+    if args.urls_file:
+        with open(args.urls_file, "w") as f:
+            json.dump(urls, f, indent=2)
+    for device_id, url in list(urls.items())[:5]:
+        print(f"{device_id}: {url}")
+    if len(urls) > 5:
+        print(f"... {len(urls) - 5} more")
+    print("Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(fleet.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Clientes y modelos de Gemini compartidos por todo el proceso.
+
+Antes cada rerun llamaba a ``genai.configure`` (que descarta los clientes y
+sus canales gRPC) y cada clic creaba un ``GenerativeModel``. ``GeminiPool``
+(creado una vez con ``st.cache_resource``) mantiene:
+
+- un cliente por API key, sin tocar la configuración global de ``genai``, así
+  que sesiones con keys distintas no se pisan;
+- un ``GenerativeModel`` por (key, modelo, temperatura, tokens, instrucción
+  de sistema), en un LRU de ``max_models``;
+- el canal caliente: se abre con una llamada barata (``count_tokens``) al
+  crear el cliente y se repite cada ``keepalive_interval`` segundos mientras
+  la key se siga usando;
+- latencias por modelo: hasta el primer fragmento (con ``stream=True``) y
+  total.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from ingest_metrics import Histogram
+from lazy_imports import lazy_import
+
+# google.generativeai (con gRPC) es la importación más lenta de la app: se
+# carga con el primer cliente, no al arrancar
+genai = lazy_import("google.generativeai")
+glm = lazy_import("google.ai.generativelanguage")
+client_options_lib = lazy_import("google.api_core.client_options")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+GeminiResult = namedtuple("GeminiResult", "response first_token_seconds total_seconds")
+
+
+class _ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.first_token = Histogram(LATENCY_BUCKETS)
+        self.total = Histogram(LATENCY_BUCKETS)
+
+
+class GeminiPool:
+    """Clientes por API key y modelos reutilizables, con métricas de latencia."""
+
+    def __init__(self, max_models=32, warm=True, keepalive_interval=240.0, idle_after=1800.0):
+        self.max_models = max_models
+        self.warm = warm
+        self.keepalive_interval = keepalive_interval
+        self.idle_after = idle_after
+        self._lock = threading.Lock()
+        self._clients = {}  # key_id -> [cliente, último uso, último modelo usado]
+        self._models = OrderedDict()
+        self._stats = {}
+        self.warmups = 0
+        self.models_created = 0
+        self._keepalive = None
+
+    @staticmethod
+    def _key_id(api_key):
+        # Las keys no quedan en claro en los diccionarios ni en las métricas
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def _client(self, api_key):
+        key_id = self._key_id(api_key)
+        with self._lock:
+            entry = self._clients.get(key_id)
+            if entry is None:
+                client = glm.GenerativeServiceClient(
+                    client_options=client_options_lib.ClientOptions(api_key=api_key)
+                )
+                entry = self._clients[key_id] = [client, time.monotonic(), None]
+            entry[1] = time.monotonic()
+            return entry
+
+    def model(self, api_key, model_name, temperature=None, max_output_tokens=None, system_instruction=None):
+        """``GenerativeModel`` reutilizable para esta combinación de key y configuración."""
+        entry = self._client(api_key)
+        key = (self._key_id(api_key), model_name, temperature, max_output_tokens, system_instruction)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                entry[2] = model
+                return model
+        config = None
+        if temperature is not None or max_output_tokens is not None:
+            config = genai.types.GenerationConfig(temperature=temperature, max_output_tokens=max_output_tokens)
+        model = genai.GenerativeModel(model_name, generation_config=config, system_instruction=system_instruction)
+        # El modelo usa el cliente de su key en vez del cliente global de genai.configure
+        model._client = entry[0]
+        with self._lock:
+            first_model = entry[2] is None
+            self._models[key] = model
+            self.models_created += 1
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            entry[2] = model
+        if first_model and self.warm:
+            threading.Thread(target=self._warm, args=(model,), daemon=True).start()
+            self._start_keepalive()
+        return model
+
+    def _warm(self, model):
+        """Abrir el canal (TLS + HTTP/2) con una llamada que no genera tokens."""
+        try:
+            model.count_tokens("ping")
+            with self._lock:
+                self.warmups += 1
+        except Exception:
+            pass
+
+    def _start_keepalive(self):
+        with self._lock:
+            if self._keepalive is not None or not self.keepalive_interval:
+                return
+            self._keepalive = threading.Thread(target=self._keepalive_loop, daemon=True)
+        self._keepalive.start()
+
+    def _keepalive_loop(self):
+        while True:
+            time.sleep(self.keepalive_interval)
+            now = time.monotonic()
+            with self._lock:
+                active = [model for _, last_used, model in self._clients.values()
+                          if model is not None and now - last_used < self.idle_after]
+            for model in active:
+                self._warm(model)
+
+    def generate(self, api_key, model_name, contents, temperature=None, max_output_tokens=None,
+                 system_instruction=None, stream=True, timeout=120):
+        """Generar con el modelo del pool; devuelve ``GeminiResult``.
+
+        Con ``stream=True`` se mide el tiempo hasta el primer fragmento y la
+        respuesta se completa antes de devolverla (``response.text`` funciona igual).
+        """
+        model = self.model(api_key, model_name, temperature, max_output_tokens, system_instruction)
+        with self._lock:
+            stats = self._stats.setdefault(model_name, _ModelStats())
+            stats.calls += 1
+        started = time.perf_counter()
+        first_token = None
+        try:
+            response = model.generate_content(contents, stream=stream, request_options={"timeout": timeout})
+            if stream:
+                for _ in response:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+        total = time.perf_counter() - started
+        if first_token is None:
+            first_token = total
+        with self._lock:
+            stats.first_token.observe(first_token)
+            stats.total.observe(total)
+        return GeminiResult(response, first_token, total)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "models": len(self._models),
+                "models_created": self.models_created,
+                "warmups": self.warmups,
+                "per_model": {
+                    name: {
+                        "calls": s.calls,
+                        "errors": s.errors,
+                        "first_token_p50_s": s.first_token.quantile(0.5),
+                        "first_token_p99_s": s.first_token.quantile(0.99),
+                        "total_p50_s": s.total.quantile(0.5),
+                        "total_p99_s": s.total.quantile(0.99),
+                        "total_mean_s": round(s.total.sum / s.total.total, 3) if s.total.total else None,
+                    }
+                    for name, s in self._stats.items()
+                },
+            }
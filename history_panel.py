@@ -0,0 +1,90 @@
+"""Panel de Streamlit para consultar el historial en disco (ver history_store.py)."""
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from history_query import AGGS, query_history
+from history_store import HOUR, MINUTE, RAW
+from lazy_imports import lazy_import
+from rerun_profiler import measure_figure, section
+
+px = lazy_import("plotly.express")
+
+TIME_RANGES = {
+    "Last hour": timedelta(hours=1),
+    "Last 6 hours": timedelta(hours=6),
+    "Last 24 hours": timedelta(hours=24),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "Last 365 days": timedelta(days=365),
+}
+
+
+def history_panel(store, key, device_ids=()):
+    """Gráficas del historial guardado; la resolución se elige según el rango pedido."""
+    st.subheader("🗄️ Stored History")
+    if store is None:
+        st.info("Set IOT_HISTORY_DIR to keep readings on disk with retention tiers (raw → per minute → per hour).")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        range_label = st.selectbox("Time range", list(TIME_RANGES), index=2, key=f"{key}_range")
+    with col2:
+        resolution = st.selectbox("Resolution", ["auto", RAW, MINUTE, HOUR], key=f"{key}_resolution")
+    with col3:
+        device = st.selectbox("Device", ["All"] + list(device_ids), key=f"{key}_device")
+
+    now = datetime.now()
+    with section("query: history"):
+        table, used = store.query(
+            now - TIME_RANGES[range_label],
+            now,
+            sensor_id=None if device == "All" else device,
+            resolution=None if resolution == "auto" else resolution,
+        )
+    st.caption(f"Resolution: {used} · {table.num_rows} rows")
+
+    fields = []
+    if table.num_rows:
+        df = table.to_pandas()
+        fields = [c for c in df.columns if c not in ("sensor_id", "ts") and not c.endswith(("_min", "_max"))]
+        selected = st.multiselect("Fields", fields, default=fields[:1], key=f"{key}_fields")
+        for field in selected:
+            with section("chart: history"):
+                fig = px.line(df, x="ts", y=field, color="sensor_id", title=f"{field} ({used})")
+            st.plotly_chart(measure_figure("figure bytes: history", fig), use_container_width=True)
+
+    with st.expander("🔎 Query"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            query_fields = st.text_input("Fields", value=",".join(fields[:1]), key=f"{key}_query_fields",
+                                         help="Comma separated; empty for all fields")
+        with col2:
+            every = st.text_input("Every", value="5min", key=f"{key}_query_every", help="30s, 5min, 1h, 1d; empty for rows")
+        with col3:
+            agg = st.selectbox("Aggregation", AGGS, key=f"{key}_query_agg")
+        where = st.text_input("Where", placeholder="SENSOR_LIGHT_LEFT < 1000", key=f"{key}_query_where")
+        if st.button("▶️ Run query", key=f"{key}_query_run"):
+            try:
+                result = query_history(
+                    store,
+                    now - TIME_RANGES[range_label],
+                    now,
+                    fields=[f.strip() for f in query_fields.split(",") if f.strip()] or None,
+                    sensor_id=None if device == "All" else device,
+                    where=where,
+                    every=every.strip() or None,
+                    agg=agg,
+                )
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                info = result.info
+                st.caption(f"{info['rows']} rows · {info['elapsed_ms']} ms · rows scanned per tier: {info['rows_scanned']}")
+                st.dataframe(result.table.to_pandas())
+
+    with st.expander("💽 Storage & Retention"):
+        st.json(store.stats())
+        if st.button("🗜️ Compact now", key=f"{key}_compact"):
+            st.json(store.compact())
@@ -0,0 +1,255 @@
+"""Consultas por rango de tiempo sobre el historial en disco (history_store.py).
+
+Responde preguntas como "media de SENSOR_CO2 cada 5 min del dispositivo X
+entre t1 y t2 donde SENSOR_LIGHT_LEFT < 1000":
+
+    query_history(store, t1, t2, fields=["SENSOR_CO2"], sensor_id="X",
+                  where="SENSOR_LIGHT_LEFT < 1000", every="5min", agg="mean")
+
+Los filtros de tiempo, dispositivo y ``where`` se pasan al lector de
+Parquet (se descartan archivos por nombre y row groups por estadísticas) y
+solo se leen las columnas necesarias. Se leen todos los niveles: cada
+período vive en uno solo, así la respuesta cubre el rango completo. Los
+niveles agregados se combinan de forma exacta (suma, cantidad, mínimo,
+máximo); en ellos ``where`` se evalúa sobre la media de cada bucket.
+
+El resultado es una tabla de Arrow con ``sensor_id``, ``ts`` y una columna
+``<campo>_<agg>`` por campo. También se expone en ``GET /sensor/query``
+(``register_query_routes``) como JSON o Arrow IPC (``format=arrow``).
+"""
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from history_store import RAW, TIERS
+from lazy_imports import lazy_import
+
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+ds = lazy_import("pyarrow.dataset")
+
+AGGS = ("mean", "min", "max", "sum", "count")
+# Columnas de los niveles agregados que necesita cada agregación
+AGG_COLUMNS = {"mean": ("sum", "count"), "min": ("min",), "max": ("max",), "sum": ("sum",), "count": ("count",)}
+TIER_BUCKETS = {RAW: None, "minute": "1min", "hour": "1h"}
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+QueryResult = namedtuple("QueryResult", "table info")
+
+_UNITS = {"s": "second", "sec": "second", "second": "second", "m": "minute", "min": "minute",
+          "minute": "minute", "h": "hour", "hour": "hour", "d": "day", "day": "day"}
+_UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_CONDITION = re.compile(r"^\s*(\w+)\s*(<=|>=|==|!=|=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$")
+_RELATIVE = re.compile(r"^-(\d+(?:\.\d+)?)\s*([a-z]+)$")
+
+
+def parse_interval(text):
+    """``"5min"`` -> ``(5, "minute")``."""
+    match = re.match(r"^\s*(\d+)\s*([a-z]+?)s?\s*$", text.lower())
+    if not match or match.group(2) not in _UNITS:
+        raise ValueError(f"Invalid interval {text!r} (e.g. 30s, 5min, 1h, 1d)")
+    return int(match.group(1)), _UNITS[match.group(2)]
+
+
+def parse_time(text, now=None):
+    """Fecha ISO o relativa a ahora (``-30min``, ``-2h``, ``-7d``)."""
+    now = now or datetime.now()
+    match = _RELATIVE.match(text.strip().lower())
+    if match and match.group(2).rstrip("s") in _UNITS:
+        seconds = float(match.group(1)) * _UNIT_SECONDS[_UNITS[match.group(2).rstrip("s")]]
+        return now - timedelta(seconds=seconds)
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid time {text!r} (ISO date or relative like -2h)") from None
+
+
+def parse_where(text):
+    """``"A < 1000 and B >= 2"`` -> ``[("A", "<", 1000.0), ("B", ">=", 2.0)]``."""
+    conditions = []
+    for part in re.split(r"\s+and\s+", text.strip(), flags=re.IGNORECASE):
+        match = _CONDITION.match(part)
+        if not match:
+            raise ValueError(f"Invalid condition {part!r} (e.g. SENSOR_LIGHT_LEFT < 1000)")
+        field, op, value = match.groups()
+        conditions.append((field, "==" if op == "=" else op, float(value)))
+    return conditions
+
+
+def _compare(expression, op, value):
+    return {
+        "<": expression < value, "<=": expression <= value, ">": expression > value,
+        ">=": expression >= value, "==": expression == value, "!=": expression != value,
+    }[op]
+
+
+def _tier_filter(tier, sensor_ids, conditions):
+    """Expresión a empujar al lector de Parquet de un nivel."""
+    expression = None
+    if sensor_ids:
+        expression = ds.field("sensor_id").isin(sensor_ids)
+    for field, op, value in conditions:
+        if tier == RAW:
+            column = ds.field(field)
+        else:
+            column = pc.divide(ds.field(f"{field}_sum"), ds.field(f"{field}_count").cast(pa.float64()))
+        condition = _compare(column, op, value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _tier_columns(tier, fields, agg, conditions):
+    """Columnas mínimas que hay que leer de un nivel."""
+    where_fields = [field for field, _, _ in conditions]
+    if tier == RAW:
+        return ["sensor_id", "ts"] + list(dict.fromkeys(list(fields) + where_fields))
+    suffixes = AGG_COLUMNS[agg]
+    return ["sensor_id", "ts"] + [f"{field}_{suffix}" for field in fields for suffix in suffixes]
+
+
+def _as_aggregates(table, tier, fields):
+    """Llevar un nivel a la forma (suma, cantidad, mínimo, máximo) por campo."""
+    if tier != RAW:
+        return table
+    columns = {"sensor_id": table["sensor_id"], "ts": table["ts"]}
+    for field in fields:
+        if field not in table.column_names:
+            continue
+        values = table[field]
+        columns[f"{field}_sum"] = values
+        columns[f"{field}_count"] = pc.cast(pc.is_valid(values), pa.int64())
+        columns[f"{field}_min"] = values
+        columns[f"{field}_max"] = values
+    return pa.table(columns)
+
+
+def _bucketize(table, fields, agg, every):
+    multiple, unit = parse_interval(every)
+    table = table.set_column(
+        table.column_names.index("ts"), "ts", pc.floor_temporal(table["ts"], multiple=multiple, unit=unit)
+    )
+    aggregations, names = [], []
+    for field in fields:
+        for suffix in AGG_COLUMNS[agg]:
+            column = f"{field}_{suffix}"
+            if column in table.column_names:
+                aggregations.append((column, {"sum": "sum", "count": "sum", "min": "min", "max": "max"}[suffix]))
+                names.append(column)
+    grouped = table.group_by(["sensor_id", "ts"], use_threads=False).aggregate(aggregations)
+    grouped = grouped.rename_columns(["sensor_id", "ts"] + names)
+    columns = {"sensor_id": grouped["sensor_id"], "ts": grouped["ts"]}
+    for field in fields:
+        if agg == "mean" and f"{field}_sum" in names:
+            columns[f"{field}_mean"] = pc.divide(grouped[f"{field}_sum"], pc.cast(grouped[f"{field}_count"], pa.float64()))
+        elif f"{field}_{agg}" in names:
+            columns[f"{field}_{agg}"] = grouped[f"{field}_{agg}"]
+    return pa.table(columns).sort_by([("ts", "ascending"), ("sensor_id", "ascending")])
+
+
+def query_history(store, start, end=None, fields=None, sensor_id=None, where=None, every=None, agg="mean"):
+    """Consultar el historial; devuelve ``QueryResult(tabla de Arrow, info)``.
+
+    ``sensor_id`` acepta un id o una lista, ``where`` un texto (``"A < 10 and B > 2"``)
+    o una lista de ``(campo, op, valor)``. Sin ``every`` se usa la resolución que
+    ``store.pick_resolution`` elige para el rango (filas crudas si es ``raw``).
+    """
+    started = time.perf_counter()
+    end = end or datetime.now()
+    if agg not in AGGS:
+        raise ValueError(f"Unknown aggregation {agg!r} (one of {', '.join(AGGS)})")
+    if isinstance(where, str):
+        conditions = parse_where(where) if where.strip() else []
+    else:
+        conditions = list(where or [])
+    sensor_ids = [sensor_id] if isinstance(sensor_id, str) else list(sensor_id or [])
+    resolution = store.pick_resolution(start)
+    if every is not None:
+        parse_interval(every)
+    elif resolution != RAW:
+        every = TIER_BUCKETS[resolution]
+
+    store.flush()
+    tables, scanned = [], {}
+    # Todos los niveles con el mismo estado: una compactación a mitad de camino duplicaría o perdería filas
+    with store._files_lock:
+        for tier in TIERS:
+            if every is None and tier != RAW:
+                continue
+            columns = None if fields is None else _tier_columns(tier, fields, agg, conditions)
+            try:
+                table = store.scan(tier, start, end, _tier_filter(tier, sensor_ids, conditions), columns)
+            except pa.ArrowInvalid:
+                # Un campo del where que este nivel no tiene: ninguna fila cumple
+                table = None
+            scanned[tier] = 0 if table is None else table.num_rows
+            if table is not None and table.num_rows:
+                tables.append((tier, table))
+
+    if every is None:
+        table = pa.concat_tables([t for _, t in tables], promote_options="default").sort_by("ts") if tables else None
+        if table is not None and fields is not None:
+            table = table.select([c for c in ["sensor_id", "ts"] + list(fields) if c in table.column_names])
+    elif tables:
+        query_fields = fields
+        if query_fields is None:
+            query_fields = sorted({
+                name.rsplit("_", 1)[0] if tier != RAW else name
+                for tier, t in tables for name in t.column_names if name not in ("sensor_id", "ts")
+            })
+        normalized = [_as_aggregates(t, tier, query_fields) for tier, t in tables]
+        table = _bucketize(pa.concat_tables(normalized, promote_options="default"), query_fields, agg, every)
+    else:
+        table = None
+    if table is None:
+        table = pa.table({"sensor_id": pa.array([], pa.string()), "ts": pa.array([], pa.timestamp("ms"))})
+
+    return QueryResult(table, {
+        "resolution": resolution if every is None else every,
+        "rows": table.num_rows,
+        "rows_scanned": scanned,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+
+
+def register_query_routes(app, get_store):
+    """Agregar ``GET /sensor/query``; ``get_store`` devuelve el ``HistoryStore`` o None."""
+    # Flask solo en el proceso de la API; history_panel importa este módulo sin ella
+    from flask import Response, jsonify, request
+
+    @app.route('/sensor/query', methods=['GET'])
+    def query_readings():
+        """Consulta por rango de tiempo (JSON, o Arrow IPC con format=arrow)"""
+        store = get_store()
+        if store is None:
+            return jsonify({"error": "History storage is disabled (set IOT_HISTORY_DIR)"}), 503
+        args = request.args
+        try:
+            now = datetime.now()
+            result = query_history(
+                store,
+                parse_time(args.get('start', '-1h'), now),
+                parse_time(args['end'], now) if 'end' in args else now,
+                fields=args['fields'].split(',') if args.get('fields') else None,
+                sensor_id=args['sensor_id'].split(',') if args.get('sensor_id') else None,
+                where=args.get('where'),
+                every=args.get('every'),
+                agg=args.get('agg', 'mean'),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if args.get('format') == 'arrow' or ARROW_STREAM in request.headers.get('Accept', ''):
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, result.table.schema) as writer:
+                writer.write_table(result.table)
+            response = Response(sink.getvalue().to_pybytes(), mimetype=ARROW_STREAM)
+            response.headers['X-Query-Info'] = ",".join(f"{k}={v}" for k, v in result.info.items() if k != "rows_scanned")
+            return response
+        rows = result.table.to_pylist()
+        for row in rows:
+            row['ts'] = row['ts'].isoformat()
+        return jsonify({"rows": rows, "info": result.info}), 200
+
+    return app
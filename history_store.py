@@ -0,0 +1,383 @@
+"""Historial de lecturas en disco con retención por niveles (Parquet).
+
+Niveles:
+    raw     lecturas tal cual durante ``raw_hours`` horas
+    minute  agregados por minuto durante ``minute_days`` días
+    hour    agregados por hora durante ``hour_days`` días
+
+Los agregados guardan por campo ``<campo>_sum``, ``_count``, ``_min`` y
+``_max``, así se pueden volver a agregar sin perder precisión.
+
+Archivos en ``root``:
+    raw/<YYYYmmddHH>-<n>.parquet   segmento escrito por un ``flush``
+    raw/<YYYYmmddHH>.parquet       hora ya compactada
+    minute/<YYYYmmdd>.parquet
+    hour/<YYYYmm>.parquet
+
+``append`` acumula lecturas en memoria y ``flush`` escribe un segmento. La
+compactación (``compact``) une los segmentos de las horas cerradas, pasa a
+minutos lo que sale de la ventana raw y a horas lo que sale de la de
+minutos, borra lo vencido y, si el total supera ``max_bytes``, borra los
+archivos más antiguos. ``start`` la ejecuta en un hilo junto con el
+``flush`` periódico; ``attach`` además guarda lo que llega por el broker y
+``stop`` recoge y escribe lo pendiente antes de salir.
+
+``query(start, end)`` elige el nivel más fino cuya retención cubre
+``start`` (o el pedido en ``resolution``); la parte más reciente que aún no
+se compactó se agrega al vuelo desde el nivel más fino.
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from lazy_imports import lazy_import
+
+# pyarrow solo se importa si hay historial (IOT_HISTORY_DIR)
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+ds = lazy_import("pyarrow.dataset")
+pq = lazy_import("pyarrow.parquet")
+
+RAW = "raw"
+MINUTE = "minute"
+HOUR = "hour"
+TIERS = (RAW, MINUTE, HOUR)
+
+# Formato del nombre de archivo y duración del período que cubre cada uno
+FILE_PERIODS = {RAW: "%Y%m%d%H", MINUTE: "%Y%m%d", HOUR: "%Y%m"}
+BUCKETS = {MINUTE: "minute", HOUR: "hour"}
+AGGREGATES = (("sum", "sum"), ("count", "sum"), ("min", "min"), ("max", "max"))
+TS_UNIT = "ms"
+
+
+def _period_start(tier, name):
+    return datetime.strptime(name.split(".")[0].split("-")[0], FILE_PERIODS[tier])
+
+
+def _period_end(tier, start):
+    if tier == RAW:
+        return start + timedelta(hours=1)
+    if tier == MINUTE:
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def readings_to_table(readings):
+    """Tabla raw: ``sensor_id``, ``ts`` y una columna float64 por campo numérico."""
+    fields = {}
+    for reading in readings:
+        for field, value in reading.items():
+            if isinstance(value, (int, float)) and field not in ("sensor_id", "ts"):
+                fields[field] = None
+    stamps = []
+    for reading in readings:
+        stamp = reading.get("datetime") or reading.get("timestamp")
+        stamps.append(datetime.fromisoformat(stamp) if isinstance(stamp, str) else stamp)
+    columns = {
+        "sensor_id": pa.array([str(r.get("sensor_id", "unknown")) for r in readings], pa.string()),
+        "ts": pa.array(stamps, pa.timestamp(TS_UNIT)),
+    }
+    for field in fields:
+        values = [r.get(field) for r in readings]
+        columns[field] = pa.array([float(v) if isinstance(v, (int, float)) else None for v in values], pa.float64())
+    return pa.table(columns)
+
+
+def value_fields(table):
+    """Campos medidos de una tabla raw o de agregados."""
+    names = [name for name in table.column_names if name not in ("sensor_id", "ts")]
+    if any(name.endswith("_count") for name in names):
+        return [name[:-len("_count")] for name in names if name.endswith("_count")]
+    return names
+
+
+def rollup(table, tier):
+    """Agregar una tabla (raw o de un nivel más fino) a ``tier``."""
+    fields = value_fields(table)
+    is_raw = not any(name.endswith("_count") for name in table.column_names)
+    bucket = pc.floor_temporal(table["ts"], unit=BUCKETS[tier])
+    table = table.set_column(table.column_names.index("ts"), "ts", bucket)
+    if is_raw:
+        aggregations = [(field, agg) for field in fields for agg in ("sum", "count", "min", "max")]
+        names = [f"{field}_{agg}" for field in fields for agg in ("sum", "count", "min", "max")]
+    else:
+        aggregations = [(f"{field}_{suffix}", agg) for field in fields for suffix, agg in AGGREGATES]
+        names = [f"{field}_{suffix}" for field in fields for suffix, _ in AGGREGATES]
+    result = table.group_by(["sensor_id", "ts"], use_threads=False).aggregate(aggregations)
+    # group_by agrega el sufijo de la función; se vuelve a los nombres del esquema
+    result = result.rename_columns(["sensor_id", "ts"] + names)
+    return result.sort_by([("ts", "ascending"), ("sensor_id", "ascending")])
+
+
+def rollup_means(table):
+    """Tabla de agregados -> ``sensor_id``, ``ts`` y media, mínimo y máximo por campo."""
+    columns = {"sensor_id": table["sensor_id"], "ts": table["ts"]}
+    for field in value_fields(table):
+        columns[field] = pc.divide(table[f"{field}_sum"], pc.cast(table[f"{field}_count"], pa.float64()))
+        columns[f"{field}_min"] = table[f"{field}_min"]
+        columns[f"{field}_max"] = table[f"{field}_max"]
+    return pa.table(columns)
+
+
+def _concat(tables):
+    return pa.concat_tables(tables, promote_options="default")
+
+
+class HistoryStore:
+    """Historial por niveles en un directorio."""
+
+    def __init__(self, root, raw_hours=24, minute_days=7, hour_days=365, max_bytes=1024 ** 3):
+        self.root = root
+        self.retention = {
+            RAW: timedelta(hours=raw_hours),
+            MINUTE: timedelta(days=minute_days),
+            HOUR: timedelta(days=hour_days),
+        }
+        self.max_bytes = max_bytes
+        self.last_compaction = None
+        self.last_error = None
+        self._source = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._files_lock = threading.RLock()  # compactación contra consultas y flush
+        for tier in TIERS:
+            os.makedirs(os.path.join(root, tier), exist_ok=True)
+
+    # Escritura
+
+    def append(self, readings):
+        with self._buffer_lock:
+            self._buffer.extend(readings)
+
+    def flush(self):
+        """Escribir lo acumulado como un segmento raw por hora; devuelve las filas escritas."""
+        with self._buffer_lock:
+            readings, self._buffer = self._buffer, []
+        if not readings:
+            return 0
+        table = readings_to_table(readings)
+        hours = pc.strftime(table["ts"], format=FILE_PERIODS[RAW])
+        with self._files_lock:
+            for hour in pc.unique(hours).to_pylist():
+                part = table.filter(pc.equal(hours, hour))
+                self._write(os.path.join(self.root, RAW, f"{hour}-{time.time_ns()}.parquet"), part)
+        return table.num_rows
+
+    def _write(self, path, table):
+        tmp = path + ".tmp"
+        # Row groups chicos: las estadísticas por row group permiten saltear rangos de tiempo
+        pq.write_table(table, tmp, compression="zstd", row_group_size=65536)
+        os.replace(tmp, path)
+
+    # Compactación
+
+    def _files(self, tier):
+        directory = os.path.join(self.root, tier)
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet")
+        )
+
+    def _merge_into(self, tier, period, table):
+        """Sumar agregados a un archivo del nivel, reagregando buckets repetidos."""
+        path = os.path.join(self.root, tier, f"{period.strftime(FILE_PERIODS[tier])}.parquet")
+        if os.path.exists(path):
+            table = rollup(_concat([pq.read_table(path), table]), tier)
+        self._write(path, table)
+
+    def compact(self, now=None):
+        """Unir, bajar de resolución y borrar según la retención; devuelve un resumen."""
+        now = now or datetime.now()
+        summary = {"merged": 0, "rolled_up": 0, "expired": 0, "evicted": 0}
+        with self._files_lock:
+            # Raw: una sola hora por archivo y, al vencer, a minutos
+            by_hour = {}
+            for path in self._files(RAW):
+                by_hour.setdefault(os.path.basename(path).split("-")[0].split(".")[0], []).append(path)
+            current_hour = now.strftime(FILE_PERIODS[RAW])
+            for hour, paths in by_hour.items():
+                start = _period_start(RAW, hour)
+                if hour >= current_hour:
+                    continue
+                table = _concat([pq.read_table(p) for p in paths]).sort_by("ts")
+                if _period_end(RAW, start) <= now - self.retention[RAW]:
+                    day = start.replace(hour=0)
+                    self._merge_into(MINUTE, day, rollup(table, MINUTE))
+                    summary["rolled_up"] += 1
+                    keep = None
+                elif len(paths) > 1 or "-" in os.path.basename(paths[0]):
+                    keep = os.path.join(self.root, RAW, f"{hour}.parquet")
+                    self._write(keep, table)
+                    summary["merged"] += 1
+                else:
+                    continue
+                for p in paths:
+                    if p != keep:
+                        os.remove(p)
+
+            # Minutos vencidos -> horas; horas vencidas se borran
+            for path in self._files(MINUTE):
+                start = _period_start(MINUTE, os.path.basename(path))
+                if _period_end(MINUTE, start) <= now - self.retention[MINUTE]:
+                    self._merge_into(HOUR, start.replace(day=1), rollup(pq.read_table(path), HOUR))
+                    os.remove(path)
+                    summary["rolled_up"] += 1
+            for path in self._files(HOUR):
+                start = _period_start(HOUR, os.path.basename(path))
+                if _period_end(HOUR, start) <= now - self.retention[HOUR]:
+                    os.remove(path)
+                    summary["expired"] += 1
+
+            # Presupuesto de disco: se borra primero lo más antiguo
+            files = [(tier, path) for tier in TIERS for path in self._files(tier)]
+            total = sum(os.path.getsize(path) for _, path in files)
+            files.sort(key=lambda item: _period_start(item[0], os.path.basename(item[1])))
+            for tier, path in files:
+                if total <= self.max_bytes:
+                    break
+                total -= os.path.getsize(path)
+                os.remove(path)
+                summary["evicted"] += 1
+        self.last_compaction = now
+        return summary
+
+    # Consultas
+
+    def pick_resolution(self, start, now=None):
+        """Nivel más fino cuya retención todavía cubre ``start``."""
+        now = now or datetime.now()
+        for tier in TIERS:
+            if start >= now - self.retention[tier]:
+                return tier
+        return HOUR
+
+    def _tier_files(self, tier, start, end):
+        """Archivos de un nivel cuyo período se cruza con [start, end)."""
+        selected = []
+        for path in self._files(tier):
+            period = _period_start(tier, os.path.basename(path))
+            if period < end and _period_end(tier, period) > start:
+                selected.append(path)
+        return selected
+
+    def scan(self, tier, start, end, filter=None, columns=None):
+        """Leer un nivel con el filtro de tiempo (y ``filter``) aplicado en el lector de Parquet."""
+        # La compactación no puede borrar ni reemplazar los archivos entre listarlos y leerlos
+        with self._files_lock:
+            paths = self._tier_files(tier, start, end)
+            if not paths:
+                return None
+            schema = pa.unify_schemas([pq.read_schema(p) for p in paths], promote_options="permissive")
+            dataset = ds.dataset(paths, schema=schema, format="parquet")
+            expression = (ds.field("ts") >= pa.scalar(start, pa.timestamp(TS_UNIT))) & (ds.field("ts") < pa.scalar(end, pa.timestamp(TS_UNIT)))
+            if filter is not None:
+                expression = expression & filter
+            if columns is not None:
+                columns = [c for c in columns if c in schema.names]
+            return dataset.to_table(columns=columns, filter=expression)
+
+    def query(self, start, end=None, sensor_id=None, fields=None, resolution=None):
+        """Lecturas de [start, end) en la resolución elegida: ``(tabla, resolución)``."""
+        end = end or datetime.now()
+        resolution = resolution or self.pick_resolution(start)
+        self.flush()
+        device_filter = ds.field("sensor_id") == sensor_id if sensor_id is not None else None
+        tables = []
+        with self._files_lock:
+            for tier in TIERS[:TIERS.index(resolution) + 1]:
+                columns = None
+                if fields is not None:
+                    if tier == RAW:
+                        columns = ["sensor_id", "ts"] + list(fields)
+                    else:
+                        columns = ["sensor_id", "ts"] + [f"{f}_{s}" for f in fields for s, _ in AGGREGATES]
+                table = self.scan(tier, start, end, device_filter, columns)
+                if table is not None and table.num_rows:
+                    tables.append(table if tier == resolution else rollup(table, resolution))
+        if not tables:
+            return pa.table({"sensor_id": pa.array([], pa.string()), "ts": pa.array([], pa.timestamp(TS_UNIT))}), resolution
+        if resolution == RAW:
+            return _concat(tables).sort_by("ts"), resolution
+        return rollup_means(rollup(_concat(tables), resolution)), resolution
+
+    def stats(self):
+        with self._files_lock:
+            tiers = {}
+            for tier in TIERS:
+                paths = self._files(tier)
+                tiers[tier] = {"files": len(paths), "bytes": sum(os.path.getsize(p) for p in paths)}
+        return {
+            "root": self.root,
+            "tiers": tiers,
+            "total_bytes": sum(t["bytes"] for t in tiers.values()),
+            "max_bytes": self.max_bytes,
+            "retention": {tier: str(window) for tier, window in self.retention.items()},
+            "buffered": len(self._buffer),
+            "last_compaction": self.last_compaction.isoformat(timespec="seconds") if self.last_compaction else None,
+            "last_error": self.last_error,
+        }
+
+    # Hilo de fondo
+
+    def start(self, flush_interval=5, compact_interval=300, source=None):
+        """Hilo que escribe lo acumulado cada ``flush_interval`` y compacta cada ``compact_interval``.
+
+        ``source``, si se indica, devuelve las lecturas nuevas a agregar en cada vuelta.
+        ``stop`` detiene el hilo y guarda lo pendiente.
+        """
+        self._source = source
+
+        def run():
+            next_compaction = time.monotonic() + compact_interval
+            while not self._stopped.wait(flush_interval):
+                # Un error (disco lleno, archivo ilegible) no debe detener el hilo: el buffer crecería sin límite
+                try:
+                    if source is not None:
+                        self.append(source())
+                    self.flush()
+                    if time.monotonic() >= next_compaction:
+                        next_compaction = time.monotonic() + compact_interval
+                        self.compact()
+                except Exception as e:
+                    self.last_error = f"{datetime.now().isoformat(timespec='seconds')} {type(e).__name__}: {e}"
+                    print(f"history {self.root}: {self.last_error}", file=sys.stderr, flush=True)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30):
+        """Detener el hilo de fondo, vaciar ``source`` y escribir todo lo pendiente."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Lo que ya se confirmó a los clientes pero el hilo todavía no había recogido
+        if self._source is not None:
+            self.append(self._source())
+        return self.flush()
+
+    def attach(self, broker, on_drop=None, **options):
+        """Guardar las lecturas que llegan al broker (``sensor/+``) y compactar en segundo plano."""
+        subscription = broker.subscribe("sensor/+", maxsize=100000, on_drop=on_drop)
+        return self.start(source=lambda: [message for _, _, message in subscription.drain()], **options)
+
+    @classmethod
+    def from_env(cls, name, root=None):
+        """Historial ``name`` dentro de ``root`` o ``IOT_HISTORY_DIR``; None si no hay ninguno.
+
+        Retención: ``IOT_RETENTION_RAW_HOURS`` (24), ``IOT_RETENTION_MINUTE_DAYS`` (7),
+        ``IOT_RETENTION_HOUR_DAYS`` (365) y ``IOT_HISTORY_MAX_MB`` (1024).
+        """
+        root = root or os.environ.get("IOT_HISTORY_DIR")
+        if not root:
+            return None
+        return cls(
+            os.path.join(root, name),
+            raw_hours=float(os.environ.get("IOT_RETENTION_RAW_HOURS", "24")),
+            minute_days=float(os.environ.get("IOT_RETENTION_MINUTE_DAYS", "7")),
+            hour_days=float(os.environ.get("IOT_RETENTION_HOUR_DAYS", "365")),
+            max_bytes=int(float(os.environ.get("IOT_HISTORY_MAX_MB", "1024")) * 1024 * 1024),
+        )
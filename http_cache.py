@@ -0,0 +1,349 @@
+"""Caché HTTP para los GET de app.py e iot_controller.py.
+
+``HTTPCache.get`` funciona como ``requests.get`` pero guarda las respuestas
+según ``Cache-Control``/``Expires`` y sus validadores (``ETag``,
+``Last-Modified``):
+
+    HIT          la copia sigue fresca: no se hace ninguna petición
+    REVALIDATED  la copia venció; la petición condicional (If-None-Match /
+                 If-Modified-Since) respondió 304 sin cuerpo y se usa la copia
+    MISS         no había copia utilizable; se descargó el cuerpo completo
+    BYPASS       la respuesta o la petición no se pueden guardar
+
+Es una caché compartida entre sesiones (``st.cache_resource``), así que no
+guarda respuestas ``private`` ni ``no-store``, ni peticiones con
+credenciales (``Authorization``, ``Cookie``, ``X-API-Key`` y otras
+cabeceras de ``CREDENTIAL_HEADERS`` o con ``token``/``secret``/``api-key``
+en el nombre) salvo que la respuesta sea ``public`` o traiga ``s-maxage``.
+Las cabeceras guardadas no distinguen mayúsculas (``ETag``, ``etag`` o
+``Etag`` son la misma). En memoria se limita por bytes con LRU; con ``directory``
+también se escribe en disco (con su propio tope) y sobrevive a reinicios.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+HIT = "HIT"
+REVALIDATED = "REVALIDATED"
+MISS = "MISS"
+BYPASS = "BYPASS"
+
+CACHEABLE_STATUS = (200, 203, 300, 301, 308, 404, 410)
+# Cabeceras de un 304 que no reemplazan las guardadas
+_KEEP_ON_304 = {"content-length", "content-encoding", "transfer-encoding", "content-type"}
+# Cabeceras de la petición que identifican al usuario: la respuesta no se comparte
+CREDENTIAL_HEADERS = {"authorization", "proxy-authorization", "cookie", "x-api-key", "x-auth-token", "x-access-token"}
+_CREDENTIAL_HINTS = ("token", "secret", "api-key", "apikey", "password", "session")
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 24 * 3600
+
+CacheInfo = namedtuple("CacheInfo", "status age saved_bytes")
+
+
+def parse_cache_control(value):
+    """``"max-age=60, no-cache"`` -> ``{"max-age": "60", "no-cache": None}``."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _has_credentials(headers):
+    return any(
+        name.lower() in CREDENTIAL_HEADERS or any(hint in name.lower() for hint in _CREDENTIAL_HINTS)
+        for name in headers
+    )
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheEntry:
+    __slots__ = ("url", "status", "reason", "headers", "body", "vary", "stored_at", "fresh_for")
+
+    def __init__(self, url, status, reason, headers, body, vary, stored_at, fresh_for):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = CaseInsensitiveDict(headers)
+        self.body = body
+        self.vary = vary  # valores de las cabeceras de la petición nombradas en Vary
+        self.stored_at = stored_at
+        self.fresh_for = fresh_for
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+    @property
+    def age(self):
+        return time.time() - self.stored_at
+
+    def to_response(self):
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        response.url = self.url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def dump(self):
+        meta = {k: getattr(self, k) for k in self.__slots__ if k != "body"}
+        meta["headers"] = dict(self.headers)
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def load(cls, data):
+        meta, _, body = data.partition(b"\n")
+        return cls(body=body, **json.loads(meta))
+
+
+class HTTPCache:
+    """Caché HTTP compartida: LRU en memoria por bytes y, opcionalmente, en disco."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, directory=None, disk_max_bytes=256 * 1024 * 1024, session=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.session = session or requests.Session()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Caché con disco en ``IOT_HTTP_CACHE_DIR`` si está definida."""
+        return cls(directory=os.environ.get("IOT_HTTP_CACHE_DIR") or None, **kwargs)
+
+    # Almacenamiento
+
+    def _key(self, url):
+        return "GET " + url
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".cache")
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = CacheEntry.load(f.read())
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        if self.directory:
+            # Temporal propio por escritura: dos hilos guardando la misma clave no se pisan
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f:
+                f.write(entry.dump())
+            try:
+                os.replace(f.name, self._path(key))
+            except OSError:
+                os.remove(f.name)
+                raise
+            self._trim_disk()
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _trim_disk(self):
+        files = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.name.endswith(".cache"):
+                    stat = item.stat()
+                    files.append((stat.st_mtime, stat.st_size, item.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".cache"):
+                    os.remove(os.path.join(self.directory, name))
+
+    # Semántica HTTP
+
+    def _freshness(self, response, directives, now):
+        """Segundos que la respuesta se puede usar sin revalidar."""
+        if "no-cache" in directives:
+            return 0
+        for name in ("s-maxage", "max-age"):
+            if directives.get(name) is not None:
+                try:
+                    age = float(response.headers.get("Age") or 0)
+                    return max(0.0, float(directives[name]) - age)
+                except ValueError:
+                    return 0
+        expires = _http_date(response.headers.get("Expires"))
+        if response.headers.get("Expires") is not None:
+            date = _http_date(response.headers.get("Date")) or now
+            return max(0.0, expires - date) if expires else 0
+        # Heurística de RFC 9111: 10 % del tiempo desde la última modificación
+        last_modified = _http_date(response.headers.get("Last-Modified"))
+        if last_modified:
+            date = _http_date(response.headers.get("Date")) or now
+            return min(HEURISTIC_MAX, max(0.0, (date - last_modified) * HEURISTIC_FRACTION))
+        return 0
+
+    def _storable(self, response, request_headers, directives):
+        if response.status_code not in CACHEABLE_STATUS:
+            return False
+        request_directives = parse_cache_control(request_headers.get("Cache-Control"))
+        if "no-store" in directives or "no-store" in request_directives or "private" in directives:
+            return False
+        if response.headers.get("Vary", "").strip() == "*":
+            return False
+        if _has_credentials(request_headers) and "public" not in directives and "s-maxage" not in directives:
+            return False
+        return True
+
+    def _vary(self, response_headers, request_headers):
+        names = [n.strip().lower() for n in response_headers.get("Vary", "").split(",") if n.strip()]
+        return {name: request_headers.get(name) for name in names}
+
+    def get(self, url, params=None, headers=None, timeout=None, refresh=False):
+        """GET con caché; devuelve ``(requests.Response, CacheInfo)``.
+
+        ``refresh=True`` (o ``Cache-Control: no-cache`` en ``headers``) fuerza
+        la revalidación aunque la copia esté fresca.
+        """
+        headers = CaseInsensitiveDict(headers or {})
+        prepared = requests.Request("GET", url, params=params).prepare()
+        key = self._key(prepared.url)
+        request_directives = parse_cache_control(headers.get("Cache-Control"))
+        refresh = refresh or "no-cache" in request_directives
+        bypass = "no-store" in request_directives
+
+        entry = None if bypass else self._lookup(key)
+        if entry is not None and entry.vary != {name: headers.get(name) for name in entry.vary}:
+            entry = None
+        if entry is not None and not refresh and entry.age < entry.fresh_for:
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += len(entry.body)
+            return entry.to_response(), CacheInfo(HIT, entry.age, len(entry.body))
+
+        conditional = dict(headers)
+        if entry is not None:
+            if "ETag" in entry.headers:
+                conditional["If-None-Match"] = entry.headers["ETag"]
+            if "Last-Modified" in entry.headers:
+                conditional["If-Modified-Since"] = entry.headers["Last-Modified"]
+        response = self.session.get(prepared.url, headers=conditional, timeout=timeout)
+        now = time.time()
+        directives = parse_cache_control(response.headers.get("Cache-Control"))
+
+        if response.status_code == 304 and entry is not None:
+            merged = CaseInsensitiveDict(entry.headers)
+            merged.update({k: v for k, v in response.headers.items() if k.lower() not in _KEEP_ON_304})
+            entry = CacheEntry(entry.url, entry.status, entry.reason, merged, entry.body, entry.vary, now,
+                               self._freshness(entry.to_response(), parse_cache_control(merged.get("Cache-Control")), now))
+            self._store(key, entry)
+            with self._lock:
+                self.revalidated += 1
+                self.bytes_saved += len(entry.body)
+            return entry.to_response(), CacheInfo(REVALIDATED, 0.0, len(entry.body))
+
+        with self._lock:
+            self.bytes_downloaded += len(response.content)
+        if bypass or not self._storable(response, headers, directives):
+            # La respuesta a una petición con credenciales no sustituye a la copia compartida
+            if not _has_credentials(headers):
+                self._forget(key)
+            with self._lock:
+                self.bypassed += 1
+            return response, CacheInfo(BYPASS, None, 0)
+        fresh_for = self._freshness(response, directives, now)
+        has_validator = "ETag" in response.headers or "Last-Modified" in response.headers
+        if fresh_for > 0 or has_validator:
+            self._store(key, CacheEntry(
+                response.url, response.status_code, response.reason, dict(response.headers),
+                response.content, self._vary(response.headers, headers), now, fresh_for,
+            ))
+        else:
+            self._forget(key)
+        with self._lock:
+            self.misses += 1
+        return response, CacheInfo(MISS, None, 0)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk": self.directory,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_ratio": round((self.hits + self.revalidated) / lookups, 3) if lookups else None,
+                "bytes_saved": self.bytes_saved,
+                "bytes_downloaded": self.bytes_downloaded,
+            }
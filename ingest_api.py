@@ -0,0 +1,282 @@
+"""API de ingesta de sensores sin Streamlit.
+
+``create_ingest_app`` arma la app Flask de api_server.py (``POST
+/sensor/data``, ``/sensor/status``, ``/sensor/latest``, ``/sensor/latest/all``,
+``/sensor/stream*``, ``/sensor/query`` y ``/metrics``) sobre un
+``IngestPipeline``. api_server.py la usa con sus recursos de
+``st.cache_resource``; ejecutado como módulo corre solo la ingesta, el
+almacenamiento y las consultas, sin importar Streamlit, Plotly ni pandas,
+para un equipo pequeño junto a los ESP32:
+
+    python -m ingest_api --port 5002
+    IOT_JOURNAL_PATH=/var/lib/iot/ingest.journal IOT_HISTORY_DIR=/var/lib/iot python -m ingest_api
+
+Usa las mismas variables de entorno que api_server.py (``IOT_JOURNAL_PATH``,
+``IOT_JOURNAL_FSYNC``, ``IOT_JOURNAL_WINDOW_MS``, ``IOT_HISTORY_DIR`` y
+``IOT_BROKER_BACKEND``). Con ``IOT_BROKER_BACKEND=unix`` un dashboard en
+otro proceso puede suscribirse a las lecturas. Con historial se carga
+pyarrow (que a su vez importa pandas si está instalado); sin él, el proceso
+solo carga Flask, numpy y los módulos de la ingesta.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from admission import DEFAULT_BURST, DEFAULT_RATE, AdmissionController
+from broker import create_broker
+from history_query import register_query_routes
+from history_store import HistoryStore
+from ingest_journal import GROUP, IngestJournal
+from ingest_metrics import METRICS, instrument_flask
+from latest_index import LatestIndex
+from reading_stream import register_stream_routes
+from sensor_codec import CONTENT_TYPE_JSON, UnsupportedContentType, decode_payload
+from shared_store import SharedLog
+
+STREAM_LOG_SIZE = 10000
+HISTORY_NAME = "api_server"
+
+
+def journal_from_env(path=None):
+    """Journal de ``IOT_JOURNAL_PATH`` (o ``path``); None si no está definido."""
+    path = path or os.environ.get("IOT_JOURNAL_PATH")
+    if not path:
+        return None
+    return IngestJournal(
+        path,
+        fsync=os.environ.get("IOT_JOURNAL_FSYNC", GROUP),
+        window_ms=float(os.environ.get("IOT_JOURNAL_WINDOW_MS", "2"))
+    )
+
+
+def replay_journal(journal, logs, latest_index):
+    """Recargar en memoria las lecturas confirmadas antes del último arranque"""
+    batch = []
+
+    def flush():
+        for log in logs:
+            log.extend(batch)
+        latest_index.update_many(batch)
+
+    for data in journal.replay():
+        if isinstance(data.get('datetime'), str):
+            data['datetime'] = datetime.fromisoformat(data['datetime'])
+        batch.append(data)
+        if len(batch) >= 1000:
+            flush()
+            batch = []
+    flush()
+
+
+class IngestPipeline:
+    """Recursos que usan las rutas: admisión, journal, stream, broker, índice e historial."""
+
+    def __init__(self, broker, stream_log, latest_index, admission, journal=None, history=None,
+                 reading_count=None, metrics=METRICS):
+        self.broker = broker
+        self.stream_log = stream_log
+        self.latest_index = latest_index
+        self.admission = admission
+        self.journal = journal
+        self.history = history
+        self.metrics = metrics
+        # Lecturas que informa /sensor/status (api_server cuenta su historial de 1000)
+        self.reading_count = reading_count or (lambda: len(stream_log))
+
+    def ingest(self, readings):
+        """Sellar la hora y publicar las lecturas ya admitidas."""
+        now = datetime.now()
+        for data in readings:
+            data['timestamp'] = now.strftime("%Y-%m-%d %H:%M:%S")
+            data['datetime'] = now
+
+        # Con el journal activo solo se confirma lo que ya está en disco
+        if self.journal:
+            self.journal.append(readings)
+
+        # La posición en stream_log es la secuencia de cada lectura (despierta a los long-polls)
+        self.stream_log.extend(readings)
+        self.publish(readings)
+        self.latest_index.update_many(readings)
+        self.metrics.record_ingest(readings)
+
+    def publish(self, readings):
+        """Publicar en el broker sin fallar la petición: lo ya confirmado no debe reintentarse."""
+        for published, data in enumerate(readings):
+            try:
+                self.broker.publish_reading(data)
+            except OSError as e:
+                # Broker por socket caído: se cuenta y se sigue (el journal y el stream ya lo tienen)
+                self.metrics.record_drop("publish_failed", len(readings) - published)
+                print(f"broker publish failed: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+                return
+
+    def close(self):
+        """Guardar lo pendiente del historial (incluida su suscripción) y cerrar el journal."""
+        if self.history:
+            self.history.stop()
+        if self.journal:
+            self.journal.close()
+
+
+def create_ingest_app(pipeline):
+    """App Flask con las rutas de ingesta y lectura sobre ``pipeline``."""
+    app = Flask(__name__)
+    instrument_flask(app, pipeline.metrics)
+    register_stream_routes(app, pipeline.stream_log)
+    register_query_routes(app, lambda: pipeline.history)
+    latest_index = pipeline.latest_index
+
+    @app.route('/sensor/data', methods=['POST'])
+    def receive_sensor_data():
+        """Endpoint para recibir datos de sensores via POST (JSON, binario o MessagePack)"""
+        try:
+            try:
+                readings = decode_payload(request.get_data(), request.mimetype)
+            except UnsupportedContentType as e:
+                return jsonify({"error": str(e)}), 415
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            # Validar que se recibieron datos
+            if not readings:
+                return jsonify({"error": "No data received"}), 400
+
+            # Control de admisión: 429/503 con Retry-After para que el dispositivo espacie los envíos
+            decision = pipeline.admission.admit([data.get('sensor_id', 'unknown') for data in readings])
+            if decision.reason:
+                pipeline.metrics.record_drop(decision.reason, len(readings))
+                response = jsonify({
+                    "error": "Too many readings from this device" if decision.reason == "rate_limited" else "Server overloaded",
+                    "retry_after": decision.retry_after
+                })
+                response.headers['Retry-After'] = str(decision.retry_after)
+                return response, decision.status
+
+            pipeline.ingest(readings)
+
+            # Las lecturas binarias solo confirman la cantidad para no inflar la respuesta
+            if request.mimetype != CONTENT_TYPE_JSON:
+                return jsonify({
+                    "status": "success",
+                    "message": "Data received successfully",
+                    "received_count": len(readings)
+                }), 200
+
+            return jsonify({
+                "status": "success",
+                "message": "Data received successfully",
+                "received_data": readings[0] if len(readings) == 1 else readings
+            }), 200
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/sensor/status', methods=['GET'])
+    def api_status():
+        """Endpoint para verificar el estado de la API"""
+        return jsonify({
+            "status": "running",
+            "message": "Sensor API is running",
+            "endpoints": {
+                "POST /sensor/data": "Receive sensor data (JSON, application/x-sensor-struct or application/msgpack)",
+                "GET /sensor/status": "Check API status",
+                "GET /sensor/latest": "Get latest sensor reading (?sensor_id=... for one device)",
+                "GET /sensor/latest/all": "Get latest reading of every device",
+                "GET /sensor/stream?since=<seq>": "Long-poll for readings after a sequence number",
+                "GET /sensor/stream/sse?since=<seq>": "Server-Sent Events stream of readings",
+                "GET /sensor/stream/ndjson?since=<seq>": "Chunked NDJSON stream of readings",
+                "GET /sensor/query?start=-1h&fields=...&where=...&every=5min&agg=mean": "Query stored history (JSON or format=arrow)",
+                "GET /metrics": "Prometheus metrics"
+            },
+            "total_readings": pipeline.reading_count(),
+            "devices": len(latest_index)
+        }), 200
+
+    def conditional_json(data, etag):
+        """Respuesta JSON con ETag; 304 si coincide con If-None-Match"""
+        response = jsonify(data)
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    @app.route('/sensor/latest', methods=['GET'])
+    def get_latest_data():
+        """Endpoint para obtener la última lectura (de un dispositivo con ?sensor_id=)"""
+        sensor_id = request.args.get('sensor_id')
+        if sensor_id is None:
+            latest = latest_index.most_recent()
+            if latest is None:
+                return jsonify({"message": "No data available"}), 404
+            return jsonify(latest), 200
+        latest, etag = latest_index.get_with_etag(sensor_id)
+        if latest is None:
+            return jsonify({"message": f"No data available for {sensor_id}"}), 404
+        return conditional_json(latest, etag)
+
+    @app.route('/sensor/latest/all', methods=['GET'])
+    def get_latest_all():
+        """Endpoint con la última lectura de cada dispositivo"""
+        devices, etag = latest_index.all()
+        return conditional_json({"devices": devices, "count": len(devices)}, etag)
+
+    return app
+
+
+def build_pipeline(args):
+    """Pipeline del modo sin interfaz a partir de los argumentos y el entorno."""
+    broker = create_broker()
+    stream_log = SharedLog(maxlen=args.stream_size)
+    latest_index = LatestIndex()
+    journal = journal_from_env(args.journal)
+    if journal:
+        replay_journal(journal, (stream_log,), latest_index)
+    history = HistoryStore.from_env(HISTORY_NAME, root=args.history_dir)
+    if history is not None:
+        history.attach(broker, on_drop=lambda count: METRICS.record_drop("history_overflow", count))
+    # Sin dashboard no hay cola que vigilar: solo el límite por dispositivo
+    admission = AdmissionController(rate=args.rate, burst=args.burst)
+    return IngestPipeline(broker, stream_log, latest_index, admission, journal=journal, history=history)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless sensor ingest API (no Streamlit)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--journal", help="Journal path (default: IOT_JOURNAL_PATH)")
+    parser.add_argument("--history-dir", help="History directory (default: IOT_HISTORY_DIR)")
+    parser.add_argument("--stream-size", type=int, default=STREAM_LOG_SIZE,
+                        help="Recent readings kept in memory for /sensor/stream")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Readings/s per device")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help="Burst per device")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = build_pipeline(args)
+    server = make_server(args.host, args.port, create_ingest_app(pipeline), threaded=True)
+
+    def stop(*_):
+        # shutdown() espera a serve_forever: se llama desde otro hilo
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"📡 Ingest API on {args.host}:{args.port} "
+          f"(journal: {pipeline.journal.path if pipeline.journal else 'off'}, "
+          f"history: {pipeline.history.root if pipeline.history else 'off'})", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        pipeline.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
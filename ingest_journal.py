@@ -0,0 +1,162 @@
+"""Journal de escritura anticipada (WAL) para las lecturas aceptadas.
+
+Con el journal activo ``POST /sensor/data`` escribe las lecturas en disco
+antes de responder 200: lo confirmado sobrevive a una caída del proceso y
+se vuelve a cargar al arrancar (``replay``).
+
+Políticas de fsync:
+    always  un fsync por petición (la más lenta)
+    group   commit en grupo: un hilo hace un fsync cada ``window_ms`` y todas
+            las peticiones escritas en esa ventana esperan ese mismo fsync
+    never   solo write(); sobrevive a la caída del proceso, no a la del sistema
+
+Formato: un registro por petición, ``<longitud uint32><crc32 uint32><JSON>``
+con la lista de lecturas. Al abrir se descarta lo que siga al primer
+registro incompleto o corrupto (una escritura a medias). El archivo rota al
+pasar ``max_bytes`` y se conserva un segmento anterior (``.1``), así el disco
+usado queda acotado.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+RECORD_HEADER = struct.Struct("<II")
+
+ALWAYS = "always"
+GROUP = "group"
+NEVER = "never"
+FSYNC_POLICIES = (ALWAYS, GROUP, NEVER)
+
+
+def _scan(path):
+    """Recorrer los registros válidos de un segmento: ``(fin del registro, lecturas)``."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        offset = 0
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, crc = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                return
+            offset += RECORD_HEADER.size + length
+            yield offset, json.loads(data)
+
+
+class IngestJournal:
+    """Journal de lecturas en un archivo de solo anexado."""
+
+    def __init__(self, path, fsync=GROUP, window_ms=2, max_bytes=64 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}")
+        self.path = path
+        self.fsync = fsync
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self.fsync_count = 0
+        self.records_written = 0
+        self._synced = 0
+        self._closed = False
+        self._lock = threading.Lock()  # serializa escrituras y rotación
+        self._cond = threading.Condition()  # avisa al hilo de fsync y a quienes esperan
+        self._file = self._open_segment()
+        if fsync == GROUP:
+            threading.Thread(target=self._group_commit_loop, daemon=True).start()
+
+    def _open_segment(self):
+        # Cortar una posible escritura a medias al final del segmento actual
+        valid = 0
+        for valid, _ in _scan(self.path):
+            pass
+        f = open(self.path, "ab", buffering=0)
+        if f.tell() != valid:
+            f.truncate(valid)
+            f.seek(valid)
+        self._size = valid
+        return f
+
+    def _rotate(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._file = self._open_segment()
+        with self._cond:
+            self._synced = self.records_written
+            self._cond.notify_all()
+
+    def append(self, readings):
+        """Escribir las lecturas de una petición; vuelve cuando son durables según la política."""
+        data = json.dumps(readings, default=str).encode()
+        record = RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self._lock:
+            if self._size and self._size + len(record) > self.max_bytes:
+                self._rotate()
+            self._file.write(record)
+            self._size += len(record)
+            self.records_written += 1
+            ticket = self.records_written
+            if self.fsync == ALWAYS:
+                os.fsync(self._file.fileno())
+                self.fsync_count += 1
+        if self.fsync == GROUP:
+            with self._cond:
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._synced >= ticket or self._closed)
+        return ticket
+
+    def _group_commit_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.records_written > self._synced or self._closed)
+                if self._closed:
+                    return
+            # Dejar que otras peticiones entren en el mismo fsync
+            time.sleep(self.window)
+            with self._lock:
+                if self._file.closed:
+                    return
+                target = self.records_written
+                fd = os.dup(self._file.fileno())
+            # El fsync se hace fuera del lock: las peticiones siguientes ya escriben el próximo grupo
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._cond:
+                self.fsync_count += 1
+                self._synced = max(self._synced, target)
+                self._cond.notify_all()
+
+    def replay(self):
+        """Lecturas guardadas, de la más antigua a la más reciente (segmento anterior incluido)."""
+        for path in (self.path + ".1", self.path):
+            for _, readings in _scan(path):
+                yield from readings
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "fsync": self.fsync,
+            "window_ms": self.window * 1000,
+            "records_written": self.records_written,
+            "fsyncs": self.fsync_count,
+            "segment_bytes": self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._file.close()
+        with self._cond:
+            self._closed = True
+            self._synced = self.records_written
+            self._cond.notify_all()
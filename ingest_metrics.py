@@ -0,0 +1,229 @@
+"""Métricas de la API de ingesta (throughput, latencias, cola y dispositivos).
+
+Un único registro ``METRICS`` vive a nivel de proceso: lo actualizan los
+hilos de Flask y la app de Streamlit, y se expone en formato Prometheus en
+``GET /metrics`` y como diccionario para el panel del dashboard.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+
+# Límites de los buckets en segundos (estilo Prometheus)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Ventana para calcular peticiones por segundo
+RATE_WINDOW_SECONDS = 60
+
+# Dispositivos con última lectura registrada (los sensor_id los elige el cliente)
+MAX_TRACKED_DEVICES = 10000
+
+
+def _label(value):
+    """Valor de etiqueta escapado según el formato de texto de Prometheus."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Pares (límite, cantidad acumulada), incluido +Inf."""
+        running = 0
+        pairs = []
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            pairs.append((bound, running))
+        pairs.append((float("inf"), self.total))
+        return pairs
+
+    def quantile(self, q):
+        """Estimación del cuantil q a partir de los buckets (límite superior)."""
+        if not self.total:
+            return None
+        target = q * self.total
+        for bound, running in self.cumulative():
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+class IngestMetrics:
+    """Contadores, histogramas y gauges de la ingesta, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = defaultdict(int)  # (route, method, status) -> total
+        self.latency = {}  # route -> Histogram
+        self.readings_received = 0
+        self.readings_dropped = defaultdict(int)  # reason -> total
+        self.drain_lag = Histogram(LAG_BUCKETS)
+        self.device_last_seen = OrderedDict()  # sensor_id -> epoch, del más antiguo al más reciente
+        self._ingest_times = deque()
+        self._queue_depth_fn = None
+
+    def observe_request(self, route, method, status, seconds):
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            if route not in self.latency:
+                self.latency[route] = Histogram(LATENCY_BUCKETS)
+            self.latency[route].observe(seconds)
+
+    def record_ingest(self, readings):
+        """Registrar lecturas aceptadas por /sensor/data."""
+        now = time.time()
+        with self._lock:
+            self.readings_received += len(readings)
+            self._ingest_times.append(now)
+            for data in readings:
+                sensor_id = str(data.get("sensor_id", "unknown"))
+                self.device_last_seen[sensor_id] = now
+                self.device_last_seen.move_to_end(sensor_id)
+            # Olvidar los dispositivos que llevan más tiempo sin enviar
+            while len(self.device_last_seen) > MAX_TRACKED_DEVICES:
+                self.device_last_seen.popitem(last=False)
+
+    def record_drop(self, reason, count=1):
+        with self._lock:
+            self.readings_dropped[reason] += count
+
+    def record_drain(self, lag_seconds):
+        """Tiempo entre que una lectura entra a la cola y la procesa Streamlit."""
+        with self._lock:
+            self.drain_lag.observe(lag_seconds)
+
+    def set_queue_depth_source(self, fn):
+        """Registrar una función que devuelve la profundidad actual de la cola."""
+        self._queue_depth_fn = fn
+
+    def queue_depth(self):
+        return self._queue_depth_fn() if self._queue_depth_fn else 0
+
+    def ingest_rate(self):
+        """Peticiones de ingesta por segundo en la ventana reciente."""
+        now = time.time()
+        with self._lock:
+            while self._ingest_times and self._ingest_times[0] < now - RATE_WINDOW_SECONDS:
+                self._ingest_times.popleft()
+            window = min(RATE_WINDOW_SECONDS, max(now - self.started_at, 1.0))
+            return len(self._ingest_times) / window
+
+    def snapshot(self):
+        """Resumen de las métricas para mostrar en el dashboard."""
+        rate = self.ingest_rate()
+        with self._lock:
+            latency = {
+                route: {
+                    "count": hist.total,
+                    "avg_ms": hist.sum / hist.total * 1000 if hist.total else 0.0,
+                    "p50_ms": hist.quantile(0.5) * 1000,
+                    "p99_ms": hist.quantile(0.99) * 1000,
+                }
+                for route, hist in self.latency.items()
+            }
+            return {
+                "uptime_seconds": time.time() - self.started_at,
+                "ingest_requests_per_second": rate,
+                "readings_received": self.readings_received,
+                "readings_dropped": dict(self.readings_dropped),
+                "queue_depth": self.queue_depth(),
+                "drain_lag_p50_seconds": self.drain_lag.quantile(0.5),
+                "drain_lag_p99_seconds": self.drain_lag.quantile(0.99),
+                "latency": latency,
+                "device_last_seen": dict(self.device_last_seen),
+            }
+
+    def render_prometheus(self):
+        """Exportar las métricas en el formato de texto de Prometheus."""
+        rate = self.ingest_rate()
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist):
+            prefix = f"{labels}," if labels else ""
+            for bound, running in hist.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {running}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {hist.sum}")
+            lines.append(f"{name}_count{suffix} {hist.total}")
+
+        with self._lock:
+            header("sensor_api_requests_total", "counter", "HTTP requests by route, method and status.")
+            for (route, method, status), total in sorted(self.requests.items()):
+                lines.append(
+                    f'sensor_api_requests_total{{route="{_label(route)}",method="{_label(method)}",status="{status}"}} {total}'
+                )
+
+            header("sensor_api_request_duration_seconds", "histogram", "HTTP request latency by route.")
+            for route, hist in sorted(self.latency.items()):
+                histogram("sensor_api_request_duration_seconds", f'route="{_label(route)}"', hist)
+
+            header("sensor_ingest_requests_per_second", "gauge", "Ingest requests per second over the last minute.")
+            lines.append(f"sensor_ingest_requests_per_second {rate}")
+
+            header("sensor_readings_received_total", "counter", "Sensor readings accepted by /sensor/data.")
+            lines.append(f"sensor_readings_received_total {self.readings_received}")
+
+            header("sensor_readings_dropped_total", "counter", "Sensor readings dropped by reason.")
+            for reason, total in sorted(self.readings_dropped.items()):
+                lines.append(f'sensor_readings_dropped_total{{reason="{_label(reason)}"}} {total}')
+
+            header("sensor_queue_depth", "gauge", "Readings waiting to be processed by the dashboard.")
+            lines.append(f"sensor_queue_depth {self.queue_depth()}")
+
+            header("sensor_queue_drain_lag_seconds", "histogram", "Time between ingest and dashboard processing.")
+            histogram("sensor_queue_drain_lag_seconds", "", self.drain_lag)
+
+            header("sensor_device_last_seen_timestamp_seconds", "gauge", "Last reading received per device.")
+            for sensor_id, seen in sorted(self.device_last_seen.items()):
+                lines.append(f'sensor_device_last_seen_timestamp_seconds{{sensor_id="{_label(sensor_id)}"}} {seen}')
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = IngestMetrics()
+
+
+def instrument_flask(app, metrics=METRICS):
+    """Medir la latencia de cada ruta y exponer ``GET /metrics``."""
+    # Flask solo hace falta en el proceso de la API (Histogram lo usan también las páginas)
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started_at = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started_at", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Endpoint con las métricas en formato Prometheus"""
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,120 @@
+"""Ingesta multi-proceso hacia un buffer en memoria compartida.
+
+Lanza N procesos que atienden ``POST /sensor/data`` en el mismo puerto
+(``SO_REUSEPORT``, el kernel reparte las conexiones) y escriben cada lectura
+en un ``ShmRing``. El dashboard (api_server.py, modo "Shared memory") mapea
+el buffer por su nombre y lo lee sin pasar por el proceso de Streamlit.
+
+Uso:
+    python ingest_workers.py --workers 4 --port 5002
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from sensor_codec import CONTENT_TYPE_STRUCT, UnsupportedContentType, decode_payload, parse_struct
+from shm_ring import DEFAULT_CAPACITY, DEFAULT_RING_NAME, ShmRing
+
+
+def create_worker_app(ring):
+    """App Flask mínima de un worker: decodifica y escribe en el buffer."""
+    app = Flask(__name__)
+
+    @app.route('/sensor/data', methods=['POST'])
+    def receive_sensor_data():
+        """Endpoint para recibir datos de sensores via POST"""
+        try:
+            if request.mimetype == CONTENT_TYPE_STRUCT:
+                # Camino rápido: los registros binarios se copian tal cual
+                _, records = parse_struct(request.get_data())
+                count = len(records)
+                ring.write_records(records)
+            else:
+                readings = decode_payload(request.get_data(), request.mimetype)
+                count = len(readings)
+                ring.write_readings(readings)
+        except UnsupportedContentType as e:
+            return jsonify({"error": str(e)}), 415
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not count:
+            return jsonify({"error": "No data received"}), 400
+        return jsonify({
+            "status": "success",
+            "message": "Data received successfully",
+            "received_count": count,
+            "worker_pid": os.getpid()
+        }), 200
+
+    @app.route('/sensor/status', methods=['GET'])
+    def api_status():
+        """Endpoint para verificar el estado de la API"""
+        return jsonify({
+            "status": "running",
+            "mode": "shared-memory workers",
+            "ring": ring.shm.name,
+            "total_readings": ring.write_seq,
+            "worker_pid": os.getpid()
+        }), 200
+
+    return app
+
+
+def reuseport_socket(host, port):
+    """Socket de escucha que varios procesos pueden compartir."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
+
+
+def run_worker(ring_name, lock, host, port):
+    """Proceso worker: mapea el buffer y sirve la API en el puerto compartido."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = ShmRing.attach(ring_name, lock=lock)
+    sock = reuseport_socket(host, port)
+    server = make_server(host, port, create_worker_app(ring), threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-process sensor ingest into a shared-memory ring")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Number of ingest processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--ring", default=DEFAULT_RING_NAME, help="Shared memory block name")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="Records kept in the ring")
+    args = parser.parse_args(argv)
+
+    lock = multiprocessing.Lock()
+    ring = ShmRing.create(args.ring, args.capacity, lock=lock)
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(args.ring, lock, args.host, args.port), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    # SIGTERM también libera el bloque de memoria compartida
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"📡 {args.workers} ingest workers on port {args.port}, ring '{args.ring}' ({args.capacity} records)")
+    try:
+        for worker in workers:
+            worker.join()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        ring.close()
+
+
+if __name__ == '__main__':
+    main()
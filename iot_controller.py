@@ -1,14 +1,28 @@
 import streamlit as st
 import requests
 import json
-import google.generativeai as genai
 import time
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
 import re
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlparse
 from typing import Dict, List
 from datetime import datetime, timedelta
+from rerun_profiler import finish_rerun, measure_figure, section, start_rerun
+from lazy_tabs import lazy_tabs
+from shared_store import DeviceHub, SharedLog
+from history_store import HistoryStore
+from history_panel import history_panel
+from http_cache import HTTPCache
+from gemini_pool import GeminiPool
+from batch_analysis import SENSOR_RULES, FakeModel, analyze_district, compact_context, fan_out
+from concurrent.futures import ThreadPoolExecutor
+from lazy_imports import lazy_import
+from live_chart import FIGURES, live_line_chart
+
+# Heavy modules load on first use (only the tabs that chart or tabulate need them)
+pd = lazy_import("pandas")
+px = lazy_import("plotly.express")
 
 # Page configuration
 st.set_page_config(
@@ -17,6 +31,7 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+start_rerun("iot_controller")
 
 # Custom CSS for better styling
 st.markdown("""
@@ -57,20 +72,21 @@ st.markdown("""
         color: #dc3545;
         font-weight: bold;
     }
+    .status-degraded {
+        color: #ffc107;
+        font-weight: bold;
+    }
 </style>
 """, unsafe_allow_html=True)
 
 # Initialize session state
-if 'sensor_data' not in st.session_state:
-    st.session_state.sensor_data = []
-if 'actuator_states' not in st.session_state:
-    st.session_state.actuator_states = []
-if 'gemini_conversations' not in st.session_state:
-    st.session_state.gemini_conversations = []
-if 'device_status' not in st.session_state:
-    st.session_state.device_status = "Unknown"
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if 'auto_refresh' not in st.session_state:
     st.session_state.auto_refresh = False
+# Gemini prompts and answers stay private to this browser session (last 50)
+if 'gemini_conversations' not in st.session_state:
+    st.session_state.gemini_conversations = SharedLog(maxlen=50)
 
 # Sidebar configuration
 st.sidebar.header("🔧 Device Configuration")
@@ -98,33 +114,120 @@ if st.session_state.auto_refresh:
 # Main title
 st.markdown('<h1 class="main-header">🌐 IoT Device Controller & Gemini AI</h1>', unsafe_allow_html=True)
 
+# Hubs are created from URLs users type: keep at most this many (least recently used go first)
+MAX_DEVICE_HUBS = 64
+
+def valid_device_url(url: str) -> bool:
+    """Only http(s) URLs with a host get a hub, so typos do not pile up shared state."""
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.hostname)
+
+@st.cache_resource
+def get_device_registry() -> Dict[str, DeviceHub]:
+    """Device hubs currently cached in this process, by base URL (for the health table)."""
+    return OrderedDict()
+
+@st.cache_resource
+def get_history_store():
+    """Optional on-disk history with retention tiers (IOT_HISTORY_DIR), one per process for every device."""
+    history = HistoryStore.from_env("iot_controller")
+    return history.start() if history else None
+
+@st.cache_resource(max_entries=MAX_DEVICE_HUBS)
+def get_device_hub(device_url: str) -> DeviceHub:
+    """Shared history and poller for one ESP32, reused by every browser session."""
+    def fetch(timeout=5):
+        resp = requests.get(f"{device_url}/sensor", timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+    # ESP32 readings carry no sensor_id: stored history is tagged with the device URL
+    hub = DeviceHub(fetch, max_readings=100, history=get_history_store(), device_id=device_url)
+    registry = get_device_registry()
+    registry[device_url] = hub
+    while len(registry) > MAX_DEVICE_HUBS:
+        registry.popitem(last=False)
+    return hub
+
+@st.cache_resource
+def get_http_cache() -> HTTPCache:
+    """GET cache for the custom endpoint tester, shared by every session."""
+    return HTTPCache.from_env()
+
+@st.cache_resource
+def get_gemini_pool() -> GeminiPool:
+    """Gemini clients (one per API key) and model handles shared by every session."""
+    return GeminiPool()
+
+if not valid_device_url(base_url):
+    st.sidebar.error("❌ Enter a device URL like http://192.168.43.64")
+    st.stop()
+hub = get_device_hub(base_url)
+http_cache = get_http_cache()
+gemini_pool = get_gemini_pool()
+sensor_log = hub.sensor_data
+actuator_log = hub.actuator_states
+conversation_log = st.session_state.gemini_conversations
+
+# Auto-refresh subscribes this session to the shared poller instead of polling the device itself
+if st.session_state.auto_refresh:
+    hub.poller.subscribe(st.session_state.session_id, refresh_interval)
+else:
+    hub.poller.unsubscribe(st.session_state.session_id)
+st.sidebar.caption(f"👥 Sessions polling this device: {hub.poller.subscriber_count}")
+
 # API functions based on your original code
 def get_sensor():
     """Makes GET /sensor and returns the JSON."""
     url = f"{base_url}/sensor"
-    resp = requests.get(url, timeout=5)
-    resp.raise_for_status()
+    with hub.health.track():
+        resp = requests.get(url, timeout=hub.health.timeout())
+        resp.raise_for_status()
     return resp.json()
 
 def set_actuator(state: int):
     """Makes POST /actuator with JSON {'state': state} and returns the JSON."""
     url = f"{base_url}/actuator"
     payload = {"state": state}
-    resp = requests.post(url, json=payload, timeout=5)
-    resp.raise_for_status()
+    with hub.health.track():
+        resp = requests.post(url, json=payload, timeout=hub.health.timeout())
+        resp.raise_for_status()
     return resp.json()
 
+def read_device(device_hub: DeviceHub):
+    """Fresh reading from another device's hub, tracked by its health (None on failure)."""
+    try:
+        with device_hub.health.track():
+            reading = device_hub.poller.fetch(timeout=device_hub.health.timeout())
+        return device_hub.record_reading(reading)
+    except Exception as e:
+        device_hub.last_error = str(e)
+        return None
+
+def post_device_actuator(device_url: str, device_hub: DeviceHub, state: int):
+    """POST /actuator on any device and log it in that device's shared actuator history."""
+    with device_hub.health.track():
+        resp = requests.post(f"{device_url}/actuator", json={"state": state}, timeout=device_hub.health.timeout())
+        resp.raise_for_status()
+    result = resp.json()
+    device_hub.actuator_states.append({
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'state': state,
+        'response': result
+    })
+    return result
+
+def read_and_store_sensor():
+    """Read the sensor and store the timestamped reading in the shared history (last 100)."""
+    return hub.record_reading(get_sensor())
+
 # Function to check device status
 def check_device_status():
-    """Check if the ESP32 device is online."""
+    """Probe the ESP32 now, even with its circuit open, and return the health status."""
     try:
-        response = requests.get(f"{base_url}/sensor", timeout=3)
-        if response.status_code == 200:
-            return "Online"
-        else:
-            return "Offline"
-    except:
-        return "Offline"
+        get_sensor()
+    except requests.exceptions.RequestException:
+        pass
+    return hub.device_status
     
 def user_prompt_build(user_input,data):
     """Process user input for Gemini AI."""
@@ -133,26 +236,7 @@ def user_prompt_build(user_input,data):
 Contexto del usuario, esto es lo prioritario por encima de los sensores:
 {user_input}
  
-Especificaciones de los sensores:
-Los siguientes datos son información de sensores de una intersección de calles en una ciudad.
-SENSOR_LIGHT_LEFT: sensor de luz
-SENSOR_LIGHT_RIGHT: sensor de luz
-SENSOR_CO2: Calidad del aire
-SENSOR_CNY1: sensor de cantidad de carros de la primera calle
-SENSOR_CNY2: sensor de cantidad de carros de la primera calle
-SENSOR_CNY3: sensor de cantidad de carros de la primera calle
-SENSOR_CNY4: sensor de cantidad de carros de la segunda calle
-SENSOR_CNY5: sensor de cantidad de carros de la segunda calle
-SENSOR_CNY6: sensor de cantidad de carros de la segunda calle
-SENSOR_P1, SENSOR_P2: no tener en cuenta
- 
-Reglas:
-- Si los sensores de luz presentan valores por debajo de 1000, está de noche.
-- Si el valor de los sensores de cantidad de carros, están en 1, significa que no hay carros.
-- Es prioridad las ordenes del usuario, emergencia es un 1.
-- Puedes hacerle sugerencias al usuario, pero si pide alguna condición de emergencia, se debe cumplir.
-- Si los sensores SENSOR_CNY1, SENSOR_CNY2, SENSOR_CNY3 están en 0 los tres, hay mucho tráfico en la calle 1.
-- Si los sensores SENSOR_CNY4, SENSOR_CNY5, SENSOR_CNY6 están en 0 los tres, hay mucho tráfico en la calle 2.
+{SENSOR_RULES}
 
 Datos de sensores:
 {data}
@@ -232,11 +316,20 @@ def extract_fields(text: str) -> Dict[str, object]:
  
 
 
-# Create tabs
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Device Dashboard", "🔧 Manual Control", "🤖 Gemini AI", "📈 Data Analytics"])
+# Gemini API key configuration (fuera de las pestañas para que no se pierda al cambiar de vista)
+gemini_api_key = st.sidebar.text_input(
+    "Gemini API Key",
+    type="password",
+    help="Enter your Google Gemini API key"
+)
+with st.sidebar.expander("⏱️ Gemini Latency"):
+    st.json(gemini_pool.stats())
+
+# Create tabs (solo se ejecuta la pestaña activa)
+tab1, tab2, tab3, tab4 = lazy_tabs(["📊 Device Dashboard", "🔧 Manual Control", "🤖 Gemini AI", "📈 Data Analytics"], key="iot_controller_tab")
 
 # Tab 1: Device Dashboard
-with tab1:
+if tab1:
     st.markdown('<h2 class="section-header">Device Dashboard</h2>', unsafe_allow_html=True)
     
     # Device status
@@ -244,10 +337,14 @@ with tab1:
     
     with col1:
         if st.button("🔄 Check Device Status", type="primary"):
-            st.session_state.device_status = check_device_status()
+            check_device_status()
         
-        if st.session_state.device_status == "Online":
+        if hub.device_status == "Online":
             st.markdown('<p class="status-online">🟢 Device Status: Online</p>', unsafe_allow_html=True)
+        elif hub.device_status == "Degraded":
+            st.markdown('<p class="status-degraded">🟡 Device Status: Degraded</p>', unsafe_allow_html=True)
+        elif hub.device_status == "Unknown":
+            st.markdown('<p>⚪ Device Status: Unknown</p>', unsafe_allow_html=True)
         else:
             st.markdown('<p class="status-offline">🔴 Device Status: Offline</p>', unsafe_allow_html=True)
     
@@ -255,7 +352,17 @@ with tab1:
         st.metric("Base URL", base_url.split("//")[1] if "//" in base_url else base_url)
     
     with col3:
-        st.metric("Total Data Points", len(st.session_state.sensor_data))
+        st.metric("Total Data Points", len(sensor_log))
+    
+    # Connectivity of every device this process talks to
+    with st.expander("🩺 Device Health"):
+        health_rows = [
+            {"device": url, **device_hub.health.summary(device_hub.poller.requested_interval)}
+            for url, device_hub in list(get_device_registry().items())
+        ]
+        st.dataframe(pd.DataFrame(health_rows), use_container_width=True)
+        st.caption("Polls back off while readings are static and stop while a device's circuit is open; "
+                   "Check Device Status forces a probe.")
     
     # Real-time sensor data
     col1, col2 = st.columns([2, 1])
@@ -264,22 +371,10 @@ with tab1:
         st.markdown('<div class="sensor-card">', unsafe_allow_html=True)
         st.subheader("📡 Sensor Data")
         
-        if st.button("📊 Read Sensor Data", type="secondary") or st.session_state.auto_refresh:
+        if st.button("📊 Read Sensor Data", type="secondary"):
             try:
                 with st.spinner("Reading sensor data..."):
-                    sensor_data = get_sensor()
-                    timestamp = datetime.now()
-                    
-                    # Add timestamp to sensor data
-                    sensor_data['timestamp'] = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                    sensor_data['datetime'] = timestamp
-                    
-                    # Store in session state
-                    st.session_state.sensor_data.append(sensor_data)
-                    
-                    # Keep only last 100 readings
-                    if len(st.session_state.sensor_data) > 100:
-                        st.session_state.sensor_data = st.session_state.sensor_data[-100:]
+                    sensor_data = read_and_store_sensor()
                     
                     st.success("✅ Sensor data updated successfully!")
                     
@@ -291,15 +386,15 @@ with tab1:
                     
             except requests.exceptions.RequestException as e:
                 st.error(f"❌ Connection error: {str(e)}")
-                st.session_state.device_status = "Offline"
             except Exception as e:
                 st.error(f"❌ Error reading sensor: {str(e)}")
         
         # Display last reading if available
-        if st.session_state.sensor_data:
-            last_reading = st.session_state.sensor_data[-1]
+        if sensor_log:
+            last_reading = sensor_log[-1]
             st.write("**Last Reading:**")
-            st.json({k: v for k, v in last_reading.items() if k not in ['datetime']})
+            with section("json: last reading"):
+                st.json({k: v for k, v in last_reading.items() if k not in ['datetime']})
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -315,7 +410,7 @@ with tab1:
                 try:
                     with st.spinner("Setting actuator..."):
                         result = set_actuator(1)
-                        st.session_state.actuator_states.append({
+                        actuator_log.append({
                             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             'state': 1,
                             'response': result
@@ -329,7 +424,7 @@ with tab1:
                 try:
                     with st.spinner("Setting actuator..."):
                         result = set_actuator(0)
-                        st.session_state.actuator_states.append({
+                        actuator_log.append({
                             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             'state': 0,
                             'response': result
@@ -339,8 +434,8 @@ with tab1:
                     st.error(f"❌ Error: {str(e)}")
         
         # Display last actuator state
-        if st.session_state.actuator_states:
-            last_state = st.session_state.actuator_states[-1]
+        if actuator_log:
+            last_state = actuator_log[-1]
             state_text = "ON" if last_state['state'] == 1 else "OFF"
             st.write(f"**Last State:** {state_text}")
             st.write(f"**Time:** {last_state['timestamp']}")
@@ -348,7 +443,7 @@ with tab1:
         st.markdown('</div>', unsafe_allow_html=True)
 
 # Tab 2: Manual Control
-with tab2:
+if tab2:
     st.markdown('<h2 class="section-header">Manual Device Control</h2>', unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
@@ -365,9 +460,7 @@ with tab2:
                     st.json(data)
                     
                     # Store with timestamp
-                    data['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    data['datetime'] = datetime.now()
-                    st.session_state.sensor_data.append(data)
+                    hub.record_reading(data)
                     
             except requests.exceptions.ConnectionError:
                 st.error("❌ Cannot connect to device. Check the IP address and ensure the device is online.")
@@ -389,13 +482,20 @@ with tab2:
         if st.button("Send Custom Request"):
             try:
                 url = f"{base_url}{custom_endpoint}"
+                cache_info = None
                 if method == "GET":
-                    response = requests.get(url, timeout=5)
+                    # Conditional GET: unchanged responses come back as 304 without a body
+                    response, cache_info = http_cache.get(url, timeout=5)
                 else:
                     payload = json.loads(custom_payload)
                     response = requests.post(url, json=payload, timeout=5)
                 
                 st.success(f"✅ Response (Status: {response.status_code})")
+                if cache_info is not None:
+                    cache_stats = http_cache.stats()
+                    st.caption(f"🗄️ Cache {cache_info.status} · {cache_info.saved_bytes:,} bytes saved now, "
+                               f"{cache_stats['bytes_saved']:,} in total ({cache_stats['hits']} hits, "
+                               f"{cache_stats['revalidated']} revalidated)")
                 try:
                     st.json(response.json())
                 except:
@@ -421,7 +521,7 @@ with tab2:
                     st.json(result)
                     
                     # Store state change
-                    st.session_state.actuator_states.append({
+                    actuator_log.append({
                         'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                         'state': actuator_state,
                         'response': result
@@ -435,27 +535,18 @@ with tab2:
                 st.error(f"❌ Unexpected error: {str(e)}")
         
         # Actuator state history
-        if st.session_state.actuator_states:
+        if actuator_log:
             st.subheader("📝 Recent Actuator States")
-            for i, state in enumerate(reversed(st.session_state.actuator_states[-5:])):
+            for i, state in enumerate(reversed(actuator_log[-5:])):
                 state_icon = "🟢" if state['state'] == 1 else "🔴"
                 state_text = "ON" if state['state'] == 1 else "OFF"
                 st.write(f"{state_icon} {state['timestamp']} - {state_text}")
 
 # Tab 3: Gemini AI Integration
-with tab3:
+if tab3:
     st.markdown('<h2 class="section-header">Gemini AI for IoT Analysis</h2>', unsafe_allow_html=True)
     
-    # Gemini API key configuration
-    gemini_api_key = st.sidebar.text_input(
-        "Gemini API Key",
-        type="password",
-        help="Enter your Google Gemini API key"
-    )
-    
     if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-        
         col1, col2 = st.columns([1, 1])
         
         with col1:
@@ -481,10 +572,10 @@ with tab3:
             else:
                 # Pre-built prompts
                 prompts = {
-                    "Analyze Current Sensor Data": f"Analyze this IoT sensor data and provide insights: {st.session_state.sensor_data[-5:] if st.session_state.sensor_data else 'No data available'}",
-                    "Analyze Actuator Performance": f"Analyze the actuator state changes and performance: {st.session_state.actuator_states[-10:] if st.session_state.actuator_states else 'No data available'}",
-                    "Generate Device Report": f"Generate a comprehensive report for this IoT device based on sensor data: {st.session_state.sensor_data[-10:] if st.session_state.sensor_data else 'No data available'} and actuator states: {st.session_state.actuator_states[-5:] if st.session_state.actuator_states else 'No data available'}",
-                    "Predict Maintenance Needs": f"Based on this sensor data, predict potential maintenance needs: {st.session_state.sensor_data[-10:] if st.session_state.sensor_data else 'No data available'}"
+                    "Analyze Current Sensor Data": f"Analyze this IoT sensor data and provide insights: {sensor_log[-5:] if sensor_log else 'No data available'}",
+                    "Analyze Actuator Performance": f"Analyze the actuator state changes and performance: {actuator_log[-10:] if actuator_log else 'No data available'}",
+                    "Generate Device Report": f"Generate a comprehensive report for this IoT device based on sensor data: {sensor_log[-10:] if sensor_log else 'No data available'} and actuator states: {actuator_log[-5:] if actuator_log else 'No data available'}",
+                    "Predict Maintenance Needs": f"Based on this sensor data, predict potential maintenance needs: {sensor_log[-10:] if sensor_log else 'No data available'}"
                 }
                 user_prompt = prompts[analysis_type]
                 st.text_area("Generated Prompt", value=user_prompt, height=150, disabled=True)
@@ -501,21 +592,21 @@ with tab3:
                     try:
                         sensor_data_obtenaid = get_sensor()
 
-                        model = genai.GenerativeModel('gemini-2.0-flash')
-                        
                         user_prompt = user_prompt_build(user_prompt, sensor_data_obtenaid)
                    
                         with st.spinner("Analyzing with Gemini AI..."):
-                            response = model.generate_content(
+                            result = gemini_pool.generate(
+                                gemini_api_key,
+                                'gemini-2.0-flash',
                                 user_prompt,
-                                generation_config=genai.types.GenerationConfig(
-                                    temperature=temperature,
-                                    max_output_tokens=max_tokens
-                                )
+                                temperature=temperature,
+                                max_output_tokens=max_tokens
                             )
+                        response = result.response
                         
                         if response.text:
                             st.success("✅ Analysis complete!")
+                            st.caption(f"⏱️ First token {result.first_token_seconds:.2f}s · total {result.total_seconds:.2f}s")
 
 
                             response_json=extract_fields(response.text)
@@ -527,7 +618,7 @@ with tab3:
                             # Check for emergency condition
                             
                             # Save conversation
-                            st.session_state.gemini_conversations.append({
+                            conversation_log.append({
                                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                                 "analysis_type": analysis_type,
                                 "prompt": user_prompt,
@@ -542,21 +633,113 @@ with tab3:
                     st.warning("⚠️ Please enter a prompt.")
         
         # Recent analyses
-        if st.session_state.gemini_conversations:
+        if conversation_log:
             st.subheader("📋 Recent Analyses")
-            for i, conv in enumerate(reversed(st.session_state.gemini_conversations[-3:])):
+            for i, conv in enumerate(reversed(conversation_log[-3:])):
                 with st.expander(f"{conv['analysis_type']} - {conv['timestamp']}"):
                     st.markdown(conv['response'])
     else:
         st.info("🔑 Please enter your Gemini API key in the sidebar to enable AI analysis.")
+    
+    # District mode: several intersections per model request instead of one call per device
+    st.subheader("🏙️ District Batch Analysis")
+    district_urls = st.text_area(
+        "Device URLs",
+        value=base_url,
+        height=100,
+        help="One ESP32 base URL per line (e.g. the --urls-file written by device_simulator.py)"
+    )
+    district_prompt = st.text_input("Instruction", value="Analiza el tráfico de cada intersección")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        max_per_batch = st.number_input("Intersections per request", min_value=1, max_value=50, value=10)
+    with col2:
+        batch_concurrency = st.number_input("Concurrent requests", min_value=1, max_value=16, value=4)
+    with col3:
+        use_fake_model = st.checkbox("Use local fake model", value=not gemini_api_key,
+                                     help="Applies the prompt rules locally; no API key or network needed")
+        # Off by default: one click would otherwise POST /actuator (state=0 included) to every listed device
+        apply_decisions = st.checkbox("Apply emergencia to each device", value=False,
+                                      help="POST /actuator to every listed device with the model's decision")
+    if apply_decisions and use_fake_model:
+        st.warning("⚠️ The local fake model will drive the actuators of every listed device.")
+    
+    if st.button("🏙️ Analyze District"):
+        urls = list(dict.fromkeys(u.strip().rstrip("/") for u in district_urls.splitlines() if u.strip()))
+        invalid_urls = [url for url in urls if not valid_device_url(url)]
+        if invalid_urls:
+            st.warning(f"⚠️ Not a device URL: {', '.join(invalid_urls)}")
+        elif not urls:
+            st.warning("⚠️ Please enter at least one device URL.")
+        elif not use_fake_model and not gemini_api_key:
+            st.warning("⚠️ Enter a Gemini API key or use the local fake model.")
+        else:
+            if len(urls) > MAX_DEVICE_HUBS:
+                st.warning(f"⚠️ Only the first {MAX_DEVICE_HUBS} devices are analyzed.")
+                urls = urls[:MAX_DEVICE_HUBS]
+            # Short ids keep the prompt small; they map back to the device URLs
+            devices = {f"INT_{i:02d}": (url, get_device_hub(url)) for i, url in enumerate(urls, start=1)}
+            with st.spinner(f"Reading {len(devices)} intersections..."):
+                with ThreadPoolExecutor(max_workers=16) as pool:
+                    list(pool.map(read_device, [device_hub for _, device_hub in devices.values()]))
+                contexts = [
+                    compact_context(device_id, device_hub.sensor_data.snapshot())
+                    for device_id, (_, device_hub) in devices.items()
+                ]
+            
+            if use_fake_model:
+                generate = FakeModel()
+            else:
+                def generate(prompt):
+                    return gemini_pool.generate(
+                        gemini_api_key, 'gemini-2.0-flash', prompt,
+                        temperature=0.2, max_output_tokens=min(8192, 150 * int(max_per_batch))
+                    ).response.text
+            
+            with st.spinner("Analyzing district..."):
+                results, info = analyze_district(
+                    contexts, district_prompt, generate,
+                    max_per_batch=int(max_per_batch), concurrency=int(batch_concurrency)
+                )
+                applied = {}
+                if apply_decisions:
+                    applied = fan_out(results, {
+                        device_id: (lambda state, url=url, device_hub=device_hub: post_device_actuator(url, device_hub, state))
+                        for device_id, (url, device_hub) in devices.items()
+                    })
+            
+            st.success(f"✅ {info['intersections']} intersections in {info['batches']} requests "
+                       f"({info['requests_saved']} saved) · {info['elapsed_seconds']:.2f}s")
+            rows = []
+            for device_id, (url, device_hub) in devices.items():
+                result = results.get(device_id)
+                outcome = applied.get(device_id)
+                rows.append({
+                    "id": device_id,
+                    "device": url,
+                    "emergencia": result.emergencia if result else None,
+                    "respuesta": result.respuesta if result else "",
+                    "batch": result.batch if result else None,
+                    "error": (result.error if result else "no readings") or (str(outcome) if isinstance(outcome, Exception) else None),
+                    "applied": outcome is not None and not isinstance(outcome, Exception),
+                })
+            st.dataframe(pd.DataFrame(rows), use_container_width=True)
+            conversation_log.append({
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "analysis_type": "District Batch Analysis",
+                "prompt": district_prompt,
+                "response": "\n".join(f"- **{r['id']}** ({r['device']}): {r['respuesta'] or r['error']}" for r in rows)
+            })
 
 # Tab 4: Data Analytics
-with tab4:
+if tab4:
     st.markdown('<h2 class="section-header">Data Analytics & Visualization</h2>', unsafe_allow_html=True)
     
-    if st.session_state.sensor_data:
+    if sensor_log:
         # Convert to DataFrame for easier manipulation
-        df = pd.DataFrame(st.session_state.sensor_data)
+        with section("dataframe: analytics"):
+            data_version = (sensor_log.version, sensor_log.epoch)
+            df = pd.DataFrame(sensor_log.snapshot())
         
         # Data overview
         col1, col2 = st.columns(2)
@@ -588,38 +771,44 @@ with tab4:
             st.subheader("📈 Sensor Data Visualization")
             
             if chart_type == "Line Chart":
-                fig = go.Figure()
-                for sensor in selected_sensors:
-                    fig.add_trace(go.Scatter(
-                        x=df['datetime'],
-                        y=df[sensor],
-                        mode='lines+markers',
-                        name=sensor.capitalize()
-                    ))
-                fig.update_layout(
-                    title="Sensor Data Over Time",
-                    xaxis_title="Time",
-                    yaxis_title="Value",
-                    hovermode='x unified'
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                if selected_sensors:
+                    with section("chart: line"):
+                        # Cached figure; later reruns only send the new readings
+                        live_line_chart(
+                            sensor_log,
+                            selected_sensors,
+                            key=f"analytics_line_chart:{base_url}",
+                            names=[sensor.capitalize() for sensor in selected_sensors],
+                            layout={
+                                "title": {"text": "Sensor Data Over Time"},
+                                "xaxis": {"title": {"text": "Time"}},
+                                "yaxis": {"title": {"text": "Value"}},
+                                "hovermode": "x unified"
+                            }
+                        )
             
             elif chart_type == "Scatter Plot":
                 if len(selected_sensors) >= 2:
-                    fig = px.scatter(
-                        df, 
-                        x=selected_sensors[0], 
-                        y=selected_sensors[1],
-                        title=f"{selected_sensors[0].capitalize()} vs {selected_sensors[1].capitalize()}"
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+                    with section("chart: scatter"):
+                        # Rebuilt only when the sensors or the data change (shared by every session)
+                        fig = FIGURES.get(
+                            ("scatter", base_url, tuple(selected_sensors[:2]), data_version),
+                            lambda: px.scatter(
+                                df, 
+                                x=selected_sensors[0], 
+                                y=selected_sensors[1],
+                                title=f"{selected_sensors[0].capitalize()} vs {selected_sensors[1].capitalize()}"
+                            )
+                        )
+                    st.plotly_chart(measure_figure("figure bytes: scatter", fig), use_container_width=True)
                 else:
                     st.warning("Please select at least 2 sensors for scatter plot.")
         
         # Statistical summary
         if numeric_cols:
             st.subheader("📋 Statistical Summary")
-            st.dataframe(df[numeric_cols].describe())
+            with section("describe: analytics"):
+                st.dataframe(df[numeric_cols].describe())
         
         # Raw data table
         with st.expander("🔍 View Raw Data"):
@@ -639,8 +828,8 @@ with tab4:
         
         with col2:
             if st.button("📥 Download Actuator Data as CSV"):
-                if st.session_state.actuator_states:
-                    actuator_df = pd.DataFrame(st.session_state.actuator_states)
+                if actuator_log:
+                    actuator_df = pd.DataFrame(actuator_log.snapshot())
                     csv = actuator_df.to_csv(index=False)
                     st.download_button(
                         label="Download CSV",
@@ -650,6 +839,11 @@ with tab4:
                     )
     else:
         st.info("📊 No sensor data available yet. Start collecting data in the Device Dashboard tab.")
+    
+    # On-disk history beyond the last 100 readings kept in memory
+    history_panel(hub.history, key="iot_controller_history", device_ids=list(get_device_registry()))
+
+finish_rerun()
 
 # Auto-refresh logic
 if st.session_state.auto_refresh and 'refresh_interval' in locals():
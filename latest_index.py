@@ -0,0 +1,99 @@
+"""Último valor conocido por dispositivo.
+
+Cada lectura ingresada se fusiona en la entrada de su ``sensor_id``: se
+guarda el último valor de cada campo con el timestamp en que llegó, así una
+lectura parcial no borra los campos que no trae. Consultar un dispositivo o
+la flota completa es O(1) por dispositivo, sin recorrer el historial.
+
+Cada entrada lleva una versión que cambia con cada actualización; con ella
+se arman los ETag de ``/sensor/latest`` y ``/sensor/latest/all`` para que
+los clientes que consultan seguido reciban 304 si nada cambió.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Campos de metadatos que no se tratan como valores
+META_FIELDS = ("sensor_id", "timestamp", "datetime")
+
+
+class LatestIndex:
+    """Índice ``sensor_id`` -> último valor y timestamp de cada campo."""
+
+    def __init__(self, max_devices=10000):
+        self.max_devices = max_devices
+        self.version = 0
+        # Distingue ETags de distintos arranques del proceso
+        self._epoch = format(int(time.time()), "x")
+        self._lock = threading.Lock()
+        self._devices = OrderedDict()  # sensor_id -> entrada (el más reciente al final)
+
+    def update(self, reading):
+        """Fusionar una lectura en la entrada de su dispositivo."""
+        sensor_id = str(reading.get("sensor_id", "unknown"))
+        timestamp = reading.get("timestamp")
+        with self._lock:
+            entry = self._devices.pop(sensor_id, None)
+            if entry is None:
+                entry = {"values": {}, "field_timestamps": {}, "version": 0}
+            for field, value in reading.items():
+                if field not in META_FIELDS:
+                    entry["values"][field] = value
+                    entry["field_timestamps"][field] = timestamp
+            entry["timestamp"] = timestamp
+            entry["datetime"] = reading.get("datetime")
+            self.version += 1
+            entry["version"] = self.version
+            self._devices[sensor_id] = entry
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+
+    def update_many(self, readings):
+        for reading in readings:
+            self.update(reading)
+
+    def _flatten(self, sensor_id, entry, with_datetime=False):
+        latest = dict(entry["values"])
+        latest["sensor_id"] = sensor_id
+        latest["timestamp"] = entry["timestamp"]
+        latest["field_timestamps"] = dict(entry["field_timestamps"])
+        if with_datetime:
+            latest["datetime"] = entry["datetime"]
+        return latest
+
+    def get(self, sensor_id, with_datetime=False):
+        """Última lectura fusionada de un dispositivo (None si no se conoce)."""
+        return self.get_with_etag(sensor_id, with_datetime)[0]
+
+    def get_with_etag(self, sensor_id, with_datetime=False):
+        """``(lectura, etag)`` de un dispositivo, tomados juntos; ``(None, None)`` si no se conoce."""
+        sensor_id = str(sensor_id)
+        with self._lock:
+            entry = self._devices.get(sensor_id)
+            if entry is None:
+                return None, None
+            # El id lo elige el cliente: en el ETag va su hash (comillas o espacios lo invalidarían)
+            device = hashlib.sha1(sensor_id.encode()).hexdigest()[:12]
+            return self._flatten(sensor_id, entry, with_datetime), f"{self._epoch}-{device}-{entry['version']}"
+
+    def most_recent(self, with_datetime=False):
+        """Entrada del último dispositivo que envió datos."""
+        with self._lock:
+            if not self._devices:
+                return None
+            sensor_id = next(reversed(self._devices))
+            return self._flatten(sensor_id, self._devices[sensor_id], with_datetime)
+
+    def all(self):
+        """``(lecturas por dispositivo, etag)`` del índice completo."""
+        with self._lock:
+            devices = {sensor_id: self._flatten(sensor_id, entry) for sensor_id, entry in self._devices.items()}
+            return devices, f"{self._epoch}-all-{self.version}"
+
+    def device_ids(self):
+        with self._lock:
+            return list(self._devices)
+
+    def __len__(self):
+        return len(self._devices)
@@ -0,0 +1,74 @@
+"""Importación perezosa de los módulos pesados de las páginas.
+
+``google.generativeai`` (con gRPC), ``pandas``, ``plotly`` y ``pyarrow``
+tardan cientos de milisegundos en importarse y no todas las vistas los
+usan. ``lazy_import`` devuelve un sustituto que importa el módulo real en el
+primer acceso a un atributo, así que el resto del código no cambia:
+
+    pd = lazy_import("pandas")
+    ...
+    df = pd.DataFrame(rows)  # aquí se importa pandas
+
+``import_times()`` devuelve cuánto tardó cada importación diferida (lo
+muestra ``benchmarks/startup.py``). Con ``IOT_EAGER_IMPORTS=1`` todo se
+importa al momento, como antes, para comparar.
+"""
+import importlib
+import os
+import threading
+import time
+
+EAGER = os.environ.get("IOT_EAGER_IMPORTS", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_times = {}
+
+
+class LazyModule:
+    """Sustituto de un módulo que lo importa en el primer acceso."""
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(self._name)
+            with _lock:
+                _times.setdefault(self._name, time.perf_counter() - started)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def lazy_import(name):
+    """Módulo ``name`` importado en el primer uso (o ya, con ``IOT_EAGER_IMPORTS``)."""
+    module = LazyModule(name)
+    if EAGER:
+        module._load()
+    return module
+
+
+def import_times():
+    """Segundos que tardó cada importación diferida, en orden de carga."""
+    with _lock:
+        return dict(_times)
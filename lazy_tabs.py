@@ -0,0 +1,30 @@
+"""Pestañas perezosas: solo se ejecuta el cuerpo de la vista activa.
+
+``st.tabs`` ejecuta todos los cuerpos en cada rerun aunque el usuario vea
+solo uno. ``lazy_tabs`` dibuja una barra de navegación equivalente y
+devuelve un booleano por pestaña, de modo que cada cuerpo se escribe como
+``if tab1:`` y las vistas inactivas no construyen DataFrames ni figuras.
+
+Uso:
+    tab1, tab2 = lazy_tabs(["📊 Dashboard", "📈 Analytics"], key="main_tab")
+    if tab1:
+        ...
+"""
+import streamlit as st
+
+from rerun_profiler import begin_section
+
+
+def lazy_tabs(labels, key):
+    """Mostrar la barra de pestañas y devolver qué pestaña está activa."""
+    active = st.radio(
+        "Section",
+        labels,
+        key=key,
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    st.divider()
+    # La pestaña activa se mide hasta finish_rerun()
+    begin_section(f"tab: {active}")
+    return [label == active for label in labels]
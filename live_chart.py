@@ -0,0 +1,237 @@
+"""Gráficas en tiempo real con figura cacheada y actualizaciones incrementales.
+
+``st.plotly_chart`` recibe una figura nueva en cada rerun: se vuelven a
+agregar las trazas, a aplicar ``update_layout`` y a enviar al navegador el
+JSON completo aunque solo haya llegado una lectura. ``live_line_chart``
+dibuja las series de un ``SharedLog`` con un componente propio:
+
+- La especificación completa (trazas y diseño) se arma una vez por
+  (log, series elegidas, versión de los datos) y se guarda en ``FIGURES``,
+  que comparten todas las sesiones del proceso.
+- Cada sesión recuerda qué figura y hasta qué versión del log envió a cada
+  gráfica. Mientras no cambien las series, solo se envían las lecturas
+  nuevas y el navegador las agrega con ``Plotly.extendTraces`` (recortando
+  a ``max_points``, como el log).
+- El navegador descarta un delta que no continúa su cursor (por ejemplo, si
+  el iframe se volvió a crear al cambiar de pestaña en ``lazy_tabs``) y pide
+  la figura completa con ``setComponentValue``.
+
+``FigureCache.get`` sirve también para las figuras estáticas de Plotly
+(``px.bar``, ``px.scatter``): se reconstruyen solo cuando cambia su clave.
+plotly.js se sirve desde el paquete ``plotly`` instalado, sin CDN.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from rerun_profiler import is_enabled, measure_bytes
+
+_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="plotly.min.js"></script>
+<style>html, body { margin: 0; padding: 0; overflow: hidden; }</style>
+</head>
+<body>
+<div id="chart"></div>
+<script>
+const chart = document.getElementById("chart");
+const mount = Math.random().toString(36).slice(2);
+let spec = null, cursor = null, resyncs = 0, frameHeight = 0;
+
+function send(type, data) {
+  window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+}
+
+function resync() {
+  // Sin figura base o con un hueco en los datos: pedir la especificación completa
+  resyncs += 1;
+  spec = null;
+  send("streamlit:setComponentValue", {value: {mount: mount, resync: resyncs}, dataType: "json"});
+}
+
+function render(args) {
+  if (args.figure) {
+    Plotly.react(chart, args.figure.data, args.figure.layout, {responsive: true, displaylogo: false});
+    spec = args.spec_id;
+    cursor = args.cursor;
+  } else if (args.delta) {
+    const delta = args.delta;
+    if (spec !== args.spec_id || cursor === null || delta.from > cursor) {
+      resync();
+      return;
+    }
+    const skip = cursor - delta.from;  // lecturas del delta que ya se aplicaron
+    if (delta.x.length > skip) {
+      const ys = delta.y.map((values) => values.slice(skip));
+      const x = delta.x.slice(skip);
+      Plotly.extendTraces(chart, {x: ys.map(() => x), y: ys}, ys.map((_, i) => i), args.max_points);
+    }
+    cursor = Math.max(cursor, delta.to);
+  }
+  if (args.height !== frameHeight) {
+    frameHeight = args.height;
+    send("streamlit:setFrameHeight", {height: frameHeight});
+  }
+}
+
+window.addEventListener("message", (event) => {
+  if (event.data && event.data.type === "streamlit:render") {
+    render(event.data.args);
+  }
+});
+send("streamlit:componentReady", {apiVersion: 1});
+</script>
+</body>
+</html>
+"""
+
+_component = None
+_component_lock = threading.Lock()
+
+
+def _frontend_dir():
+    """Directorio con index.html y el plotly.min.js del paquete instalado."""
+    plotly_js = os.path.join(
+        importlib.util.find_spec("plotly").submodule_search_locations[0], "package_data", "plotly.min.js"
+    )
+    version = hashlib.sha1(f"{_HTML}{os.path.getsize(plotly_js)}{os.path.getmtime(plotly_js)}".encode()).hexdigest()[:12]
+    directory = os.path.join(tempfile.gettempdir(), f"iot_live_chart_{version}")
+    if not os.path.exists(os.path.join(directory, "index.html")):
+        os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(plotly_js, os.path.join(directory, "plotly.min.js.tmp"))
+        os.replace(os.path.join(directory, "plotly.min.js.tmp"), os.path.join(directory, "plotly.min.js"))
+        with open(os.path.join(directory, "index.html.tmp"), "w") as f:
+            f.write(_HTML)
+        os.replace(os.path.join(directory, "index.html.tmp"), os.path.join(directory, "index.html"))
+    return directory
+
+
+def _get_component():
+    global _component
+    with _component_lock:
+        if _component is None:
+            _component = components.declare_component("live_chart", path=_frontend_dir())
+        return _component
+
+
+class FigureCache:
+    """LRU de figuras por clave, compartido entre sesiones y reruns."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, key, build):
+        """Figura guardada para ``key`` o ``build()`` si no existe."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        figure = build()
+        with self._lock:
+            self._entries[key] = figure
+            self.builds += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return figure
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "builds": self.builds}
+
+
+FIGURES = FigureCache()
+
+
+def _x_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _y_value(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _columns(readings, x, fields):
+    return [_x_value(r.get(x)) for r in readings], [[_y_value(r.get(f)) for r in readings] for f in fields]
+
+
+def build_figure(readings, fields, x="datetime", names=None, colors=None, layout=None,
+                 mode="lines+markers", marker_size=None):
+    """Especificación de plotly.js (``data`` y ``layout``) sin pasar por ``go.Figure``."""
+    xs, ys = _columns(readings, x, fields)
+    traces = []
+    for i, (name, values) in enumerate(zip(names or fields, ys)):
+        trace = {"type": "scatter", "mode": mode, "name": name, "x": xs, "y": values}
+        if colors:
+            trace["line"] = {"color": colors[i % len(colors)]}
+        if marker_size:
+            trace["marker"] = {"size": marker_size}
+        traces.append(trace)
+    return {"data": traces, "layout": layout or {}}
+
+
+def build_delta(readings, fields, start, end, x="datetime"):
+    """Lecturas ``start`` < versión <= ``end`` como columnas para ``Plotly.extendTraces``."""
+    xs, ys = _columns(readings, x, fields)
+    return {"from": start, "to": end, "x": xs, "y": ys}
+
+
+def live_line_chart(log, fields, key, x="datetime", names=None, colors=None, layout=None,
+                    mode="lines+markers", marker_size=None, max_points=None, height=450):
+    """Series ``fields`` de ``log`` contra ``x``; tras el primer render solo envía lecturas nuevas."""
+    max_points = max_points or log.maxlen or 1000
+    names = names or list(fields)
+    layout = dict(layout or {}, height=height, autosize=True)
+    spec_id = hashlib.sha1(json.dumps(
+        [list(fields), names, colors, layout, x, mode, marker_size, max_points], sort_keys=True, default=str
+    ).encode()).hexdigest()[:16]
+
+    state_key = f"_live_chart_sent:{key}"
+    sent = st.session_state.get(state_key)
+    # Último pedido de resincronización del navegador (mount del iframe, contador)
+    request = st.session_state.get(key)
+    if request:
+        resync = [request.get("mount"), request.get("resync")]
+    else:
+        resync = sent["resync"] if sent else None
+    new_readings, version = log.since(sent["cursor"]) if sent else ([], log.version)
+    full = (
+        sent is None
+        or sent["spec_id"] != spec_id
+        or sent["epoch"] != log.epoch
+        or sent["resync"] != resync
+        or len(new_readings) != version - sent["cursor"]  # lecturas ya descartadas del log
+        or len(new_readings) >= max_points
+    )
+
+    if full:
+        # Lecturas y versión de una misma lectura del log: el cursor coincide con la figura
+        readings, version = log.since(0)
+        # FIGURES es de todo el proceso: la clave incluye el log (cada dispositivo tiene el suyo)
+        figure = FIGURES.get((id(log), spec_id, version, log.epoch), lambda: build_figure(
+            readings[-max_points:], fields, x, names, colors, layout, mode, marker_size
+        ))
+        args = {"figure": figure}
+    else:
+        args = {"delta": build_delta(new_readings, fields, sent["cursor"], version, x)}
+    args.update(spec_id=spec_id, cursor=version, max_points=max_points, height=height)
+    st.session_state[state_key] = {"spec_id": spec_id, "cursor": version, "epoch": log.epoch, "resync": resync}
+
+    if is_enabled():
+        measure_bytes(f"chart bytes: {key}", len(json.dumps(args, default=str).encode()))
+    _get_component()(key=key, default=None, **args)
@@ -354,10 +354,25 @@ void actualizarPantalla(int mode){
 }
 
 
+// Intervalo entre envíos; el servidor lo alarga con Retry-After (429/503)
+unsigned long intervaloEnvio = 5000;
+const char* cabecerasEnvio[] = {"Retry-After"};
+
+void ajustarIntervaloEnvio(HTTPClient& http, int httpResponseCode){
+  if (httpResponseCode == 429 || httpResponseCode == 503) {
+    long retryAfter = http.header("Retry-After").toInt();
+    intervaloEnvio = max(5000UL, (unsigned long)retryAfter * 1000UL);
+    Serial.println("Servidor saturado, reintento en " + String(intervaloEnvio / 1000) + " s");
+  } else {
+    intervaloEnvio = 5000;
+  }
+}
+
 void sendSensorData(){
   HTTPClient http;
   http.begin("http://192.168.1.2:5002/sensor/data"); // IP de tu PC
   http.addHeader("Content-Type", "application/json");
+  http.collectHeaders(cabecerasEnvio, 1);
   
   // Crear JSON con datos de sensores
   StaticJsonDocument<200> doc;
@@ -375,9 +390,54 @@ void sendSensorData(){
     String response = http.getString();
     Serial.println("Response: " + response);
   }
+  ajustarIntervaloEnvio(http, httpResponseCode);
   Serial.println("Comunicación de envio");
   http.end();
-  delay(5000);
+  delay(intervaloEnvio);
+}
+
+// Envío en formato binario compacto (application/x-sensor-struct, esquema 1)
+// cabecera: 'S' | id de esquema (uint8) | cantidad (uint16 LE)
+// registro: sensor_id (16 bytes) | 11 sensores uint16 LE (ver sensor_codec.py)
+void sendSensorDataBinary(){
+  uint8_t payload[4 + 16 + 11 * 2];
+  memset(payload, 0, sizeof(payload));
+  payload[0] = 'S';
+  payload[1] = 1;
+  payload[2] = 1;
+  payload[3] = 0;
+  strncpy((char*)&payload[4], "ESP32_001", 16);
+
+  uint16_t valores[11] = {
+    (uint16_t)analogRead(SENSOR_LIGHT_LEFT),
+    (uint16_t)analogRead(SENSOR_LIGHT_RIGHT),
+    (uint16_t)analogRead(SENSOR_CO2),
+    (uint16_t)digitalRead(SENSOR_CNY1),
+    (uint16_t)digitalRead(SENSOR_CNY2),
+    (uint16_t)digitalRead(SENSOR_CNY3),
+    (uint16_t)digitalRead(SENSOR_CNY4),
+    (uint16_t)digitalRead(SENSOR_CNY5),
+    (uint16_t)digitalRead(SENSOR_CNY6),
+    (uint16_t)digitalRead(SENSOR_P1),
+    (uint16_t)digitalRead(SENSOR_P2)
+  };
+  // El ESP32 es little-endian: se copian los valores tal cual
+  memcpy(&payload[20], valores, sizeof(valores));
+
+  HTTPClient http;
+  http.begin("http://192.168.1.2:5002/sensor/data"); // IP de tu PC
+  http.addHeader("Content-Type", "application/x-sensor-struct");
+  http.collectHeaders(cabecerasEnvio, 1);
+
+  int httpResponseCode = http.POST(payload, sizeof(payload));
+
+  if (httpResponseCode > 0) {
+    String response = http.getString();
+    Serial.println("Response: " + response);
+  }
+  ajustarIntervaloEnvio(http, httpResponseCode);
+  http.end();
+  delay(intervaloEnvio);
 }
 
 void getWeather(){
@@ -0,0 +1,103 @@
+"""API de lectura en streaming para los consumidores de la ingesta.
+
+Cada lectura aceptada por ``POST /sensor/data`` recibe un número de
+secuencia creciente: su posición en un ``SharedLog`` (``version``). Los
+consumidores piden lo que llegó después de una secuencia y lo reciben en
+cuanto llega, sin consultas vacías:
+
+    GET /sensor/stream?since=<seq>&timeout=25   long-poll (JSON)
+    GET /sensor/stream/sse?since=<seq>          Server-Sent Events (acepta Last-Event-ID)
+    GET /sensor/stream/ndjson?since=<seq>       NDJSON por chunks
+
+Sin ``since`` se empieza por la próxima lectura. ``sensor_id`` filtra un
+dispositivo. Si el cliente se atrasó más que el buffer, ``missed`` indica
+cuántas lecturas ya no están disponibles. Una secuencia mayor que la actual
+(el servidor se reinició) vuelve a empezar desde el principio del buffer.
+"""
+import json
+
+from flask import Response, jsonify, request
+
+# Segundos máximos de espera de un long-poll y entre keep-alives de los streams
+MAX_POLL_TIMEOUT = 60
+HEARTBEAT_SECONDS = 15
+
+
+def sequenced(items, version, sensor_id=None):
+    """Lecturas de ``SharedLog.since`` con su ``seq`` y sin el ``datetime``."""
+    first = version - len(items) + 1
+    readings = []
+    for offset, item in enumerate(items):
+        if sensor_id is not None and str(item.get('sensor_id')) != sensor_id:
+            continue
+        reading = {k: v for k, v in item.items() if k != 'datetime'}
+        reading['seq'] = first + offset
+        readings.append(reading)
+    return readings
+
+
+def _start_cursor(log, since):
+    if since is None:
+        return log.version
+    since = int(since)
+    return 0 if since > log.version else max(since, 0)
+
+
+def register_stream_routes(app, log):
+    """Agregar las rutas de streaming sobre ``log`` (un ``SharedLog``)."""
+
+    @app.route('/sensor/stream', methods=['GET'])
+    def long_poll_readings():
+        """Long-poll: responde en cuanto hay lecturas después de ``since``"""
+        try:
+            cursor = _start_cursor(log, request.args.get('since'))
+            timeout = min(float(request.args.get('timeout', 25)), MAX_POLL_TIMEOUT)
+        except ValueError:
+            return jsonify({"error": "since must be an integer and timeout a number"}), 400
+        items, version = log.wait_since(cursor, timeout)
+        return jsonify({
+            "readings": sequenced(items, version, request.args.get('sensor_id')),
+            "next": version,
+            "missed": max(0, version - cursor - len(items))
+        }), 200
+
+    def stream(render, heartbeat, mimetype):
+        try:
+            cursor = _start_cursor(log, request.args.get('since', request.headers.get('Last-Event-ID')))
+        except ValueError:
+            return jsonify({"error": "since must be an integer"}), 400
+        sensor_id = request.args.get('sensor_id')
+
+        def generate():
+            nonlocal cursor
+            while True:
+                items, version = log.wait_since(cursor, HEARTBEAT_SECONDS)
+                if version == cursor:
+                    # Mantener viva la conexión y detectar clientes desconectados
+                    yield heartbeat
+                    continue
+                chunk = "".join(render(reading) for reading in sequenced(items, version, sensor_id))
+                cursor = version
+                if chunk:
+                    yield chunk
+
+        return Response(generate(), mimetype=mimetype, headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+
+    @app.route('/sensor/stream/sse', methods=['GET'])
+    def sse_readings():
+        """Server-Sent Events: un evento ``reading`` por lectura, con ``id`` = seq"""
+        return stream(
+            lambda reading: f"id: {reading['seq']}\nevent: reading\ndata: {json.dumps(reading, default=str)}\n\n",
+            ": keep-alive\n\n",
+            "text/event-stream"
+        )
+
+    @app.route('/sensor/stream/ndjson', methods=['GET'])
+    def ndjson_readings():
+        """Una lectura JSON por línea, enviadas por chunks a medida que llegan"""
+        return stream(lambda reading: json.dumps(reading, default=str) + "\n", "\n", "application/x-ndjson")
+
+    return app
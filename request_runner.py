@@ -0,0 +1,214 @@
+"""Ejecutor concurrente de peticiones HTTP para la pestaña REST API Consumer.
+
+Repite una petición o la envía a una lista de destinos (URLs u objetos JSON
+que sobrescriben url, params, json o headers) con asyncio, con concurrencia,
+timeout y tasa configurables, y resume latencias p50/p90/p99, throughput y
+distribución de códigos de estado:
+
+    report = run_requests_sync(expand_targets("GET", url, targets=lines),
+                               total=500, concurrency=20, timeout=5, rate=100)
+    report.summary["latency_ms"]["p99"]
+
+Usa ``aiohttp`` si está instalado; si no, ``requests`` en un pool de hilos
+del tamaño de la concurrencia (el loop de asyncio sigue coordinando los
+envíos y la tasa).
+"""
+import asyncio
+import json
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # dependencia opcional
+    aiohttp = None
+
+METHODS = ("GET", "POST", "PUT", "DELETE")
+
+RunReport = namedtuple("RunReport", "summary results")
+
+
+@dataclass
+class RequestSpec:
+    method: str
+    url: str
+    headers: dict = field(default_factory=dict)
+    params: dict = None
+    json: object = None
+
+
+@dataclass
+class RequestResult:
+    url: str
+    status: object  # código HTTP o nombre de la excepción
+    latency: float  # segundos
+    size: int = 0
+    sample: str = ""  # inicio del cuerpo o mensaje de error (solo del primer resultado de cada código o error)
+
+    @property
+    def ok(self):
+        return isinstance(self.status, int) and 200 <= self.status < 300
+
+
+def expand_targets(method, url, headers=None, params=None, body=None, targets=""):
+    """Peticiones a ejecutar: una por línea de ``targets`` o solo la base si está vacío.
+
+    Cada línea es una URL o un objeto JSON con ``url``, ``params``, ``json``,
+    ``headers`` o ``method`` que reemplazan los de la petición base.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unsupported method {method!r}")
+    base = RequestSpec(method, url, dict(headers or {}), params, body)
+    specs = []
+    for number, line in enumerate(targets.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if not line.startswith("{"):
+            specs.append(RequestSpec(base.method, line, base.headers, base.params, base.json))
+            continue
+        try:
+            override = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Target line {number}: {e}") from None
+        specs.append(RequestSpec(
+            override.get("method", base.method).upper(),
+            override.get("url", base.url),
+            {**base.headers, **override.get("headers", {})},
+            override.get("params", base.params),
+            override.get("json", base.json),
+        ))
+    return specs or [base]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+def summarize(results, elapsed, concurrency, rate):
+    latencies = [r.latency * 1000 for r in results]
+    ok = [r.latency * 1000 for r in results if r.ok]
+    statuses = Counter(str(r.status) for r in results)
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "concurrency": concurrency,
+        "target_rate_rps": rate,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+            "ok_p50": percentile(ok, 0.50),
+        },
+        "status_codes": dict(statuses.most_common()),
+        "bytes_received": sum(r.size for r in results),
+    }
+
+
+class _AiohttpClient:
+    def __init__(self, concurrency, timeout):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+
+    async def send(self, spec):
+        async with self.session.request(spec.method, spec.url, headers=spec.headers,
+                                        params=spec.params, json=spec.json) as response:
+            body = await response.read()
+            return response.status, body
+
+    async def close(self):
+        await self.session.close()
+
+
+class _ThreadedClient:
+    """``requests`` con un pool de conexiones y de hilos del tamaño de la concurrencia."""
+
+    def __init__(self, concurrency, timeout):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="request-runner")
+
+    def _send(self, spec):
+        response = self.session.request(spec.method, spec.url, headers=spec.headers, params=spec.params,
+                                        json=spec.json, timeout=self.timeout)
+        return response.status_code, response.content
+
+    async def send(self, spec):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._send, spec)
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+async def run_requests(specs, total=None, concurrency=10, timeout=10.0, rate=None, duration=None,
+                       on_progress=None):
+    """Enviar ``total`` peticiones (rotando entre ``specs``) y devolver un ``RunReport``.
+
+    ``rate`` limita el total de peticiones por segundo (None = sin límite) y
+    ``duration`` corta la corrida tras esos segundos. ``on_progress(hechas,
+    total)`` se llama a medida que terminan las peticiones.
+    """
+    total = total or len(specs)
+    client = (_AiohttpClient if aiohttp is not None else _ThreadedClient)(concurrency, timeout)
+    results = []
+    samples = set()
+    counter = iter(range(total))
+    started = time.monotonic()
+    deadline = started + duration if duration else None
+
+    async def worker():
+        for index in counter:
+            if rate:
+                # Envío programado: la petición i sale en started + i / rate
+                delay = started + index / rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if deadline and time.monotonic() >= deadline:
+                return
+            spec = specs[index % len(specs)]
+            sent = time.perf_counter()
+            try:
+                status, body = await client.send(spec)
+            except Exception as e:
+                result = RequestResult(spec.url, type(e).__name__, time.perf_counter() - sent)
+                # Una muestra por tipo de error, como por código de estado
+                if result.status not in samples:
+                    samples.add(result.status)
+                    result.sample = str(e)[:200]
+            else:
+                result = RequestResult(spec.url, status, time.perf_counter() - sent, len(body))
+                if status not in samples:
+                    samples.add(status)
+                    result.sample = body[:500].decode("utf-8", "replace")
+            results.append(result)
+            if on_progress is not None:
+                on_progress(len(results), total)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    finally:
+        await client.close()
+    return RunReport(summarize(results, time.monotonic() - started, concurrency, rate), results)
+
+
+def run_requests_sync(specs, **kwargs):
+    """``run_requests`` desde código síncrono (el script de Streamlit)."""
+    return asyncio.run(run_requests(specs, **kwargs))
@@ -0,0 +1,190 @@
+"""Perfilado opcional de los reruns de las páginas de Streamlit.
+
+Se activa con la variable de entorno ``IOT_PROFILE=1`` o con ``?profile=1``
+en la URL. Mide cada sección de la página (cuerpos de pestañas, gráficas,
+``describe()``, renderizado de JSON), el tamaño en bytes de las figuras de
+Plotly y el tiempo total del rerun. Los datos se agregan entre reruns a
+nivel de proceso y se muestran en un panel del sidebar; ``dump()`` devuelve
+el mismo resumen en JSON y, si ``IOT_PROFILE_DUMP`` apunta a un archivo, se
+escribe ahí al final de cada rerun.
+
+Uso:
+    start_rerun("api_server")
+    with section("chart: realtime"):
+        fig = ...
+    st.plotly_chart(measure_figure("figure bytes: realtime", fig))
+    finish_rerun()
+
+La pestaña activa de ``lazy_tabs`` se registra con ``begin_section``.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import streamlit as st
+
+# Muestras recientes guardadas por sección para calcular percentiles
+RECENT_SAMPLES = 200
+
+_lock = threading.Lock()
+_stats = {}  # page -> section -> SectionStats
+_local = threading.local()
+
+
+class SectionStats:
+    """Tiempos (ms) y tamaños (bytes) agregados de una sección."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.recent_ms = deque(maxlen=RECENT_SAMPLES)
+        self.last_bytes = None
+        self.max_bytes = None
+
+    def add_time(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.last_ms = ms
+        self.recent_ms.append(ms)
+
+    def add_bytes(self, size):
+        self.last_bytes = size
+        self.max_bytes = size if self.max_bytes is None else max(self.max_bytes, size)
+
+    def summary(self):
+        recent = sorted(self.recent_ms)
+        p95 = recent[min(len(recent) - 1, int(0.95 * len(recent)))] if recent else None
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p95_ms": p95,
+            "max_ms": self.max_ms if self.count else None,
+            "last_ms": self.last_ms if self.count else None,
+            "total_ms": self.total_ms,
+            "last_bytes": self.last_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def is_enabled():
+    """¿Está activo el perfilado en el rerun actual?"""
+    return getattr(_local, "page", None) is not None
+
+
+def _requested():
+    if os.environ.get("IOT_PROFILE") == "1":
+        return True
+    try:
+        return st.query_params.get("profile") == "1"
+    except Exception:
+        return False
+
+
+def _section_stats(name):
+    page_stats = _stats.setdefault(_local.page, {})
+    if name not in page_stats:
+        page_stats[name] = SectionStats()
+    return page_stats[name]
+
+
+def start_rerun(page):
+    """Marcar el inicio de un rerun de ``page``; no hace nada si el perfilado está apagado."""
+    if _requested():
+        _local.page = page
+        _local.started_at = time.perf_counter()
+        _local.open_sections = []
+    else:
+        _local.page = None
+
+
+def section(name):
+    """Context manager que mide una sección de la página."""
+    if not is_enabled():
+        return nullcontext()
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            _section_stats(name).add_time(elapsed_ms)
+
+
+def begin_section(name):
+    """Abrir una sección que se cierra en ``finish_rerun`` (p. ej. la pestaña activa)."""
+    if is_enabled():
+        _local.open_sections.append((name, time.perf_counter()))
+
+
+def measure_figure(name, fig):
+    """Registrar el tamaño serializado de una figura de Plotly y devolverla."""
+    if is_enabled():
+        measure_bytes(name, len(fig.to_json().encode()))
+    return fig
+
+
+def measure_bytes(name, size):
+    """Registrar ``size`` bytes enviados al navegador en la sección ``name``."""
+    with _lock:
+        _section_stats(name).add_bytes(size)
+
+
+def dump(page=None):
+    """Resumen agregado (dict serializable a JSON) de una página o de todas."""
+    with _lock:
+        pages = {page: _stats.get(page, {})} if page else dict(_stats)
+        return {
+            name: {sec: stats.summary() for sec, stats in sections.items()}
+            for name, sections in pages.items()
+        }
+
+
+def reset(page):
+    with _lock:
+        _stats.pop(page, None)
+
+
+def finish_rerun():
+    """Registrar el tiempo total del rerun y mostrar el panel de depuración."""
+    if not is_enabled():
+        return
+    page = _local.page
+    now = time.perf_counter()
+    with _lock:
+        for name, started in _local.open_sections:
+            _section_stats(name).add_time((now - started) * 1000)
+        _section_stats("rerun: total").add_time((now - _local.started_at) * 1000)
+
+    data = dump(page)
+    dump_path = os.environ.get("IOT_PROFILE_DUMP")
+    if dump_path:
+        with open(dump_path, "w") as f:
+            json.dump(dump(), f, indent=2)
+
+    with st.sidebar.expander("🐞 Rerun Profile", expanded=False):
+        sections = data.get(page, {})
+        if sections:
+            import pandas as pd
+
+            df = pd.DataFrame.from_dict(sections, orient="index").sort_values("total_ms", ascending=False)
+            st.dataframe(df.round(2))
+        st.download_button(
+            "📥 Download profile JSON",
+            data=json.dumps(data, indent=2),
+            file_name=f"profile_{page}_{time.strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+        )
+        if st.button("🗑️ Reset profile"):
+            reset(page)
+    _local.page = None
@@ -0,0 +1,116 @@
+"""Historial acotado y comprimido para las respuestas de app.py.
+
+``st.session_state.api_responses`` y ``gemini_conversations`` guardaban cada
+cuerpo completo sin límite y la pestaña Response History los dibujaba todos
+en cada rerun. ``HistoryLog`` guarda cada registro con sus campos pesados
+(``body_keys``) serializados en JSON y comprimidos con zlib a partir de
+``compress_threshold`` bytes, descarta los más antiguos al pasar de
+``max_entries`` o ``max_bytes``, y solo descomprime un cuerpo cuando se lee
+(``entry["response"]``). ``page`` devuelve una página, de los más nuevos a los
+más antiguos, para dibujar solo lo visible.
+"""
+import json
+import zlib
+from collections import deque
+
+
+class HistoryEntry:
+    """Registro del historial: metadatos en claro y cuerpo cargado a demanda."""
+
+    __slots__ = ("meta", "_blob", "compressed", "raw_size")
+
+    def __init__(self, meta, blob, compressed, raw_size):
+        self.meta = meta
+        self._blob = blob
+        self.compressed = compressed
+        self.raw_size = raw_size
+
+    @property
+    def stored_size(self):
+        return len(self._blob)
+
+    def body(self):
+        data = zlib.decompress(self._blob) if self.compressed else self._blob
+        return json.loads(data)
+
+    def __getitem__(self, key):
+        if key in self.meta:
+            return self.meta[key]
+        return self.body()[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class HistoryLog:
+    """Lista acotada por cantidad y por bytes de registros con cuerpo comprimido."""
+
+    def __init__(self, body_keys=("response",), max_entries=500, max_bytes=8 * 1024 * 1024,
+                 compress_threshold=2048, level=6):
+        self.body_keys = tuple(body_keys)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self.level = level
+        self._entries = deque()
+        self.stored_bytes = 0
+        self.raw_bytes = 0
+        self.evicted = 0
+
+    def append(self, record):
+        """Guardar un registro (dict); los ``body_keys`` van al cuerpo comprimible."""
+        meta = {k: v for k, v in record.items() if k not in self.body_keys}
+        raw = json.dumps({k: record[k] for k in self.body_keys if k in record},
+                         separators=(",", ":"), default=str).encode()
+        compressed = len(raw) >= self.compress_threshold
+        blob = zlib.compress(raw, self.level) if compressed else raw
+        if compressed and len(blob) >= len(raw):
+            blob, compressed = raw, False
+        entry = HistoryEntry(meta, blob, compressed, len(raw))
+        self._entries.append(entry)
+        self.stored_bytes += entry.stored_size
+        self.raw_bytes += entry.raw_size
+        # Siempre se conserva el último, aunque solo él exceda el presupuesto
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.stored_bytes > self.max_bytes):
+            self._evict()
+        return entry
+
+    def _evict(self):
+        entry = self._entries.popleft()
+        self.stored_bytes -= entry.stored_size
+        self.raw_bytes -= entry.raw_size
+        self.evicted += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.stored_bytes = self.raw_bytes = 0
+
+    def page(self, number, per_page=10):
+        """Registros de la página ``number`` (desde 0), de los más nuevos a los más antiguos."""
+        start = number * per_page
+        end = min(len(self._entries), start + per_page)
+        return [self._entries[len(self._entries) - 1 - i] for i in range(start, end)]
+
+    def page_count(self, per_page=10):
+        return max(1, -(-len(self._entries) // per_page))
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "stored_bytes": self.stored_bytes,
+            "raw_bytes": self.raw_bytes,
+            "evicted": self.evicted,
+            "max_bytes": self.max_bytes,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
@@ -0,0 +1,179 @@
+"""Decodificación de lecturas de sensores para POST /sensor/data.
+
+Además de JSON, la API acepta un formato binario compacto de registros fijos
+(``application/x-sensor-struct``) y, si la librería ``msgpack`` está
+instalada, MessagePack (``application/msgpack``). El formato se elige por
+Content-Type.
+
+Formato binario (little-endian):
+    cabecera: b"S" | id de esquema (uint8) | cantidad de registros (uint16)
+    registro: sensor_id (bytes fijos, rellenos con \\0) | un uint16 por campo
+"""
+import json
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # dependencia opcional
+    msgpack = None
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_STRUCT = "application/x-sensor-struct"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+
+# Campos que envía el firmware (proyecto_final.ino, handleGetSensor)
+SENSOR_FIELDS = [
+    "SENSOR_LIGHT_LEFT",
+    "SENSOR_LIGHT_RIGHT",
+    "SENSOR_CO2",
+    "SENSOR_CNY1",
+    "SENSOR_CNY2",
+    "SENSOR_CNY3",
+    "SENSOR_CNY4",
+    "SENSOR_CNY5",
+    "SENSOR_CNY6",
+    "SENSOR_P1",
+    "SENSOR_P2",
+]
+
+HEADER = struct.Struct("<cBH")
+MAGIC = b"S"
+DEFAULT_SCHEMA_ID = 1
+
+# Esquemas registrados: id -> {"fields": [...], "dtype": np.dtype}
+SCHEMAS = {}
+
+
+class UnsupportedContentType(ValueError):
+    """El Content-Type de la petición no corresponde a ningún formato soportado."""
+
+
+def register_schema(schema_id, fields, field_format="u2", id_length=16):
+    """Registrar un esquema de registro fijo para el formato binario."""
+    if not 0 <= schema_id <= 255:
+        raise ValueError("schema_id must fit in one byte")
+    dtype = np.dtype(
+        [("sensor_id", f"S{id_length}")] + [(field, f"<{field_format}") for field in fields]
+    )
+    SCHEMAS[schema_id] = {"fields": list(fields), "dtype": dtype}
+    return dtype
+
+
+register_schema(DEFAULT_SCHEMA_ID, SENSOR_FIELDS)
+
+
+def readings_to_records(readings, schema_id=DEFAULT_SCHEMA_ID):
+    """Convertir lecturas (dicts) en un arreglo de registros del esquema."""
+    schema = SCHEMAS[schema_id]
+    dtype = schema["dtype"]
+    records = np.zeros(len(readings), dtype=dtype)
+    sensor_ids = [str(r.get("sensor_id", "")).encode() for r in readings]
+    id_length = dtype["sensor_id"].itemsize
+    for sensor_id in sensor_ids:
+        if len(sensor_id) > id_length:
+            raise ValueError(f"sensor_id {sensor_id.decode(errors='replace')!r} is longer than {id_length} bytes")
+    records["sensor_id"] = sensor_ids
+    for field in schema["fields"]:
+        records[field] = [_field_value(r, field, dtype[field]) for r in readings]
+    return records
+
+
+def _field_value(reading, field, field_dtype):
+    """Valor entero de ``field`` dentro del rango del tipo del esquema (ValueError si no)."""
+    value = reading.get(field, 0)
+    if field_dtype.kind == "f":
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+            raise ValueError(f"{field} must be a number, got {value!r}")
+        return value
+    # numpy truncaría 3.7 a 3 o lanzaría OverflowError con -1: se rechaza con un mensaje claro
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, (int, np.integer)):
+        raise ValueError(f"{field} must be an integer, got {value!r}")
+    limits = np.iinfo(field_dtype)
+    if not limits.min <= value <= limits.max:
+        raise ValueError(f"{field} must be between {limits.min} and {limits.max}, got {value}")
+    return value
+
+
+def records_to_readings(records, fields):
+    """Convertir un arreglo de registros en lecturas (dicts), columna por columna."""
+    columns = {field: records[field].tolist() for field in fields}
+    columns["sensor_id"] = [raw.rstrip(b"\0").decode(errors="replace") for raw in records["sensor_id"].tolist()]
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def encode_struct(readings, schema_id=DEFAULT_SCHEMA_ID):
+    """Codificar una lista de lecturas (dicts) en el formato binario."""
+    records = readings_to_records(readings, schema_id)
+    return HEADER.pack(MAGIC, schema_id, len(readings)) + records.tobytes()
+
+
+def parse_struct(body):
+    """Interpretar un cuerpo binario como arreglo de registros (sin copiar).
+
+    Devuelve ``(schema_id, records)``; ``records`` es una vista de ``body``
+    obtenida con ``np.frombuffer``.
+    """
+    if len(body) < HEADER.size:
+        raise ValueError("Binary payload too short")
+    magic, schema_id, count = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Invalid binary payload header")
+    if schema_id not in SCHEMAS:
+        raise ValueError(f"Unknown schema id {schema_id}")
+
+    schema = SCHEMAS[schema_id]
+    dtype = schema["dtype"]
+    expected = HEADER.size + count * dtype.itemsize
+    if len(body) != expected:
+        raise ValueError(f"Binary payload length {len(body)} does not match {count} records")
+
+    return schema_id, np.frombuffer(body, dtype=dtype, count=count, offset=HEADER.size)
+
+
+def decode_struct(body):
+    """Decodificar un cuerpo binario en una lista de lecturas.
+
+    Todos los registros se interpretan de una vez con ``np.frombuffer`` y se
+    convierten a tipos nativos de Python por columna.
+    """
+    schema_id, records = parse_struct(body)
+    return records_to_readings(records, SCHEMAS[schema_id]["fields"])
+
+
+def _as_readings(data):
+    """Normalizar un objeto decodificado (dict o lista de dicts) a lista."""
+    if not data:
+        return []
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+        return data
+    raise ValueError("Payload must be an object or a list of objects")
+
+
+def decode_payload(body, content_type):
+    """Decodificar el cuerpo de /sensor/data según su Content-Type.
+
+    Devuelve una lista de lecturas; lanza ``UnsupportedContentType`` si el
+    formato no es soportado y ``ValueError`` si el cuerpo es inválido.
+    """
+    if content_type == CONTENT_TYPE_STRUCT:
+        return decode_struct(body)
+    if content_type == CONTENT_TYPE_MSGPACK:
+        if msgpack is None:
+            raise UnsupportedContentType("MessagePack support requires the 'msgpack' package")
+        try:
+            return _as_readings(msgpack.unpackb(body, raw=False))
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+            raise ValueError(f"Invalid MessagePack payload: {e}") from e
+    if content_type == CONTENT_TYPE_JSON or content_type.endswith("+json"):
+        try:
+            return _as_readings(json.loads(body) if body else None)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON payload: {e}") from e
+    raise UnsupportedContentType(f"Unsupported Content-Type: {content_type or 'none'}")
@@ -1,17 +1,311 @@
-from flask import Flask, request, jsonify
- 
-app = Flask(__name__)
- 
-@app.route('/sensor/data', methods=['POST'])
-def receive_data():
-    data = request.get_json()
-    print("📥 Datos recibidos:", data)
-    # Aquí podrás procesar o guardar la información
-    return jsonify({
-        "status": "ok",
-        "received": data
-    }), 200
- 
+"""Sumidero de ingesta mínimo para ``POST /sensor/data``.
+
+Para gateways que solo necesitan capturar lecturas: un servidor asyncio sin
+Flask (HTTP/1.1 con keep-alive) que acepta los mismos formatos que
+api_server.py (JSON, binario ``application/x-sensor-struct`` o MessagePack,
+ver sensor_codec.py) y agrega cada lectura como una línea NDJSON al archivo
+del día (``readings-AAAAMMDD.ndjson``, o ``.ndjson.gz`` con ``--compress gzip``).
+
+Las líneas se acumulan en memoria y se escriben por lotes (al llegar a
+``--flush-kb`` o cada ``--flush-interval`` segundos) desde un hilo, sin
+bloquear el loop. El 200 se responde con la lectura en el buffer: una caída
+del proceso pierde como mucho el último lote. Si el disco no da abasto y el
+buffer pasa de ``--max-buffer-mb``, las peticiones esperan a la escritura.
+Cada ``--report-interval`` segundos se imprime el throughput; ``GET
+/sensor/status`` devuelve los mismos contadores.
+
+Ejemplos:
+    python server_get.py --dir captures
+    python server_get.py --dir captures --compress gzip --port 5002 --report-interval 5
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import signal
+import time
+from datetime import datetime
+
+from sensor_codec import UnsupportedContentType, decode_payload
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional, solo acelera la serialización
+    orjson = None
+
+COMPRESSIONS = ("none", "gzip")
+MAX_BODY_BYTES = 8 * 1024 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 411: "Length Required",
+           413: "Payload Too Large", 415: "Unsupported Media Type"}
+
+
+def dumps_line(reading):
+    if orjson is not None:
+        return orjson.dumps(reading) + b"\n"
+    return json.dumps(reading, separators=(",", ":")).encode() + b"\n"
+
+
+class NDJSONSink:
+    """Buffer de líneas NDJSON que se escribe por lotes en un archivo por día."""
+
+    def __init__(self, directory, compress="none", flush_bytes=256 * 1024, flush_interval=0.5,
+                 max_buffer_bytes=16 * 1024 * 1024, compress_level=6, prefix="readings"):
+        if compress not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compress!r} (one of {', '.join(COMPRESSIONS)})")
+        self.directory = directory
+        self.compress = compress
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.compress_level = compress_level
+        self.prefix = prefix
+        self._buffer = []
+        self._buffered = 0
+        self._file = None
+        self._day = None
+        self._flush_lock = asyncio.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Contadores para el reporte
+        self.readings = 0
+        self.bytes_in = 0  # NDJSON sin comprimir
+        self.batches = 0
+        self.flush_seconds = 0.0
+
+    @property
+    def path(self):
+        suffix = ".ndjson.gz" if self.compress == "gzip" else ".ndjson"
+        return os.path.join(self.directory, f"{self.prefix}-{self._day or datetime.now():%Y%m%d}{suffix}")
+
+    async def write(self, readings):
+        """Encolar lecturas; espera a una escritura solo si el buffer está lleno."""
+        for reading in readings:
+            line = dumps_line(reading)
+            self._buffer.append(line)
+            self._buffered += len(line)
+        self.readings += len(readings)
+        if self._buffered >= self.max_buffer_bytes:
+            await self.flush()
+        elif self._buffered >= self.flush_bytes and not self._flush_lock.locked():
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        """Escribir el buffer en disco (en orden; una escritura a la vez)."""
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            chunk = b"".join(self._buffer)
+            self._buffer, self._buffered = [], 0
+            started = time.perf_counter()
+            await asyncio.get_running_loop().run_in_executor(None, self._write, chunk)
+            self.flush_seconds += time.perf_counter() - started
+            self.bytes_in += len(chunk)
+            self.batches += 1
+
+    def _write(self, chunk):
+        day = datetime.now().date()
+        if self._file is None or day != self._day:
+            self._close_file()
+            self._day = day
+            if self.compress == "gzip":
+                # Cada apertura agrega un miembro gzip; zcat lee el archivo completo
+                self._file = gzip.open(self.path, "ab", compresslevel=self.compress_level)
+            else:
+                self._file = open(self.path, "ab")
+        self._file.write(chunk)
+        # En gzip hace un sync flush: lo escrito ya se puede descomprimir
+        self._file.flush()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def run(self, stop):
+        """Escribir el buffer cada ``flush_interval`` hasta que ``stop`` se active."""
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def close(self):
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(None, self._close_file)
+
+    def stats(self):
+        on_disk = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            "file": self.path,
+            "compress": self.compress,
+            "readings": self.readings,
+            "buffered_bytes": self._buffered,
+            "bytes_written": self.bytes_in,
+            "file_bytes": on_disk,
+            "batches": self.batches,
+            "avg_flush_ms": round(self.flush_seconds / self.batches * 1000, 2) if self.batches else None,
+        }
+
+
+class IngestServer:
+    """Servidor HTTP/1.1 mínimo con las rutas del sumidero."""
+
+    def __init__(self, sink, echo=False):
+        self.sink = sink
+        self.echo = echo
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.started = time.monotonic()
+
+    async def dispatch(self, method, path, headers, body):
+        path = path.split("?", 1)[0]
+        if path == "/sensor/data" and method == "POST":
+            content_type = headers.get("content-type", "").split(";", 1)[0].strip()
+            try:
+                readings = decode_payload(body, content_type)
+            except UnsupportedContentType as e:
+                return 415, {"error": str(e)}
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            if not readings:
+                return 400, {"error": "No data received"}
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for reading in readings:
+                reading.setdefault("timestamp", timestamp)
+            if self.echo:
+                print("📥 Datos recibidos:", readings)
+            await self.sink.write(readings)
+            return 200, {"status": "success", "received_count": len(readings)}
+        if path == "/sensor/status" and method == "GET":
+            return 200, self.stats()
+        return 404, {"error": "Not Found"}
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    break
+                method, path, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                if "chunked" in headers.get("transfer-encoding", "").lower():
+                    status, payload, keep_alive = 411, {"error": "Content-Length required"}, False
+                elif int(headers.get("content-length") or 0) > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {"error": "Body too large"}, False
+                else:
+                    length = int(headers.get("content-length") or 0)
+                    if length and headers.get("expect", "").lower() == "100-continue":
+                        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, path, headers, body)
+
+                self.requests += 1
+                if status != 200:
+                    self.errors += 1
+                data = dumps_line(payload)
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def stats(self):
+        return {
+            "status": "running",
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "open_connections": self.connections,
+            **self.sink.stats(),
+        }
+
+
+async def report(server, interval, stop):
+    """Imprimir el throughput de cada intervalo."""
+    previous = (time.monotonic(), 0, 0, 0)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        now, sink = time.monotonic(), server.sink
+        elapsed = now - previous[0]
+        requests_done = server.requests - previous[1]
+        readings = sink.readings - previous[2]
+        written = sink.bytes_in - previous[3]
+        previous = (now, server.requests, sink.readings, sink.bytes_in)
+        stats = sink.stats()
+        ratio = f" · {stats['bytes_written'] / stats['file_bytes']:.1f}x gzip" if sink.compress == "gzip" and stats["file_bytes"] else ""
+        print(
+            f"{requests_done / elapsed:,.0f} req/s · {readings / elapsed:,.0f} readings/s · "
+            f"{written / elapsed / 1e6:.2f} MB/s NDJSON · {server.connections} connections · "
+            f"{stats['file_bytes'] / 1e6:.1f} MB in {os.path.basename(stats['file'])}{ratio}",
+            flush=True,
+        )
+
+
+async def serve(args):
+    sink = NDJSONSink(args.dir, compress=args.compress, flush_bytes=args.flush_kb * 1024,
+                      flush_interval=args.flush_interval, max_buffer_bytes=int(args.max_buffer_mb * 1024 * 1024),
+                      compress_level=args.compress_level)
+    server = IngestServer(sink, echo=args.echo)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    listener = await asyncio.start_server(server.handle, args.host, args.port, backlog=args.backlog)
+    print(f"Ingest sink on http://{args.host}:{args.port}/sensor/data -> {sink.path}", flush=True)
+    tasks = [loop.create_task(sink.run(stop))]
+    if args.report_interval > 0:
+        tasks.append(loop.create_task(report(server, args.report_interval, stop)))
+    async with listener:
+        await stop.wait()
+    await asyncio.gather(*tasks)
+    await sink.close()
+    print(json.dumps(server.stats()), flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Minimal high-throughput ingest sink for /sensor/data")
+    # Escucha en todas las interfaces de red, puerto 5002
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--dir", default="captures", help="Directory for the NDJSON files")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default="none")
+    parser.add_argument("--compress-level", type=int, default=6, help="gzip level (1 fastest, 9 smallest)")
+    parser.add_argument("--flush-kb", type=int, default=256, help="Write when this much NDJSON is buffered")
+    parser.add_argument("--flush-interval", type=float, default=0.5, help="Seconds between background writes")
+    parser.add_argument("--max-buffer-mb", type=float, default=16, help="Requests wait for the disk above this")
+    parser.add_argument("--report-interval", type=float, default=10, help="Seconds between throughput lines (0 to disable)")
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--echo", action="store_true", help="Also print every payload (slow; for debugging)")
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
-    # Escucha en todas las interfaces de red, puerto 5000
-    app.run(host='0.0.0.0', port=5002)
\ No newline at end of file
+    asyncio.run(serve(parse_args()))
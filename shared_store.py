@@ -0,0 +1,201 @@
+"""Estado compartido entre todas las sesiones de navegador de un proceso.
+
+Streamlit crea un ``st.session_state`` por pestaña del navegador; con diez
+operadores mirando la misma intersección eso son diez copias del historial y
+diez pollers consultando el ESP32. Las apps guardan aquí un único estado por
+proceso (creado con ``st.cache_resource``) y cada sesión solo lee copias.
+
+- ``SharedLog``: historial acotado y seguro entre hilos. Las lecturas
+  devuelven copias (las listas son nuevas; los registros se comparten y se
+  tratan como solo lectura) y cada sesión puede seguir sus novedades con un
+  cursor propio (``since``, o ``wait_since`` para esperar novedades).
+- ``DeviceHub``: historial de sensores y del actuador de un dispositivo, su
+  ``DeviceHealth`` y un único ``DevicePoller`` cuyas suscripciones son por
+  sesión. Las conversaciones con Gemini no se comparten: son de cada sesión.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from device_health import DeviceHealth
+
+
+class SharedLog:
+    """Lista acotada de registros compartida entre sesiones."""
+
+    def __init__(self, maxlen=None):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._items = deque(maxlen=maxlen)
+        self.maxlen = maxlen
+        # Total de registros agregados desde el inicio (cursor de las sesiones)
+        self.version = 0
+        # Cambia con clear(): las copias derivadas (p. ej. gráficas) se rehacen
+        self.epoch = 0
+
+    def append(self, item):
+        """Agregar un registro; devuelve cuántos registros antiguos se descartaron."""
+        return self.extend([item])
+
+    def extend(self, items):
+        with self._lock:
+            before = len(self._items)
+            self._items.extend(items)
+            self.version += len(items)
+            self._changed.notify_all()
+            return before + len(items) - len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.epoch += 1
+
+    def snapshot(self):
+        """Copia de la lista completa de registros."""
+        with self._lock:
+            return list(self._items)
+
+    def since(self, cursor):
+        """Registros agregados después de ``cursor`` y el nuevo cursor.
+
+        Si el cursor es tan viejo que esos registros ya se descartaron, se
+        devuelven solo los que siguen disponibles.
+        """
+        with self._lock:
+            return self._since(cursor)
+
+    def wait_since(self, cursor, timeout=None):
+        """Como ``since``, pero espera hasta ``timeout`` segundos si no hay nada nuevo."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > cursor, timeout)
+            return self._since(cursor)
+
+    def _since(self, cursor):
+        missing = min(self.version - cursor, len(self._items))
+        items = list(self._items)[len(self._items) - missing:] if missing > 0 else []
+        return items, self.version
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return len(self._items) > 0
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __getitem__(self, index):
+        with self._lock:
+            if isinstance(index, slice):
+                return list(self._items)[index]
+            return self._items[index]
+
+
+class DevicePoller:
+    """Un solo hilo que consulta el dispositivo por todas las sesiones.
+
+    Cada sesión se suscribe con su intervalo de refresco y renueva la
+    suscripción en cada rerun; el hilo parte del intervalo más corto entre
+    las suscripciones vigentes, lo ajusta con la salud del dispositivo
+    (circuit breaker, volatilidad) y se detiene cuando no queda ninguna.
+    ``fetch`` recibe el timeout de la consulta.
+    """
+
+    def __init__(self, hub, fetch, idle_timeout=30):
+        self.hub = hub
+        self.fetch = fetch
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._subscribers = {}  # session_id -> (intervalo, último heartbeat)
+        self.requested_interval = None
+        self._thread = None
+        self._wake = threading.Event()
+
+    def subscribe(self, session_id, interval):
+        """Registrar o renovar la suscripción de una sesión."""
+        with self._lock:
+            previous = self._subscribers.get(session_id)
+            self._subscribers[session_id] = (interval, time.monotonic())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            elif previous is None or interval < previous[0]:
+                self._wake.set()
+
+    def unsubscribe(self, session_id):
+        with self._lock:
+            self._subscribers.pop(session_id, None)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _next_interval(self):
+        """Intervalo más corto entre las sesiones activas (None si no hay)."""
+        now = time.monotonic()
+        expired = [
+            session_id
+            for session_id, (interval, heartbeat) in self._subscribers.items()
+            if now - heartbeat > max(3 * interval, self.idle_timeout)
+        ]
+        for session_id in expired:
+            del self._subscribers[session_id]
+        if not self._subscribers:
+            return None
+        return min(interval for interval, _ in self._subscribers.values())
+
+    def _run(self):
+        health = self.hub.health
+        while True:
+            with self._lock:
+                interval = self.requested_interval = self._next_interval()
+                if interval is None:
+                    self._thread = None
+                    return
+            # Con el circuito abierto no se gasta un timeout en un dispositivo caído
+            if health.allow_request():
+                try:
+                    with health.track():
+                        reading = self.fetch(timeout=health.timeout())
+                    self.hub.record_reading(reading)
+                except Exception as e:
+                    self.hub.last_error = str(e)
+            self._wake.wait(health.next_interval(interval))
+            self._wake.clear()
+
+
+class DeviceHub:
+    """Estado compartido de un dispositivo (un ESP32 por URL base)."""
+
+    def __init__(self, fetch, max_readings=100, history=None, max_actuator_states=500, device_id=None):
+        self.sensor_data = SharedLog(maxlen=max_readings)
+        # Historial en disco opcional (HistoryStore); el SharedLog solo guarda lo reciente
+        self.history = history
+        # sensor_id con el que se guardan en el historial las lecturas que no traen uno
+        self.device_id = device_id
+        self.actuator_states = SharedLog(maxlen=max_actuator_states)
+        self.health = DeviceHealth()
+        self.last_error = None
+        self.poller = DevicePoller(self, fetch)
+
+    @property
+    def device_status(self):
+        """Online / Degraded / Offline / Unknown según ``DeviceHealth``."""
+        return self.health.status
+
+    def record_reading(self, sensor_data):
+        """Agregar timestamp a una lectura y guardarla en el historial compartido."""
+        self.health.observe_reading(sensor_data)
+        timestamp = datetime.now()
+        sensor_data['timestamp'] = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        sensor_data['datetime'] = timestamp
+        self.sensor_data.append(sensor_data)
+        if self.history is not None:
+            if self.device_id is not None and 'sensor_id' not in sensor_data:
+                # El historial se comparte entre dispositivos: cada lectura lleva el suyo
+                self.history.append([dict(sensor_data, sensor_id=self.device_id)])
+            else:
+                self.history.append([sensor_data])
+        return sensor_data
@@ -0,0 +1,157 @@
+"""Buffer circular en memoria compartida para lecturas de sensores.
+
+Los procesos de ingesta (ver ``ingest_workers.py``) escriben registros de
+tamaño fijo en un bloque de ``multiprocessing.shared_memory`` y el proceso
+del dashboard lo mapea y lo lee sin pasar por sockets ni colas.
+
+Disposición del bloque (little-endian):
+    cabecera: magic (4 bytes) | relleno (4 bytes) | capacidad (uint64) | secuencia escrita (uint64)
+    registros: ``capacity`` registros de ``RECORD_DTYPE``
+
+Cada registro guarda su número de secuencia (empezando en 1) y funciona como
+un seqlock: el escritor lo pone en 0 antes de tocar el registro y escribe la
+secuencia nueva al final; el lector vuelve a leerlo después de copiar y
+descarta los registros cuya secuencia cambió (un escritor los estaba
+pisando). Los escritores se serializan con un ``multiprocessing.Lock``.
+"""
+import struct
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from sensor_codec import DEFAULT_SCHEMA_ID, SCHEMAS, readings_to_records, records_to_readings
+
+RING_MAGIC = b"SRNG"
+RING_HEADER = struct.Struct("<4s4xQQ")
+DEFAULT_RING_NAME = "smart_city_sensor_ring"
+DEFAULT_CAPACITY = 65536
+
+SCHEMA = SCHEMAS[DEFAULT_SCHEMA_ID]
+RECORD_DTYPE = np.dtype(
+    [("seq", "<u8"), ("received_at", "<f8")] + [(name, SCHEMA["dtype"][name]) for name in SCHEMA["dtype"].names]
+)
+
+
+class ShmRing:
+    """Buffer circular de registros fijos sobre ``SharedMemory``."""
+
+    def __init__(self, shm, lock=None, owner=False):
+        self.shm = shm
+        self.lock = lock
+        self.owner = owner
+        magic, self.capacity, _ = RING_HEADER.unpack_from(shm.buf)
+        if magic != RING_MAGIC:
+            raise ValueError(f"Shared memory block {shm.name!r} is not a sensor ring")
+        self._header = np.ndarray((2,), dtype="<u8", buffer=shm.buf, offset=8)
+        self._records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=shm.buf, offset=RING_HEADER.size)
+
+    @classmethod
+    def create(cls, name=DEFAULT_RING_NAME, capacity=DEFAULT_CAPACITY, lock=None):
+        """Crear el bloque de memoria compartida (lo hace el proceso principal)."""
+        size = RING_HEADER.size + capacity * RECORD_DTYPE.itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        RING_HEADER.pack_into(shm.buf, 0, RING_MAGIC, capacity, 0)
+        return cls(shm, lock=lock, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_RING_NAME, lock=None):
+        """Mapear un buffer existente (escritores y lectores)."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Python < 3.13 registra el bloque también al adjuntarse y lo borra al
+        # salir el proceso; solo el creador debe liberarlo.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, lock=lock)
+
+    @property
+    def write_seq(self):
+        """Secuencia del último registro publicado."""
+        return int(self._header[1])
+
+    def write_records(self, records, received_at=None):
+        """Copiar un arreglo de registros del esquema al buffer."""
+        count = len(records)
+        if count == 0:
+            return self.write_seq
+        if count > self.capacity:
+            records = records[-self.capacity:]
+            count = self.capacity
+        received_at = time.time() if received_at is None else received_at
+        with self.lock or nullcontext():
+            start = self.write_seq
+            seqs = np.arange(start + 1, start + count + 1, dtype="<u8")
+            slots = (seqs - 1) % self.capacity
+            block = np.zeros(count, dtype=RECORD_DTYPE)
+            block["received_at"] = received_at
+            for name in records.dtype.names:
+                block[name] = records[name]
+            # Invalidar, escribir el contenido y recién entonces la secuencia nueva
+            seq_column = self._records["seq"]
+            seq_column[slots] = 0
+            self._records[slots] = block
+            seq_column[slots] = seqs
+            # Publicar después de escribir los registros
+            self._header[1] = start + count
+            return start + count
+
+    def write_readings(self, readings, received_at=None):
+        """Escribir lecturas (dicts); solo se guardan los campos del esquema."""
+        return self.write_records(readings_to_records(readings), received_at)
+
+    def view(self):
+        """Vista de solo lectura, sin copia, de todos los registros del buffer."""
+        view = self._records.view()
+        view.flags.writeable = False
+        return view
+
+    def read_since(self, cursor):
+        """Copiar los registros publicados después de ``cursor``.
+
+        Devuelve ``(records, nuevo_cursor, perdidos)``; ``perdidos`` cuenta los
+        registros que se sobrescribieron antes de poder leerlos.
+        """
+        end = self.write_seq
+        if end <= cursor:
+            return self._records[:0].copy(), cursor, 0
+        start = max(cursor, end - self.capacity)
+        seqs = np.arange(start + 1, end + 1, dtype="<u8")
+        slots = (seqs - 1) % self.capacity
+        records = self._records[slots].copy()
+        # Un escritor pudo adelantarse y pisar parte de lo copiado: la secuencia
+        # tiene que coincidir antes y después de la copia
+        valid = (records["seq"] == seqs) & (self._records["seq"][slots] == seqs)
+        lost = (start - cursor) + int((~valid).sum())
+        return records[valid], end, lost
+
+    def read_readings_since(self, cursor):
+        """Como ``read_since`` pero devuelve lecturas (dicts) con su timestamp."""
+        records, cursor, lost = self.read_since(cursor)
+        readings = records_to_readings(records, SCHEMA["fields"])
+        for reading, received_at in zip(readings, records["received_at"].tolist()):
+            reading["datetime"] = datetime.fromtimestamp(received_at)
+            reading["timestamp"] = reading["datetime"].strftime("%Y-%m-%d %H:%M:%S")
+        return readings, cursor, lost
+
+    def close(self):
+        del self._header, self._records
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """Cursor de lectura compartido por los hilos de un proceso lector."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.cursor = ring.write_seq
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Lecturas nuevas desde la última llamada y cuántas se perdieron."""
+        with self._lock:
+            readings, self.cursor, lost = self.ring.read_readings_since(self.cursor)
+            return readings, lost